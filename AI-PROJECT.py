@@ -1,6 +1,26 @@
+import os
 import tkinter as tk
 from tkinter import messagebox
-import random
+
+from board_layout import (BLACK, PIECE_LETTERS, QUEEN, coords_to_move, move_promotion,
+                          move_to_coords)
+from chess_rules import ChessPosition, get_algebraic_notation
+from engine_worker import SearchWorker
+from opening_book import OpeningBook
+
+# Thinking time per AI move, in seconds
+AI_TIME_LIMIT = 1.5
+# Processes searching for the AI's move (Lazy SMP when above 1)
+AI_THREADS = 1
+# Opening book the AI plays from before it starts searching (optional;
+# build one with opening_book.py)
+AI_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+# Endgame tablebases the AI probes, if generated (see tablebase.py)
+AI_TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+# How often the UI checks the search worker for news, in milliseconds
+AI_POLL_INTERVAL = 50
+# Legal move dots created up front (a bishop can have up to 27 moves)
+MOVE_DOT_POOL = 27
 
 class ModifiedChessGame:
     def __init__(self, root):
@@ -15,20 +35,18 @@ class ModifiedChessGame:
         self.CANVAS_WIDTH = self.BOARD_SIZE * self.SQUARE_SIZE
         self.CANVAS_HEIGHT = self.BOARD_SIZE * self.SQUARE_SIZE
         
-        # Game state variables
-        self.board = self.create_initial_board()
-        self.current_player = "white"
+        # Game state variables (the rules live on a headless ChessPosition)
+        self.position = ChessPosition()
         self.selected_piece = None
         self.selected_square = None
         self.game_over = False
         self.check_status = {"white": False, "black": False}
         self.move_history = []
         
-        # Piece values for AI evaluation (modified to reflect bishop's enhanced role)
-        self.piece_values = {
-            "P": 1, "N": 3, "B": 9, "R": 5, "Q": 9, "K": 100,
-            "p": -1, "n": -3, "b": -9, "r": -5, "q": -9, "k": -100
-        }
+        # AI player (Black), searching in a background process
+        self.worker = SearchWorker(threads=AI_THREADS, tablebase_dir=AI_TABLEBASE_DIR)
+        self.ai_job = None
+        self.book = OpeningBook(AI_BOOK_PATH) if os.path.exists(AI_BOOK_PATH) else None
         
         # Create widgets
         self.create_widgets()
@@ -37,6 +55,9 @@ class ModifiedChessGame:
         self.piece_images = {}
         self.load_piece_images()
         
+        # Canvas items for the squares, pieces and highlights
+        self.create_board_items()
+        
         # Draw the initial board
         self.draw_board()
         self.draw_pieces()
@@ -93,6 +114,18 @@ class ModifiedChessGame:
         )
         self.check_label.pack()
         
+        # AI "thinking" indicator
+        self.thinking_label = tk.Label(
+            self.check_frame, 
+            text="", 
+            font=("Arial", 10, "italic"), 
+            bg="#34495e", 
+            fg="#F39C12",
+            padx=10, 
+            pady=5
+        )
+        self.thinking_label.pack()
+        
         # Control buttons
         buttons_frame = tk.Frame(right_panel, bg="#2c3e50")
         buttons_frame.pack(fill=tk.X, pady=10)
@@ -172,28 +205,12 @@ class ModifiedChessGame:
         for piece, symbol in unicode_symbols.items():
             self.piece_images[piece] = symbol
         
-    def create_initial_board(self):
-        # Create an 8x8 board with pieces in the starting position
-        board = [['' for _ in range(self.BOARD_SIZE)] for _ in range(self.BOARD_SIZE)]
-        
-        # Set up pawns
-        for col in range(self.BOARD_SIZE):
-            board[1][col] = 'p'  # Black pawns
-            board[6][col] = 'P'  # White pawns
-        
-        # Set up back ranks
-        back_rank = ['r', 'n', 'b', 'q', 'k', 'b', 'n', 'r']
-        for col in range(self.BOARD_SIZE):
-            board[0][col] = back_rank[col]  # Black pieces
-            board[7][col] = back_rank[col].upper()  # White pieces
-            
-        return board
-    
-    def draw_board(self):
-        # Clear the canvas
-        self.board_canvas.delete("square")
-        
-        # Draw the squares
+    def create_board_items(self):
+        # Every canvas item is created once here and afterwards only updated
+        # in place: the squares and coordinate labels never change, each
+        # square has one text item for its piece, and the selection frame
+        # and move dots are moved, shown and hidden as needed
+        canvas = self.board_canvas
         for row in range(self.BOARD_SIZE):
             for col in range(self.BOARD_SIZE):
                 x1 = col * self.SQUARE_SIZE
@@ -206,7 +223,7 @@ class ModifiedChessGame:
                 fill_color = self.BOARD_COLORS[color_idx]
                 
                 # Draw the square
-                self.board_canvas.create_rectangle(
+                canvas.create_rectangle(
                     x1, y1, x2, y2, 
                     fill=fill_color, 
                     outline="", 
@@ -215,7 +232,7 @@ class ModifiedChessGame:
                 
                 # Add coordinate labels
                 if row == 7:  # Bottom edge
-                    self.board_canvas.create_text(
+                    canvas.create_text(
                         x1 + 10, y2 - 10, 
                         text=chr(97 + col),  # 'a' through 'h'
                         fill="#333333" if color_idx == 0 else "#FFFFFF",
@@ -223,7 +240,7 @@ class ModifiedChessGame:
                         tags="square"
                     )
                 if col == 0:  # Left edge
-                    self.board_canvas.create_text(
+                    canvas.create_text(
                         x1 + 10, y1 + 10, 
                         text=str(8 - row),  # '8' through '1'
                         fill="#333333" if color_idx == 0 else "#FFFFFF",
@@ -231,68 +248,98 @@ class ModifiedChessGame:
                         tags="square"
                     )
         
+        # Highlight for the selected square, hidden until something is selected
+        self.selection_item = canvas.create_rectangle(
+            0, 0, 0, 0, 
+            outline="#3498db", 
+            width=3, 
+            state="hidden",
+            tags="selection"
+        )
+        
+        # Pool of legal move dots, enough for a bishop in the middle of an
+        # open board; draw_board adds more if a piece ever needs them
+        self.move_dots = [self.create_move_dot() for _ in range(MOVE_DOT_POOL)]
+        self.visible_dots = 0
+        
+        # One piece item per square (empty text when the square is empty),
+        # created last so pieces stay above the dots
+        self.piece_items = []
+        self.drawn_pieces = []
+        for row in range(self.BOARD_SIZE):
+            item_row = []
+            for col in range(self.BOARD_SIZE):
+                item_row.append(canvas.create_text(
+                    col * self.SQUARE_SIZE + self.SQUARE_SIZE // 2,
+                    row * self.SQUARE_SIZE + self.SQUARE_SIZE // 2,
+                    text="",
+                    font=("Arial", 36),
+                    tags="piece"
+                ))
+            self.piece_items.append(item_row)
+            self.drawn_pieces.append([''] * self.BOARD_SIZE)
+    
+    def create_move_dot(self):
+        return self.board_canvas.create_oval(
+            0, 0, 0, 0,
+            fill="#3498db",
+            outline="",
+            state="hidden",
+            tags="move_dot"
+        )
+    
+    def draw_board(self):
+        # Move the selection frame and move dots to match the selection
+        canvas = self.board_canvas
+        legal_moves = []
+        
         # If a square is selected, highlight it
         if self.selected_square:
             row, col = self.selected_square
             x1 = col * self.SQUARE_SIZE
             y1 = row * self.SQUARE_SIZE
-            x2 = x1 + self.SQUARE_SIZE
-            y2 = y1 + self.SQUARE_SIZE
-            
-            # Draw highlight
-            self.board_canvas.create_rectangle(
-                x1, y1, x2, y2, 
-                outline="#3498db", 
-                width=3, 
-                tags="square"
-            )
+            canvas.coords(self.selection_item, x1, y1, x1 + self.SQUARE_SIZE, y1 + self.SQUARE_SIZE)
+            canvas.itemconfig(self.selection_item, state="normal")
             
             # Highlight legal moves
             if self.selected_piece:
-                legal_moves = self.get_legal_moves(row, col)
-                for move_row, move_col in legal_moves:
-                    x1 = move_col * self.SQUARE_SIZE
-                    y1 = move_row * self.SQUARE_SIZE
-                    x2 = x1 + self.SQUARE_SIZE
-                    y2 = y1 + self.SQUARE_SIZE
-                    
-                    # Draw a dot for legal moves
-                    self.board_canvas.create_oval(
-                        x1 + self.SQUARE_SIZE/2 - 5,
-                        y1 + self.SQUARE_SIZE/2 - 5,
-                        x1 + self.SQUARE_SIZE/2 + 5,
-                        y1 + self.SQUARE_SIZE/2 + 5,
-                        fill="#3498db",
-                        outline="",
-                        tags="square"
-                    )
+                legal_moves = self.position.get_legal_moves(row, col)
+        else:
+            canvas.itemconfig(self.selection_item, state="hidden")
+        
+        while len(self.move_dots) < len(legal_moves):
+            dot = self.create_move_dot()
+            canvas.tag_lower(dot, "piece")
+            self.move_dots.append(dot)
+        
+        # Draw a dot for legal moves, and hide the dots no longer needed
+        for index, (move_row, move_col) in enumerate(legal_moves):
+            x = move_col * self.SQUARE_SIZE + self.SQUARE_SIZE / 2
+            y = move_row * self.SQUARE_SIZE + self.SQUARE_SIZE / 2
+            dot = self.move_dots[index]
+            canvas.coords(dot, x - 5, y - 5, x + 5, y + 5)
+            canvas.itemconfig(dot, state="normal")
+        for dot in self.move_dots[len(legal_moves):self.visible_dots]:
+            canvas.itemconfig(dot, state="hidden")
+        self.visible_dots = len(legal_moves)
     
     def draw_pieces(self):
-        # Clear existing pieces
-        self.board_canvas.delete("piece")
-        
-        # Draw pieces based on the current board state
+        # Update only the squares whose piece differs from what is drawn
+        board = self.position.board
         for row in range(self.BOARD_SIZE):
             for col in range(self.BOARD_SIZE):
-                piece = self.board[row][col]
-                if piece:
-                    x = col * self.SQUARE_SIZE + self.SQUARE_SIZE // 2
-                    y = row * self.SQUARE_SIZE + self.SQUARE_SIZE // 2
-                    
+                piece = board[row][col]
+                if piece != self.drawn_pieces[row][col]:
                     # Draw the piece (text-based for this implementation)
-                    color = "white" if piece.isupper() else "black"
-                    symbol = self.piece_images[piece]
-                    
-                    self.board_canvas.create_text(
-                        x, y,
-                        text=symbol,
-                        fill=color,
-                        font=("Arial", 36),
-                        tags="piece"
+                    self.board_canvas.itemconfig(
+                        self.piece_items[row][col],
+                        text=self.piece_images[piece] if piece else "",
+                        fill="white" if piece.isupper() else "black"
                     )
+                    self.drawn_pieces[row][col] = piece
     
     def handle_click(self, event):
-        if self.game_over or (self.current_player == "black" and not self.selected_piece):
+        if self.game_over or (self.position.current_player == "black" and not self.selected_piece):
             return  # Ignore clicks if the game is over or it's AI's turn
         
         # Convert click coordinates to board position
@@ -301,30 +348,33 @@ class ModifiedChessGame:
         
         # Check if the click is within the board
         if 0 <= row < self.BOARD_SIZE and 0 <= col < self.BOARD_SIZE:
+            position = self.position
             if self.selected_piece:
                 # A piece is already selected, try to move it
-                legal_moves = self.get_legal_moves(self.selected_square[0], self.selected_square[1])
+                legal_moves = position.get_legal_moves(self.selected_square[0],
+                                                       self.selected_square[1])
                 if (row, col) in legal_moves:
-                    # Valid move
-                    self.make_move(self.selected_square[0], self.selected_square[1], row, col)
+                    # Valid move; a pawn reaching the last rank always becomes a queen
+                    promotion = QUEEN if self.selected_piece == 'P' and row == 0 else 0
+                    self.make_move(self.selected_square[0], self.selected_square[1], row, col,
+                                   promotion)
                     self.selected_piece = None
                     self.selected_square = None
                     
                     # Check for game-ending conditions
-                    if self.is_checkmate("black"):
+                    if position.is_checkmate(BLACK):
                         self.game_over = True
                         messagebox.showinfo("Game Over", "Checkmate! White wins!")
-                    elif self.is_stalemate("black"):
+                    elif position.is_stalemate(BLACK):
                         self.game_over = True
                         messagebox.showinfo("Game Over", "Stalemate! The game is a draw.")
-                    else:
+                    elif not self.check_draw():
                         # AI's turn
-                        self.current_player = "black"
                         self.update_status_displays()
                         self.root.after(500, self.ai_move)  # Slight delay before AI moves
-                elif self.board[row][col] and (self.board[row][col].isupper() if self.current_player == "white" else self.board[row][col].islower()):
+                elif position.is_own_piece(position.squares[row * 16 + col], position.side):
                     # Clicked on a friendly piece, select it instead
-                    self.selected_piece = self.board[row][col]
+                    self.selected_piece = position.piece_at(row, col)
                     self.selected_square = (row, col)
                 else:
                     # Invalid move, deselect
@@ -332,323 +382,53 @@ class ModifiedChessGame:
                     self.selected_square = None
             else:
                 # No piece is selected yet
-                piece = self.board[row][col]
-                if piece and (piece.isupper() if self.current_player == "white" else piece.islower()):
+                if position.is_own_piece(position.squares[row * 16 + col], position.side):
                     # Selected a piece of the current player
-                    self.selected_piece = piece
+                    self.selected_piece = position.piece_at(row, col)
                     self.selected_square = (row, col)
             
             # Redraw the board to show selection and legal moves
             self.draw_board()
             self.draw_pieces()
     
-    def make_move(self, from_row, from_col, to_row, to_col):
-        # Record the move
-        piece = self.board[from_row][from_col]
-        captured = self.board[to_row][to_col]
-        move_str = f"{self.get_algebraic_notation(piece, from_row, from_col, to_row, to_col, captured)}"
-        self.move_history.append(move_str)
-        self.history_listbox.insert(tk.END, f"{len(self.move_history)}. {move_str}")
-        self.history_listbox.see(tk.END)  # Scroll to show the latest move
-        
-        # Update the board
-        self.board[to_row][to_col] = self.board[from_row][from_col]
-        self.board[from_row][from_col] = ''
-        
-        # Check for check status
-        opponent = "black" if self.current_player == "white" else "white"
-        self.check_status[opponent] = self.is_in_check(opponent)
+    def make_move(self, from_row, from_col, to_row, to_col, promotion=0):
+        # Play the move on the position, then record it in the move history
+        piece = self.position.piece_at(from_row, from_col)
+        captured = self.position.make_move(
+            coords_to_move(from_row, from_col, to_row, to_col, promotion))
+        self.record_move(piece, from_row, from_col, to_row, to_col, PIECE_LETTERS[captured],
+                         PIECE_LETTERS[promotion])
+        
+        # Check for check status (the position has already switched sides)
+        player = self.position.current_player
+        self.check_status[player] = self.position.is_in_check(self.position.side)
         
         # Update the UI
         self.update_status_displays()
     
-    def get_algebraic_notation(self, piece, from_row, from_col, to_row, to_col, captured):
-        # Convert the move to algebraic notation
-        piece_symbols = {'P': '', 'N': 'N', 'B': 'B', 'R': 'R', 'Q': 'Q', 'K': 'K',
-                        'p': '', 'n': 'N', 'b': 'B', 'r': 'R', 'q': 'Q', 'k': 'K'}
-        piece_sym = piece_symbols[piece]
-        capture_sym = 'x' if captured else ''
-        
-        # Convert board coordinates to algebraic notation
-        from_alg = chr(97 + from_col) + str(8 - from_row)
-        to_alg = chr(97 + to_col) + str(8 - to_row)
-        
-        # For pawns, include the file when capturing
-        if piece.upper() == 'P' and captured:
-            return f"{chr(97 + from_col)}{capture_sym}{to_alg}"
-        
-        return f"{piece_sym}{capture_sym}{to_alg}"
-    
-    def get_legal_moves(self, row, col):
-        piece = self.board[row][col]
-        if not piece:
-            return []
-        
-        # Determine if we're looking at a white or black piece
-        is_white = piece.isupper()
-        
-        # Get possible moves based on piece type
-        moves = []
-        piece_type = piece.upper()
-        
-        if piece_type == 'P':  # Pawn
-            moves = self.get_pawn_moves(row, col, is_white)
-        elif piece_type == 'N':  # Knight
-            moves = self.get_knight_moves(row, col, is_white)
-        elif piece_type == 'B':  # Modified Bishop (moves like a Queen)
-            moves = self.get_bishop_as_queen_moves(row, col, is_white)
-        elif piece_type == 'R':  # Rook
-            moves = self.get_rook_moves(row, col, is_white)
-        elif piece_type == 'Q':  # Queen
-            moves = self.get_queen_moves(row, col, is_white)
-        elif piece_type == 'K':  # King
-            moves = self.get_king_moves(row, col, is_white)
-        
-        # Filter out moves that would leave the king in check
-        legal_moves = []
-        for move_row, move_col in moves:
-            # Make a temporary move
-            temp_board = [row[:] for row in self.board]  # Deep copy
-            temp_board[move_row][move_col] = temp_board[row][col]
-            temp_board[row][col] = ''
-            
-            # Check if the king is in check after this move
-            temp_game = ModifiedChessGame.__new__(ModifiedChessGame)  # Create instance without __init__
-            temp_game.board = temp_board
-            temp_game.BOARD_SIZE = self.BOARD_SIZE
-            
-            player = "white" if is_white else "black"
-            if not temp_game.is_in_check(player):
-                legal_moves.append((move_row, move_col))
-        
-        return legal_moves
-    
-    def get_pawn_moves(self, row, col, is_white):
-        moves = []
-        
-        # Determine direction based on color
-        direction = -1 if is_white else 1
-        starting_row = 6 if is_white else 1
-        
-        # Forward move
-        new_row = row + direction
-        if 0 <= new_row < self.BOARD_SIZE and not self.board[new_row][col]:
-            moves.append((new_row, col))
-            
-            # Double move from starting position
-            if row == starting_row and not self.board[new_row + direction][col]:
-                moves.append((new_row + direction, col))
-        
-        # Capture moves
-        for c in [col - 1, col + 1]:
-            if 0 <= new_row < self.BOARD_SIZE and 0 <= c < self.BOARD_SIZE:
-                target = self.board[new_row][c]
-                if target and (target.islower() if is_white else target.isupper()):
-                    moves.append((new_row, c))
-        
-        return moves
-    
-    def get_knight_moves(self, row, col, is_white):
-        moves = []
-        
-        # All possible knight moves
-        knight_moves = [
-            (-2, -1), (-2, 1), (-1, -2), (-1, 2),
-            (1, -2), (1, 2), (2, -1), (2, 1)
-        ]
-        
-        for dr, dc in knight_moves:
-            new_row, new_col = row + dr, col + dc
-            
-            # Check if the move is within the board
-            if 0 <= new_row < self.BOARD_SIZE and 0 <= new_col < self.BOARD_SIZE:
-                target = self.board[new_row][new_col]
-                
-                # Empty square or enemy piece
-                if not target or (target.islower() if is_white else target.isupper()):
-                    moves.append((new_row, new_col))
-        
-        return moves
-    
-    def get_bishop_as_queen_moves(self, row, col, is_white):
-        # Bishop now moves like a queen (diagonally + horizontally/vertically)
-        # This is the key modification for the project
-        return self.get_queen_moves(row, col, is_white)
-    
-    def get_rook_moves(self, row, col, is_white):
-        moves = []
-        
-        # Horizontal and vertical directions
-        directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
-        
-        for dr, dc in directions:
-            for steps in range(1, self.BOARD_SIZE):
-                new_row, new_col = row + dr * steps, col + dc * steps
-                
-                # Check if the move is within the board
-                if not (0 <= new_row < self.BOARD_SIZE and 0 <= new_col < self.BOARD_SIZE):
-                    break
-                
-                target = self.board[new_row][new_col]
-                
-                if not target:  # Empty square
-                    moves.append((new_row, new_col))
-                elif (target.islower() if is_white else target.isupper()):  # Enemy piece
-                    moves.append((new_row, new_col))
-                    break
-                else:  # Friendly piece
-                    break
-        
-        return moves
-    
-    def get_queen_moves(self, row, col, is_white):
-        moves = []
-        
-        # Horizontal, vertical, and diagonal directions
-        directions = [
-            (0, 1), (1, 0), (0, -1), (-1, 0),  # Horizontal and vertical
-            (1, 1), (1, -1), (-1, 1), (-1, -1)  # Diagonal
-        ]
-        
-        for dr, dc in directions:
-            for steps in range(1, self.BOARD_SIZE):
-                new_row, new_col = row + dr * steps, col + dc * steps
-                
-                # Check if the move is within the board
-                if not (0 <= new_row < self.BOARD_SIZE and 0 <= new_col < self.BOARD_SIZE):
-                    break
-                
-                target = self.board[new_row][new_col]
-                
-                if not target:  # Empty square
-                    moves.append((new_row, new_col))
-                elif (target.islower() if is_white else target.isupper()):  # Enemy piece
-                    moves.append((new_row, new_col))
-                    break
-                else:  # Friendly piece
-                    break
-        
-        return moves
-    
-    def get_king_moves(self, row, col, is_white):
-        moves = []
-        
-        # All directions (horizontal, vertical, diagonal)
-        directions = [
-            (-1, -1), (-1, 0), (-1, 1),
-            (0, -1), (0, 1),
-            (1, -1), (1, 0), (1, 1)
-        ]
-        
-        for dr, dc in directions:
-            new_row, new_col = row + dr, col + dc
-            
-            # Check if the move is within the board
-            if 0 <= new_row < self.BOARD_SIZE and 0 <= new_col < self.BOARD_SIZE:
-                target = self.board[new_row][new_col]
-                
-                # Empty square or enemy piece
-                if not target or (target.islower() if is_white else target.isupper()):
-                    moves.append((new_row, new_col))
-        
-        return moves
-    
-    def find_king(self, player):
-        # Find the position of the king for the given player
-        king = 'K' if player == "white" else 'k'
-        
-        for row in range(self.BOARD_SIZE):
-            for col in range(self.BOARD_SIZE):
-                if self.board[row][col] == king:
-                    return row, col
-        
-        return None  # Should never happen in a valid chess game
-    
-    def is_in_check(self, player):
-        # Find the king's position
-        king_pos = self.find_king(player)
-        if not king_pos:
+    def check_draw(self):
+        # End the game if it is drawn by repetition or the fifty-move rule
+        if self.position.is_repetition():
+            message = "Threefold repetition! The game is a draw."
+        elif self.position.is_fifty_move_draw():
+            message = "Fifty moves without a capture or pawn move! The game is a draw."
+        else:
             return False
-        
-        king_row, king_col = king_pos
-        
-        # Check if any opponent's piece can capture the king
-        opponent = "black" if player == "white" else "white"
-        
-        for row in range(self.BOARD_SIZE):
-            for col in range(self.BOARD_SIZE):
-                piece = self.board[row][col]
-                
-                # Check if it's an opponent's piece
-                if piece and ((piece.islower() and opponent == "black") or (piece.isupper() and opponent == "white")):
-                    # Get all possible moves for this piece
-                    # We need a temporary game state to avoid infinite recursion
-                    temp_game = ModifiedChessGame.__new__(ModifiedChessGame)  # Create instance without __init__
-                    temp_game.board = self.board
-                    temp_game.BOARD_SIZE = self.BOARD_SIZE
-                    
-                    if piece.upper() == 'P':
-                        moves = temp_game.get_pawn_moves(row, col, piece.isupper())
-                    elif piece.upper() == 'N':
-                        moves = temp_game.get_knight_moves(row, col, piece.isupper())
-                    elif piece.upper() == 'B':
-                        moves = temp_game.get_bishop_as_queen_moves(row, col, piece.isupper())
-                    elif piece.upper() == 'R':
-                        moves = temp_game.get_rook_moves(row, col, piece.isupper())
-                    elif piece.upper() == 'Q':
-                        moves = temp_game.get_queen_moves(row, col, piece.isupper())
-                    elif piece.upper() == 'K':
-                        moves = temp_game.get_king_moves(row, col, piece.isupper())
-                    else:
-                        moves = []
-                    
-                    # Check if the king's position is in the list of possible moves
-                    if (king_row, king_col) in moves:
-                        return True
-        
-        return False
-    
-    def is_checkmate(self, player):
-        # First, check if the player is in check
-        if not self.is_in_check(player):
-            return False
-        
-        # Check if there are any legal moves that can get out of check
-        for row in range(self.BOARD_SIZE):
-            for col in range(self.BOARD_SIZE):
-                piece = self.board[row][col]
-                
-                # Check if it's a piece of the current player
-                if piece and ((piece.isupper() and player == "white") or (piece.islower() and player == "black")):
-                    legal_moves = self.get_legal_moves(row, col)
-                    if legal_moves:
-                        return False
-        
-        # No legal moves to get out of check
-        return True
-    
-    def is_stalemate(self, player):
-        # Check if the player is not in check
-        if self.is_in_check(player):
-            return False
-        
-        # Check if there are any legal moves
-        for row in range(self.BOARD_SIZE):
-            for col in range(self.BOARD_SIZE):
-                piece = self.board[row][col]
-                
-                # Check if it's a piece of the current player
-                if piece and ((piece.isupper() and player == "white") or (piece.islower() and player == "black")):
-                    legal_moves = self.get_legal_moves(row, col)
-                    if legal_moves:
-                        return False
-        
-        # No legal moves, but not in check
+        self.game_over = True
+        messagebox.showinfo("Game Over", message)
         return True
+
+    def record_move(self, piece, from_row, from_col, to_row, to_col, captured, promotion=''):
+        move_str = get_algebraic_notation(piece, from_row, from_col, to_row, to_col, captured,
+                                          promotion)
+        self.move_history.append(move_str)
+        self.history_listbox.insert(tk.END, f"{len(self.move_history)}. {move_str}")
+        self.history_listbox.see(tk.END)  # Scroll to show the latest move
     
     def update_status_displays(self):
         # Update current player label
-        self.player_label.config(text=f"Current Player: {'White' if self.current_player == 'white' else 'Black'}")
+        player = 'White' if self.position.current_player == 'white' else 'Black'
+        self.player_label.config(text=f"Current Player: {player}")
         
         # Update check status label
         check_text = ""
@@ -661,20 +441,12 @@ class ModifiedChessGame:
  
 
     def ai_move(self):
-        if self.game_over or self.current_player != "black":
+        position = self.position
+        if self.game_over or position.current_player != "black":
             return
 
-        all_moves = []
-        for row in range(self.BOARD_SIZE):
-            for col in range(self.BOARD_SIZE):
-                piece = self.board[row][col]
-                if piece and piece.islower():  # Black piece
-                    legal_moves = self.get_legal_moves(row, col)
-                    for to_row, to_col in legal_moves:
-                        all_moves.append((row, col, to_row, to_col))
-
-        if not all_moves:
-            if self.is_in_check("black"):
+        if not position.has_legal_move(BLACK):
+            if position.is_in_check(BLACK):
                 self.game_over = True
                 messagebox.showinfo("Game Over", "Checkmate! White wins!")
             else:
@@ -682,46 +454,51 @@ class ModifiedChessGame:
                 messagebox.showinfo("Game Over", "Stalemate! The game is a draw.")
             return
 
-        best_moves = []
-        best_score = float('-inf')
+        # Book moves are played straight away
+        if self.book is not None:
+            move = self.book.choose(position)
+            if move is not None:
+                self.play_ai_move(move)
+                return
 
-        for from_row, from_col, to_row, to_col in all_moves:
-            temp_board = [r[:] for r in self.board]
-            captured_piece = temp_board[to_row][to_col]
-            temp_board[to_row][to_col] = temp_board[from_row][from_col]
-            temp_board[from_row][from_col] = ''
+        # Think in the background and check back for the answer
+        self.ai_job = self.worker.start_search(position, AI_TIME_LIMIT)
+        self.thinking_label.config(text="Thinking...")
+        self.root.after(AI_POLL_INTERVAL, self.poll_ai_move)
 
-            score = self.evaluate_position(temp_board)
+    def poll_ai_move(self):
+        if self.ai_job is None or self.ai_job != self.worker.job_id:
+            return  # The search was cancelled (e.g. by New Game)
 
-            if captured_piece:
-                score += abs(self.piece_values.get(captured_piece, 0))
+        for message in self.worker.poll():
+            if message[0] == "info":
+                info = message[2]
+                self.thinking_label.config(
+                    text=f"Thinking... depth {info['depth']}, {info['nps']:,} nodes/s")
+            elif message[0] == "result":
+                self.ai_job = None
+                self.thinking_label.config(text="")
+                self.play_ai_move(message[2])
+                return
 
-            if score > best_score:
-                best_score = score
-                best_moves = [(from_row, from_col, to_row, to_col)]
-            elif score == best_score:
-                best_moves.append((from_row, from_col, to_row, to_col))
+        self.root.after(AI_POLL_INTERVAL, self.poll_ai_move)
 
-        move = random.choice(best_moves)
-        self.make_move(move[0], move[1], move[2], move[3])
-        self.current_player = "white"
+    def play_ai_move(self, move):
+        self.make_move(*move_to_coords(move), move_promotion(move))
         self.selected_piece = None
         self.selected_square = None
         self.draw_board()
         self.draw_pieces()
         self.update_status_displays()
-
-    def evaluate_position(self, board_state):
-        score = 0
-        for row in board_state:
-            for piece in row:
-                if piece in self.piece_values:
-                    score += self.piece_values[piece]
-        return score
+        self.check_draw()
 
     def new_game(self):
-        self.board = self.create_initial_board()
-        self.current_player = "white"
+        # Abandon any search still running for the old game
+        if self.ai_job is not None:
+            self.worker.cancel()
+            self.ai_job = None
+        self.thinking_label.config(text="")
+        self.position = ChessPosition()
         self.selected_piece = None
         self.selected_square = None
         self.game_over = False
@@ -737,3 +514,4 @@ if __name__ == "__main__":
     root = tk.Tk()
     app = ModifiedChessGame(root)
     root.mainloop()
+    app.worker.shutdown()
@@ -0,0 +1,178 @@
+# Vectorized evaluation of many positions at once, with NumPy.
+#
+# Positions are encoded as an (N, 64) int8 array of board_layout piece
+# codes (0 for an empty square). Column row * 8 + col holds square (row,
+# col), row 0 being the 8th rank, which is position.board read row by row.
+# one_hot() turns an encoding into (N, 12, 64) planes, one per letter of
+# PLANE_LETTERS, for code that prefers those.
+#
+# evaluate_batch() scores every row in one call. Each (piece, square) pair
+# looks up its material plus piece-square value in a (16, 64) table built
+# from evaluation.py, and the values are summed per row. The lookups go
+# one square at a time over all rows of a transposed copy of the encoding,
+# so each is a gather from a 16-entry table over contiguous memory. The
+# scores equal evaluate_board(), which is what positions keep in
+# position.evaluation. material_batch() equals
+# ChessPosition.evaluate_position() (material in pawns). Other weights,
+# e.g. a tuned parameter file, go in as a table from square_value_table().
+#
+# NumPy is only needed here and in texel_tuner.py; the game and the engine
+# do not use it.
+#
+# Usage:
+#   python batch_eval.py --positions 100000
+# benchmarks the batch path against the scalar one on positions from
+# random games and checks that both give the same scores.
+
+import argparse
+import random
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError("batch_eval.py needs NumPy: pip install numpy") from error
+
+from board_layout import PIECE_CODES, PIECE_LETTERS, SQUARES
+from chess_rules import ChessPosition
+from evaluation import PIECE_SQUARE_TABLES, PIECE_VALUES, build_square_values, evaluate_board
+
+PLANE_LETTERS = "PNBRQKpnbrqk"
+PLANE_CODES = np.array([PIECE_CODES[letter] for letter in PLANE_LETTERS], dtype=np.int8)
+
+# Column of each 0x88 square in the encoding
+SQUARE_COLUMNS = np.array(SQUARES, dtype=np.intp)
+
+DEFAULT_POSITIONS = 100000
+
+
+def encode_boards(boards):
+    # (N, 64) int8 codes from 8x8 letter grids as given by position.board
+    return np.array([[PIECE_CODES.get(piece, 0) for row in board for piece in row]
+                     for board in boards], dtype=np.int8).reshape(-1, 64)
+
+
+def encode_positions(positions):
+    # (N, 64) int8 codes straight from the positions' 0x88 boards
+    raw = np.frombuffer(b"".join(bytes(position.squares) for position in positions),
+                        dtype=np.int8)
+    return raw.reshape(-1, 128)[:, SQUARE_COLUMNS]
+
+
+def decode_boards(encoded):
+    # 8x8 letter grids back from (N, 64) codes
+    return [[[PIECE_LETTERS[code] for code in row[start:start + 8]]
+             for start in range(0, 64, 8)] for row in encoded.tolist()]
+
+
+def one_hot(encoded):
+    # (N, 12, 64) int8 planes, 1 where the plane's piece stands
+    return (encoded[:, None, :] == PLANE_CODES[None, :, None]).astype(np.int8)
+
+
+def square_value_table(piece_values=PIECE_VALUES, tables=PIECE_SQUARE_TABLES):
+    # (16, 64) centipawn values per piece code and square, as used by
+    # ChessPosition: material plus piece-square bonus, negative for Black
+    square_values = build_square_values(piece_values, tables)
+    return np.array([[values[sq] for sq in SQUARES] for values in square_values],
+                    dtype=np.int32)
+
+
+def material_table(piece_values=PIECE_VALUES):
+    # (16,) material in pawns per piece code; tuned values have fractions
+    whole = all(isinstance(value, int) for value in piece_values.values())
+    table = np.zeros(16, dtype=np.int32 if whole else np.float64)
+    for letter, value in piece_values.items():
+        table[PIECE_CODES[letter]] = value
+    return table
+
+
+DEFAULT_TABLE = square_value_table()
+DEFAULT_MATERIAL = material_table()
+
+
+def _sum_by_square(encoded, per_square):
+    # Sum over the squares of per_square[square][code] for every row;
+    # per_square is (64, 16), of integers or (for the tuner) floats
+    by_square = np.ascontiguousarray(encoded.T)
+    scores = np.zeros(len(encoded), dtype=per_square.dtype)
+    for column in range(64):
+        scores += per_square[column].take(by_square[column])
+    return scores
+
+
+def evaluate_batch(encoded, table=None):
+    # Centipawn scores (White's view) of every row of an (N, 64) encoding
+    table = DEFAULT_TABLE if table is None else table
+    return _sum_by_square(encoded, np.ascontiguousarray(table.T))
+
+
+def material_batch(encoded, table=None):
+    # Material balance in pawns (White's view) of every row
+    table = DEFAULT_MATERIAL if table is None else table
+    return _sum_by_square(encoded, np.broadcast_to(table, (64, 16)))
+
+
+def random_positions(count, rng, max_plies=120):
+    # Positions met along random games, for benchmarking
+    positions = []
+    while len(positions) < count:
+        position = ChessPosition()
+        for _ in range(max_plies):
+            moves = position.get_all_legal_moves()
+            if not moves or len(positions) >= count:
+                break
+            position.make_move(rng.choice(moves))
+            positions.append(position.copy())
+    return positions
+
+
+def benchmark(positions):
+    def timed(function):
+        start = time.perf_counter()
+        value = function()
+        return value, time.perf_counter() - start
+
+    scalar, scalar_time = timed(lambda: [evaluate_board(p.squares) for p in positions])
+    scalar_material, material_time = timed(lambda: [p.evaluate_position() for p in positions])
+    encoded, encode_time = timed(lambda: encode_positions(positions))
+    batch, batch_time = timed(lambda: evaluate_batch(encoded))
+    batch_material, batch_material_time = timed(lambda: material_batch(encoded))
+
+    if batch.tolist() != scalar or batch_material.tolist() != scalar_material:
+        raise AssertionError("batch and scalar evaluations differ")
+    if decode_boards(encoded[:100]) != [p.board for p in positions[:100]]:
+        raise AssertionError("encoding does not round-trip")
+
+    count = len(positions)
+    rows = [
+        ("scalar evaluate_board", scalar_time),
+        ("scalar evaluate_position", material_time),
+        ("encode", encode_time),
+        ("evaluate_batch", batch_time),
+        ("material_batch", batch_material_time),
+        ("encode + evaluate_batch", encode_time + batch_time),
+    ]
+    for name, seconds in rows:
+        rate = int(count / seconds) if seconds else 0
+        print(f"{name:<26} {seconds:>8.3f}s {rate:>12} positions/s")
+    print(f"Speedup of evaluate_batch over evaluate_board: {scalar_time / batch_time:.1f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the NumPy batch evaluator")
+    parser.add_argument("--positions", type=int, default=DEFAULT_POSITIONS,
+                        help="number of positions to evaluate")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the random games")
+    args = parser.parse_args(argv)
+
+    print(f"Generating {args.positions} positions...")
+    positions = random_positions(args.positions, random.Random(args.seed))
+    benchmark(positions)
+    print("Batch and scalar scores agree")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# Piece codes, square numbering and move encoding for Modified Chess.
+#
+# Squares use the 0x88 layout: square = row * 16 + col, with row 0 the 8th
+# rank as on the GUI's board. Columns 8-15 of every row are never used, so
+# any step off the board lands on a square with bit 0x08 or 0x80 set and
+# `square & 0x88` is the whole bounds check (negative squares included).
+#
+# Pieces are small integers: the piece type in the low three bits, plus
+# BLACK for black pieces. `piece & BLACK` is the colour test and
+# `piece & TYPE_MASK` the type; EMPTY (0) is an empty square.
+#
+# A move is one integer, from_square | to_square << 7 | promotion << 14,
+# where promotion is the piece type a pawn turns into (0 for every other
+# move). Castling (the king moving two squares) and en passant (a pawn
+# moving diagonally onto the en passant square) are told apart by the board.
+#
+# This module imports nothing, so the rules, hashing and evaluation
+# modules can all share it without circular imports.
+
+BOARD_SIZE = 8
+OFF_BOARD = 0x88
+
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+TYPE_MASK = 7
+
+# Colour bit of a piece, and the value of ChessPosition.side
+WHITE, BLACK = 0, 8
+
+PIECE_LETTERS = ['', 'P', 'N', 'B', 'R', 'Q', 'K', '', '', 'p', 'n', 'b', 'r', 'q', 'k', '']
+PIECE_CODES = {letter: code for code, letter in enumerate(PIECE_LETTERS) if letter}
+
+# Castling rights, one bit each
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+ALL_CASTLING = 15
+
+# Piece types a pawn may promote to, best first
+PROMOTION_PIECES = (QUEEN, BISHOP, ROOK, KNIGHT)
+
+SIDE_NAMES = {WHITE: "white", BLACK: "black"}
+PLAYER_SIDES = {"white": WHITE, "black": BLACK}
+
+# Steps between neighbouring squares; -16 is one row up (towards rank 8)
+KNIGHT_STEPS = (-33, -31, -18, -14, 14, 18, 31, 33)
+KING_STEPS = (-17, -16, -15, -1, 1, 15, 16, 17)
+ROOK_STEPS = (1, 16, -1, -16)
+BISHOP_STEPS = (17, 15, -15, -17)
+QUEEN_STEPS = ROOK_STEPS + BISHOP_STEPS
+
+# The 64 real squares in board order (a8, b8, ..., h1)
+SQUARES = [row * 16 + col for row in range(BOARD_SIZE) for col in range(BOARD_SIZE)]
+
+# Index 0-63 of each real square, for tables stored per square
+SQUARE_INDEX = [0] * 128
+for _index, _square in enumerate(SQUARES):
+    SQUARE_INDEX[_square] = _index
+
+
+def square(row, col):
+    return row * 16 + col
+
+
+def square_coords(sq):
+    return sq >> 4, sq & 7
+
+
+def encode_move(from_square, to_square, promotion=0):
+    return from_square | to_square << 7 | promotion << 14
+
+
+def move_from(move):
+    return move & 0x7F
+
+
+def move_to(move):
+    return move >> 7 & 0x7F
+
+
+def move_promotion(move):
+    return move >> 14
+
+
+def coords_to_move(from_row, from_col, to_row, to_col, promotion=0):
+    return (from_row * 16 + from_col) | (to_row * 16 + to_col) << 7 | promotion << 14
+
+
+def move_to_coords(move):
+    # (from_row, from_col, to_row, to_col), as the GUI works with them
+    from_square = move & 0x7F
+    to_square = move >> 7 & 0x7F
+    return from_square >> 4, from_square & 7, to_square >> 4, to_square & 7
@@ -0,0 +1,856 @@
+# Rules engine for Modified Chess (Bishop with Queen Movement).
+# This module has no GUI dependencies so positions can be created and
+# searched in headless worker processes.
+#
+# Positions are stored on a 0x88 board of integer piece codes, and moves
+# are single integers; see board_layout.py for both.
+
+from board_layout import (ALL_CASTLING, BISHOP, BISHOP_STEPS, BLACK, BLACK_KINGSIDE,
+                          BLACK_QUEENSIDE, BOARD_SIZE, EMPTY, KING, KING_STEPS, KNIGHT,
+                          KNIGHT_STEPS, OFF_BOARD, PAWN, PIECE_CODES, PIECE_LETTERS, PLAYER_SIDES,
+                          PROMOTION_PIECES, QUEEN, QUEEN_STEPS, ROOK, ROOK_STEPS, SIDE_NAMES,
+                          SQUARES, TYPE_MASK, WHITE, WHITE_KINGSIDE, WHITE_QUEENSIDE)
+from evaluation import PIECE_VALUES, SQUARE_VALUES, evaluate_board
+from zobrist import (ZOBRIST_BLACK_TO_MOVE, ZOBRIST_CASTLING, ZOBRIST_EN_PASSANT, ZOBRIST_PIECES,
+                     compute_hash)
+
+# Pieces that attack along orthogonal and diagonal rays, indexed by side.
+# The modified bishop slides both ways, the rook only orthogonally.
+SLIDERS_BY_SIDE = {
+    side: (frozenset((BISHOP | side, ROOK | side, QUEEN | side)),
+           frozenset((BISHOP | side, QUEEN | side)))
+    for side in (WHITE, BLACK)
+}
+
+# Castling, indexed by the king's square: per right, the king's
+# destination, the rook's square and the squares that must be empty (none
+# away from the two home squares). The rook ends up on the square the king
+# passes over.
+CASTLING_PATHS = [()] * 128
+CASTLING_PATHS[0x74] = ((WHITE_KINGSIDE, 0x76, 0x77, (0x75, 0x76)),
+                        (WHITE_QUEENSIDE, 0x72, 0x70, (0x73, 0x72, 0x71)))
+CASTLING_PATHS[0x04] = ((BLACK_KINGSIDE, 0x06, 0x07, (0x05, 0x06)),
+                        (BLACK_QUEENSIDE, 0x02, 0x00, (0x03, 0x02, 0x01)))
+
+# Castling rights that survive a move from or to each square: moving the
+# king or a rook, or capturing a rook at home, gives up the matching rights
+CASTLING_MASKS = [ALL_CASTLING] * 128
+CASTLING_MASKS[0x74] = ALL_CASTLING & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[0x77] = ALL_CASTLING & ~WHITE_KINGSIDE
+CASTLING_MASKS[0x70] = ALL_CASTLING & ~WHITE_QUEENSIDE
+CASTLING_MASKS[0x04] = ALL_CASTLING & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASKS[0x07] = ALL_CASTLING & ~BLACK_KINGSIDE
+CASTLING_MASKS[0x00] = ALL_CASTLING & ~BLACK_QUEENSIDE
+
+# A pawn moving from this row promotes on its next step
+PROMOTION_ROWS = {WHITE: 1, BLACK: 6}
+
+# Half-moves without a capture or pawn move that make the game a draw
+FIFTY_MOVE_PLIES = 100
+
+
+def create_initial_board():
+    # Create an 8x8 board with pieces in the starting position
+    board = [['' for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+
+    # Set up pawns
+    for col in range(BOARD_SIZE):
+        board[1][col] = 'p'  # Black pawns
+        board[6][col] = 'P'  # White pawns
+
+    # Set up back ranks
+    back_rank = ['r', 'n', 'b', 'q', 'k', 'b', 'n', 'r']
+    for col in range(BOARD_SIZE):
+        board[0][col] = back_rank[col]  # Black pieces
+        board[7][col] = back_rank[col].upper()  # White pieces
+
+    return board
+
+
+def opponent_of(player):
+    return "black" if player == "white" else "white"
+
+
+def format_move(move):
+    # Coordinate notation for a move, e.g. "e2e4", or "e7e8q" for a promotion
+    from_square = move & 0x7F
+    to_square = move >> 7 & 0x7F
+    return (f"{chr(97 + (from_square & 7))}{8 - (from_square >> 4)}"
+            f"{chr(97 + (to_square & 7))}{8 - (to_square >> 4)}"
+            f"{PIECE_LETTERS[move >> 14].lower()}")
+
+
+def parse_move(text):
+    # Inverse of format_move: "e2e4" -> the move from e2 to e4
+    text = text.strip().lower()
+    if (len(text) not in (4, 5) or text[0] not in "abcdefgh" or text[2] not in "abcdefgh"
+            or text[1] not in "12345678" or text[3] not in "12345678"
+            or len(text) == 5 and text[4] not in "nbrq"):
+        raise ValueError(f"Not a coordinate move: {text!r}")
+    from_square = (8 - int(text[1])) * 16 + ord(text[0]) - 97
+    to_square = (8 - int(text[3])) * 16 + ord(text[2]) - 97
+    promotion = PIECE_CODES[text[4].upper()] if len(text) == 5 else 0
+    return from_square | to_square << 7 | promotion << 14
+
+
+def get_algebraic_notation(piece, from_row, from_col, to_row, to_col, captured, promotion=''):
+    # Convert the move to algebraic notation
+    piece_symbols = {'P': '', 'N': 'N', 'B': 'B', 'R': 'R', 'Q': 'Q', 'K': 'K',
+                     'p': '', 'n': 'N', 'b': 'B', 'r': 'R', 'q': 'Q', 'k': 'K'}
+    piece_sym = piece_symbols[piece]
+    capture_sym = 'x' if captured else ''
+
+    # Castling is the king moving two squares along its rank
+    if piece.upper() == 'K' and abs(to_col - from_col) == 2:
+        return "O-O" if to_col > from_col else "O-O-O"
+
+    # Convert board coordinates to algebraic notation
+    to_alg = chr(97 + to_col) + str(8 - to_row)
+
+    # For pawns, include the file when capturing (en passant included), and
+    # the new piece when promoting
+    if piece.upper() == 'P':
+        promotion_sym = f"={promotion.upper()}" if promotion else ''
+        if from_col != to_col:
+            return f"{chr(97 + from_col)}x{to_alg}{promotion_sym}"
+        return f"{to_alg}{promotion_sym}"
+
+    return f"{piece_sym}{capture_sym}{to_alg}"
+
+
+class ChessPosition:
+    # The board is a 128-byte 0x88 array of piece codes. Alongside it the
+    # position keeps piece lists, the set of squares each side occupies
+    # (indexed by side >> 3) and the square of each king, so nothing has to
+    # scan all 64 squares to find a side's pieces.
+    # The rule state besides the board is the castling rights (a 4-bit set,
+    # see board_layout.py), the en passant square, the half-move clock for
+    # the fifty-move rule and the full move number, as in FEN.
+    __slots__ = ("squares", "side", "piece_squares", "king_squares", "castling", "ep_square",
+                 "halfmove_clock", "fullmove_number", "hash", "evaluation", "undo_stack",
+                 "history", "legal_cache")
+
+    BOARD_SIZE = BOARD_SIZE
+    piece_values = PIECE_VALUES
+
+    def __init__(self, board=None, current_player="white", castling=None, ep_square=None,
+                 halfmove_clock=0, fullmove_number=1):
+        # board is an 8x8 grid of piece letters ('' for an empty square), as
+        # used by the GUI and the FEN parser. The initial position comes with
+        # every castling right; a board passed in has none unless given.
+        if castling is None:
+            castling = ALL_CASTLING if board is None else 0
+        if board is None:
+            board = create_initial_board()
+        squares = bytearray(128)
+        for row in range(BOARD_SIZE):
+            for col in range(BOARD_SIZE):
+                if board[row][col]:
+                    squares[row * 16 + col] = PIECE_CODES[board[row][col]]
+        self._set_up(squares, PLAYER_SIDES[current_player], castling, ep_square, halfmove_clock,
+                     fullmove_number)
+
+    def _set_up(self, squares, side, castling=0, ep_square=None, halfmove_clock=0,
+                fullmove_number=1):
+        self.squares = squares
+        self.side = side
+        self.piece_squares = (set(), set())
+        self.king_squares = [None, None]
+        for sq in SQUARES:
+            piece = squares[sq]
+            if piece:
+                self.piece_squares[piece >> 3].add(sq)
+                if piece & TYPE_MASK == KING:
+                    self.king_squares[piece >> 3] = sq
+        self.castling = castling
+        # The en passant square is only kept while a pawn of the side to move
+        # stands ready to capture, so that the hash only changes when the
+        # possibility is real
+        self.ep_square = ep_square if self._can_capture_en_passant(ep_square) else None
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+        # Zobrist hash of board + rule state, and material plus
+        # piece-square score in centipawns (White's view); both are kept up
+        # to date by make_move
+        self.hash = compute_hash(squares, side, castling, self.ep_square)
+        self.evaluation = evaluate_board(squares)
+        # One (move, captured, previous hash, previous evaluation, previous
+        # castling rights, en passant square and half-move clock) entry per
+        # move made, so unmake_move can restore the position without copying it
+        self.undo_stack = []
+        # Hashes of the earlier positions of the game, oldest first, for
+        # detecting repetitions
+        self.history = []
+        # (hash, moves) of the last legal_moves() call
+        self.legal_cache = None
+
+    def _can_capture_en_passant(self, ep_square):
+        # Whether an enemy pawn that just passed over ep_square can be taken
+        # en passant: ep_square is empty and on the side to move's sixth
+        # rank, the enemy pawn stands in front of it and a pawn of the side
+        # to move beside that pawn
+        if ep_square is None or ep_square & 0x88:
+            return False
+        if ep_square >> 4 != (2 if self.side == WHITE else 5):
+            return False
+        squares = self.squares
+        pawn_square = ep_square + 16 if self.side == WHITE else ep_square - 16
+        if squares[ep_square] or squares[pawn_square] != PAWN | self.side ^ BLACK:
+            return False
+        pawn = PAWN | self.side
+        return any(not square & 0x88 and squares[square] == pawn
+                   for square in (pawn_square - 1, pawn_square + 1))
+
+    def copy(self):
+        position = ChessPosition.__new__(ChessPosition)
+        position._set_up(bytearray(self.squares), self.side, self.castling, self.ep_square,
+                         self.halfmove_clock, self.fullmove_number)
+        position.history = list(self.history)
+        position.legal_cache = self.legal_cache
+        return position
+
+    @property
+    def current_player(self):
+        return SIDE_NAMES[self.side]
+
+    @property
+    def board(self):
+        # 8x8 grid of piece letters, built on demand for the GUI and FEN
+        squares = self.squares
+        return [[PIECE_LETTERS[squares[row * 16 + col]] for col in range(BOARD_SIZE)]
+                for row in range(BOARD_SIZE)]
+
+    def piece_at(self, row, col):
+        # Letter of the piece on (row, col), '' if the square is empty
+        return PIECE_LETTERS[self.squares[row * 16 + col]]
+
+    def is_own_piece(self, piece, side):
+        return bool(piece) and piece & BLACK == side
+
+    def make_move(self, move):
+        # Play a move in place and hand the turn to the other side. Returns
+        # the code of whatever was captured (EMPTY for nothing).
+        from_square = move & 0x7F
+        to_square = move >> 7 & 0x7F
+        squares = self.squares
+        piece = squares[from_square]
+        if to_square == self.ep_square and piece & TYPE_MASK == PAWN:
+            # Checked before anything changes, so a bad move leaves the
+            # position as it was
+            behind = to_square + 16 if piece & BLACK == WHITE else to_square - 16
+            if squares[behind] != PAWN | (piece & BLACK) ^ BLACK:
+                raise ValueError(f"No pawn to take en passant on {format_move(move)[2:4]}")
+        captured = squares[to_square]
+        squares[to_square] = piece
+        squares[from_square] = EMPTY
+        key = self.hash
+        ep_square = self.ep_square
+        self.undo_stack.append((move, captured, key, self.evaluation, self.castling, ep_square,
+                                self.halfmove_clock))
+        self.history.append(key)
+
+        color = piece >> 3
+        own = self.piece_squares[color]
+        own.remove(from_square)
+        own.add(to_square)
+
+        piece_keys = ZOBRIST_PIECES[piece]
+        values = SQUARE_VALUES[piece]
+        key ^= piece_keys[from_square] ^ piece_keys[to_square] ^ ZOBRIST_BLACK_TO_MOVE
+        score = self.evaluation + values[to_square] - values[from_square]
+        if captured:
+            self.piece_squares[color ^ 1].remove(to_square)
+            key ^= ZOBRIST_PIECES[captured][to_square]
+            score -= SQUARE_VALUES[captured][to_square]
+        if ep_square is not None:
+            key ^= ZOBRIST_EN_PASSANT[ep_square & 7]
+            self.ep_square = None
+
+        piece_type = piece & TYPE_MASK
+        if piece_type == PAWN:
+            self.halfmove_clock = 0
+            if move >> 14:
+                # Promotion: the pawn turns into the chosen piece
+                promoted = move >> 14 | piece & BLACK
+                squares[to_square] = promoted
+                key ^= piece_keys[to_square] ^ ZOBRIST_PIECES[promoted][to_square]
+                score += SQUARE_VALUES[promoted][to_square] - values[to_square]
+            elif to_square == ep_square:
+                # En passant: the captured pawn stands behind the target square
+                captured_square = to_square + 16 if color == 0 else to_square - 16
+                captured = squares[captured_square]
+                squares[captured_square] = EMPTY
+                self.piece_squares[color ^ 1].remove(captured_square)
+                key ^= ZOBRIST_PIECES[captured][captured_square]
+                score -= SQUARE_VALUES[captured][captured_square]
+            elif to_square - from_square in (32, -32):
+                # A double step allows en passant if an enemy pawn is beside it
+                enemy_pawn = piece ^ BLACK
+                if squares[to_square - 1] == enemy_pawn or squares[to_square + 1] == enemy_pawn:
+                    self.ep_square = (from_square + to_square) >> 1
+                    key ^= ZOBRIST_EN_PASSANT[to_square & 7]
+        elif captured:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+
+        if piece_type == KING:
+            self.king_squares[color] = to_square
+            if to_square - from_square in (2, -2):
+                # Castling: the rook jumps to the square the king passed over
+                if to_square > from_square:
+                    rook_from, rook_to = from_square + 3, from_square + 1
+                else:
+                    rook_from, rook_to = from_square - 4, from_square - 1
+                rook = squares[rook_from]
+                squares[rook_to] = rook
+                squares[rook_from] = EMPTY
+                own.remove(rook_from)
+                own.add(rook_to)
+                key ^= ZOBRIST_PIECES[rook][rook_from] ^ ZOBRIST_PIECES[rook][rook_to]
+                score += SQUARE_VALUES[rook][rook_to] - SQUARE_VALUES[rook][rook_from]
+
+        castling = self.castling
+        if castling:
+            rights = castling & CASTLING_MASKS[from_square] & CASTLING_MASKS[to_square]
+            if rights != castling:
+                key ^= ZOBRIST_CASTLING[castling] ^ ZOBRIST_CASTLING[rights]
+                self.castling = rights
+
+        if color:
+            self.fullmove_number += 1
+        self.hash = key
+        self.evaluation = score
+
+        self.side ^= BLACK
+        return captured
+
+    def unmake_move(self):
+        # Take back the last move made with make_move
+        (move, captured, self.hash, self.evaluation, self.castling, self.ep_square,
+         self.halfmove_clock) = self.undo_stack.pop()
+        self.history.pop()
+        from_square = move & 0x7F
+        to_square = move >> 7 & 0x7F
+        squares = self.squares
+        piece = squares[to_square]
+        if move >> 14:
+            piece = PAWN | piece & BLACK
+        squares[from_square] = piece
+        squares[to_square] = captured
+
+        color = piece >> 3
+        own = self.piece_squares[color]
+        own.remove(to_square)
+        own.add(from_square)
+        piece_type = piece & TYPE_MASK
+        if captured:
+            self.piece_squares[color ^ 1].add(to_square)
+        elif piece_type == PAWN and to_square == self.ep_square:
+            captured_square = to_square + 16 if color == 0 else to_square - 16
+            squares[captured_square] = piece ^ BLACK
+            self.piece_squares[color ^ 1].add(captured_square)
+        if piece_type == KING:
+            self.king_squares[color] = from_square
+            if to_square - from_square in (2, -2):
+                if to_square > from_square:
+                    rook_from, rook_to = from_square + 3, from_square + 1
+                else:
+                    rook_from, rook_to = from_square - 4, from_square - 1
+                squares[rook_from] = squares[rook_to]
+                squares[rook_to] = EMPTY
+                own.remove(rook_to)
+                own.add(rook_from)
+
+        if color:
+            self.fullmove_number -= 1
+        self.side ^= BLACK
+
+    def is_repetition(self, search_start=None):
+        # Whether the position repeats an earlier one closely enough to be a
+        # draw: for the third time, or - given search_start, the history
+        # length at the root of a search - for the second time with the
+        # earlier occurrence inside the search, since the side that could
+        # repeat once can repeat again. Only positions since the last capture
+        # or pawn move can match, and only every other one has the same side
+        # to move, so the scan is short and amortised O(1) per move.
+        history = self.history
+        key = self.hash
+        oldest = len(history) - self.halfmove_clock
+        if oldest < 0:
+            oldest = 0
+        seen = 0
+        for index in range(len(history) - 4, oldest - 1, -2):
+            if history[index] == key:
+                if search_start is not None and index >= search_start:
+                    return True
+                seen += 1
+                if seen == 2:
+                    return True
+        return False
+
+    def is_fifty_move_draw(self):
+        # A hundred half-moves without a capture or pawn move, unless the
+        # last of them gave mate
+        return (self.halfmove_clock >= FIFTY_MOVE_PLIES
+                and not self.is_checkmate(self.side))
+
+    def get_pseudo_legal_moves(self, sq):
+        # Destination squares of the piece on sq, ignoring checks and pins
+        piece = self.squares[sq]
+        if not piece:
+            return []
+
+        side = piece & BLACK
+        piece_type = piece & TYPE_MASK
+
+        if piece_type == PAWN:  # Pawn
+            return self.get_pawn_moves(sq, side)
+        elif piece_type == KNIGHT:  # Knight
+            return self.get_knight_moves(sq, side)
+        elif piece_type == BISHOP:  # Modified Bishop (moves like a Queen)
+            return self.get_bishop_as_queen_moves(sq, side)
+        elif piece_type == ROOK:  # Rook
+            return self.get_rook_moves(sq, side)
+        elif piece_type == QUEEN:  # Queen
+            return self.get_queen_moves(sq, side)
+        elif piece_type == KING:  # King
+            return self.get_king_moves(sq, side)
+        return []
+
+    def get_pseudo_legal_captures(self, sq):
+        # Only the moves that capture something; sliders stop at the first
+        # piece on each ray without listing the empty squares before it
+        squares = self.squares
+        piece = squares[sq]
+        if not piece:
+            return []
+
+        side = piece & BLACK
+        piece_type = piece & TYPE_MASK
+        captures = []
+
+        if piece_type == PAWN:
+            forward = sq - 16 if side == WHITE else sq + 16
+            for to in (forward - 1, forward + 1):
+                if not to & OFF_BOARD:
+                    target = squares[to]
+                    if target and target & BLACK != side:
+                        captures.append(to)
+                    elif to == self.ep_square and side == self.side:
+                        captures.append(to)
+            # Promotions count as captures: both change the material
+            if sq >> 4 == PROMOTION_ROWS[side] and not squares[forward]:
+                captures.append(forward)
+            return captures
+
+        if piece_type == KNIGHT or piece_type == KING:
+            for step in (KNIGHT_STEPS if piece_type == KNIGHT else KING_STEPS):
+                to = sq + step
+                if not to & OFF_BOARD:
+                    target = squares[to]
+                    if target and target & BLACK != side:
+                        captures.append(to)
+            return captures
+
+        for step in (ROOK_STEPS if piece_type == ROOK else QUEEN_STEPS):
+            to = sq + step
+            while not to & OFF_BOARD:
+                target = squares[to]
+                if target:
+                    if target & BLACK != side:
+                        captures.append(to)
+                    break
+                to += step
+        return captures
+
+    def get_pseudo_legal_quiets(self, sq):
+        # The moves get_pseudo_legal_captures leaves out
+        squares = self.squares
+        moves = [to for to in self.get_pseudo_legal_moves(sq) if not squares[to]]
+        if squares[sq] & TYPE_MASK == PAWN:
+            moves = [to for to in moves if 0x10 <= to < 0x70 and to != self.ep_square]
+        return moves
+
+    def legal_moves(self):
+        # Every legal move of the side to move, as a tuple that is generated
+        # once per position. It is keyed by the hash, so a move made or taken
+        # back moves on to a different entry; the GUI's highlighting, click
+        # handling and game-end checks and the AI's root all share it.
+        cache = self.legal_cache
+        if cache is None or cache[0] != self.hash:
+            cache = self.legal_cache = (self.hash, tuple(self.get_all_legal_moves()))
+        return cache[1]
+
+    def get_legal_moves(self, row, col):
+        # Legal destinations of the piece on (row, col) as (row, col) pairs,
+        # which is how the GUI highlights and validates clicks
+        sq = row * 16 + col
+        piece = self.squares[sq]
+        if not piece:
+            return []
+
+        if piece & BLACK == self.side:
+            # A promotion is one destination, however many pieces it offers
+            targets = list(dict.fromkeys(move >> 7 & 0x7F for move in self.legal_moves()
+                                         if move & 0x7F == sq))
+        else:
+            targets = self._filter_legal(sq, piece, self.get_check_constraints(piece & BLACK))
+        return [(to >> 4, to & 7) for to in targets]
+
+    def is_legal_move(self, move):
+        # Whether a move, e.g. one remembered from another position, can be
+        # played here
+        from_square = move & 0x7F
+        piece = self.squares[from_square]
+        if not self.is_own_piece(piece, self.side):
+            return False
+        to_square = move >> 7 & 0x7F
+        promotion = move >> 14
+        if piece & TYPE_MASK == PAWN and not 0x10 <= to_square < 0x70:
+            if promotion not in PROMOTION_PIECES:
+                return False
+        elif promotion:
+            return False
+        targets = self._filter_legal(from_square, piece, self.get_check_constraints(self.side))
+        return to_square in targets
+
+    def get_all_legal_moves(self, side=None, constraints=None):
+        # Every legal move for a side (the side to move by default)
+        return self._collect_legal_moves(side, constraints, self.get_pseudo_legal_moves)
+
+    def get_legal_captures(self, side=None, constraints=None):
+        return self._collect_legal_moves(side, constraints, self.get_pseudo_legal_captures)
+
+    def get_legal_quiets(self, side=None, constraints=None):
+        return self._collect_legal_moves(side, constraints, self.get_pseudo_legal_quiets)
+
+    def _collect_legal_moves(self, side, constraints, generate):
+        if side is None:
+            side = self.side
+        if constraints is None:
+            constraints = self.get_check_constraints(side)
+
+        squares = self.squares
+        pawn = PAWN | side
+        promotion_row = PROMOTION_ROWS[side]
+        king_square, pins, evasion_squares = constraints
+        # Outside check, every pseudo-legal move of a piece that is neither
+        # the king nor pinned is legal, so only those pieces (and any pawn
+        # that may capture en passant) go through _filter_legal
+        filter_all = evasion_squares is not None or self.ep_square is not None
+        all_moves = []
+        for sq in self.piece_squares[side >> 3]:
+            piece = squares[sq]
+            targets = generate(sq)
+            if filter_all or sq == king_square or sq in pins:
+                targets = self._filter_legal(sq, piece, constraints, targets)
+            if sq >> 4 == promotion_row and piece == pawn:
+                # One move per piece the pawn can promote to
+                for to in targets:
+                    for promotion in PROMOTION_PIECES:
+                        all_moves.append(sq | to << 7 | promotion << 14)
+            else:
+                for to in targets:
+                    all_moves.append(sq | to << 7)
+        return all_moves
+
+    def has_legal_move(self, side):
+        if side == self.side:
+            return bool(self.legal_moves())
+
+        constraints = self.get_check_constraints(side)
+        squares = self.squares
+        for sq in self.piece_squares[side >> 3]:
+            if self._filter_legal(sq, squares[sq], constraints):
+                return True
+        return False
+
+    def get_check_constraints(self, side):
+        # Work out, once per position, what the side to move must respect:
+        # which of its pieces are pinned to the king (and along which line)
+        # and which squares a non-king move must land on to answer a check.
+        # Returns (king_square, pins, evasion_squares); evasion_squares is
+        # None when not in check and empty when in double check.
+        king_square = self.king_squares[side >> 3]
+        if king_square is None:
+            return None, {}, None
+
+        squares = self.squares
+        enemy = side ^ BLACK
+        orthogonal_sliders, diagonal_sliders = SLIDERS_BY_SIDE[enemy]
+        pins = {}
+        checkers = []
+
+        for steps, sliders in ((ROOK_STEPS, orthogonal_sliders), (BISHOP_STEPS, diagonal_sliders)):
+            for step in steps:
+                ray = []
+                pinned = None
+                to = king_square + step
+                while not to & OFF_BOARD:
+                    ray.append(to)
+                    target = squares[to]
+                    if target:
+                        if target & BLACK == side:  # Friendly piece
+                            if pinned is not None:
+                                break
+                            pinned = to
+                        else:
+                            if target in sliders:
+                                if pinned is not None:
+                                    pins[pinned] = set(ray)
+                                else:
+                                    checkers.append(set(ray))
+                            break
+                    to += step
+
+        # Knight and pawn checks can only be answered by capturing the checker
+        knight = KNIGHT | enemy
+        for step in KNIGHT_STEPS:
+            to = king_square + step
+            if not to & OFF_BOARD and squares[to] == knight:
+                checkers.append({to})
+
+        # Enemy pawns attack the king from the row in front of it
+        pawn = PAWN | enemy
+        for step in ((-17, -15) if side == WHITE else (15, 17)):
+            to = king_square + step
+            if not to & OFF_BOARD and squares[to] == pawn:
+                checkers.append({to})
+
+        if not checkers:
+            evasion_squares = None
+        elif len(checkers) == 1:
+            evasion_squares = checkers[0]
+        else:
+            evasion_squares = set()  # Double check: only the king may move
+
+        return king_square, pins, evasion_squares
+
+    def _filter_legal(self, sq, piece, constraints, moves=None):
+        king_square, pins, evasion_squares = constraints
+        if moves is None:
+            moves = self.get_pseudo_legal_moves(sq)
+
+        if sq == king_square:
+            # The king may not step onto an attacked square. It is lifted off
+            # the board for the test so it cannot shield a square on a ray.
+            opponent = (piece & BLACK) ^ BLACK
+            self.squares[sq] = EMPTY
+            legal_moves = [to for to in moves if not self.is_square_attacked(to, opponent)]
+            # Castling is also ruled out in check and across an attacked square
+            if self.castling and CASTLING_PATHS[sq]:
+                legal_moves = [to for to in legal_moves
+                               if to - sq not in (2, -2) or evasion_squares is None
+                               and not self.is_square_attacked((sq + to) >> 1, opponent)]
+            self.squares[sq] = piece
+            return legal_moves
+
+        ep_square = self.ep_square
+        if ep_square is not None and ep_square in moves and piece & TYPE_MASK == PAWN:
+            return self._filter_en_passant(sq, piece, constraints, moves)
+
+        if evasion_squares is not None:
+            moves = [to for to in moves if to in evasion_squares]
+        pin_line = pins.get(sq)
+        if pin_line is not None:
+            moves = [to for to in moves if to in pin_line]
+        return moves
+
+    def _filter_en_passant(self, sq, piece, constraints, moves):
+        # En passant takes two pawns off a rank at once, which the pin lines
+        # do not account for, so it is tried out on the board instead: make
+        # the capture just long enough to test for check
+        to = self.ep_square
+        moves = self._filter_legal(sq, piece, constraints, [move for move in moves if move != to])
+        squares = self.squares
+        side = piece & BLACK
+        captured_square = to + 16 if side == WHITE else to - 16
+        captured = squares[captured_square]
+        squares[to] = piece
+        squares[sq] = EMPTY
+        squares[captured_square] = EMPTY
+        legal = not self.is_in_check(side)
+        squares[captured_square] = captured
+        squares[sq] = piece
+        squares[to] = EMPTY
+        if legal:
+            moves.append(to)
+        return moves
+
+    def get_pawn_moves(self, sq, side):
+        moves = []
+        squares = self.squares
+
+        # Determine direction based on color
+        direction = -16 if side == WHITE else 16
+        starting_row = 6 if side == WHITE else 1
+
+        # Forward move
+        to = sq + direction
+        if not to & OFF_BOARD and not squares[to]:
+            moves.append(to)
+
+            # Double move from starting position
+            if sq >> 4 == starting_row and not squares[to + direction]:
+                moves.append(to + direction)
+
+        # Capture moves. Moves onto the last rank are promotions;
+        # _collect_legal_moves lists one per promotion piece and make_move
+        # swaps the pawn for the piece.
+        for target_square in (to - 1, to + 1):
+            if not target_square & OFF_BOARD:
+                target = squares[target_square]
+                if target and target & BLACK != side:
+                    moves.append(target_square)
+
+        # En passant, for the side to move only
+        ep_square = self.ep_square
+        if ep_square is not None and ep_square - to in (1, -1) and side == self.side:
+            moves.append(ep_square)
+
+        return moves
+
+    def get_step_moves(self, sq, side, steps):
+        # Knight and king moves: one step in each direction
+        moves = []
+        squares = self.squares
+
+        for step in steps:
+            to = sq + step
+
+            # Check if the move is within the board
+            if not to & OFF_BOARD:
+                target = squares[to]
+
+                # Empty square or enemy piece
+                if not target or target & BLACK != side:
+                    moves.append(to)
+
+        return moves
+
+    def get_knight_moves(self, sq, side):
+        return self.get_step_moves(sq, side, KNIGHT_STEPS)
+
+    def get_bishop_as_queen_moves(self, sq, side):
+        # Bishop now moves like a queen (diagonally + horizontally/vertically)
+        # This is the key modification for the project
+        return self.get_queen_moves(sq, side)
+
+    def get_sliding_moves(self, sq, side, steps):
+        moves = []
+        squares = self.squares
+
+        for step in steps:
+            to = sq + step
+
+            # Check if the move is within the board
+            while not to & OFF_BOARD:
+                target = squares[to]
+
+                if not target:  # Empty square
+                    moves.append(to)
+                elif target & BLACK != side:  # Enemy piece
+                    moves.append(to)
+                    break
+                else:  # Friendly piece
+                    break
+                to += step
+
+        return moves
+
+    def get_rook_moves(self, sq, side):
+        # Horizontal and vertical directions
+        return self.get_sliding_moves(sq, side, ROOK_STEPS)
+
+    def get_queen_moves(self, sq, side):
+        # Horizontal, vertical, and diagonal directions
+        return self.get_sliding_moves(sq, side, QUEEN_STEPS)
+
+    def get_king_moves(self, sq, side):
+        moves = self.get_step_moves(sq, side, KING_STEPS)
+        # Castling, while the right remains and the squares between are empty;
+        # _filter_legal checks that the king neither starts in nor crosses check
+        castling = self.castling
+        if castling:
+            squares = self.squares
+            for right, to, rook_square, between in CASTLING_PATHS[sq]:
+                if castling & right and squares[rook_square] == ROOK | side:
+                    for between_square in between:
+                        if squares[between_square]:
+                            break
+                    else:
+                        moves.append(to)
+        return moves
+
+    def find_king(self, side):
+        # Square of the side's king, from the piece lists (None if it has none)
+        return self.king_squares[side >> 3]
+
+    def is_square_attacked(self, sq, by_side):
+        # Look outward from the square for anything of by_side's colour that
+        # could capture on it: pawn diagonals, knight jumps, king adjacency
+        # and the first piece along each sliding ray.
+        squares = self.squares
+
+        # Pawns capture towards the other side, so they attack from behind
+        pawn = PAWN | by_side
+        for step in ((15, 17) if by_side == WHITE else (-17, -15)):
+            to = sq + step
+            if not to & OFF_BOARD and squares[to] == pawn:
+                return True
+
+        knight = KNIGHT | by_side
+        for step in KNIGHT_STEPS:
+            to = sq + step
+            if not to & OFF_BOARD and squares[to] == knight:
+                return True
+
+        king = KING | by_side
+        for step in KING_STEPS:
+            to = sq + step
+            if not to & OFF_BOARD and squares[to] == king:
+                return True
+
+        # Bishops count on both kinds of ray because they move like queens
+        orthogonal_sliders, diagonal_sliders = SLIDERS_BY_SIDE[by_side]
+        for steps, sliders in ((ROOK_STEPS, orthogonal_sliders), (BISHOP_STEPS, diagonal_sliders)):
+            for step in steps:
+                to = sq + step
+                while not to & OFF_BOARD:
+                    target = squares[to]
+                    if target:
+                        if target in sliders:
+                            return True
+                        break
+                    to += step
+
+        return False
+
+    def is_in_check(self, side):
+        # Find the king's position
+        king_square = self.king_squares[side >> 3]
+        if king_square is None:
+            return False
+
+        return self.is_square_attacked(king_square, side ^ BLACK)
+
+    def is_checkmate(self, side):
+        # In check with no legal moves to get out of it
+        return self.is_in_check(side) and not self.has_legal_move(side)
+
+    def is_stalemate(self, side):
+        # Not in check, but no legal moves either
+        return not self.is_in_check(side) and not self.has_legal_move(side)
+
+    def evaluate_position(self, squares=None):
+        # Material balance in pawns (White's view)
+        if squares is None:
+            squares = self.squares
+
+        score = 0
+        for sq in SQUARES:
+            piece = squares[sq]
+            if piece:
+                score += self.piece_values[PIECE_LETTERS[piece]]
+        return score
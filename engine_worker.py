@@ -0,0 +1,126 @@
+# Background search worker for the GUI.
+#
+# The search runs in a separate process so it neither blocks the Tk event
+# loop nor competes with it for the GIL. The GUI hands positions to the
+# worker and polls for replies with root.after(); the worker keeps one
+# SearchEngine (and so its transposition table) alive between moves.
+#
+# Messages to the worker:
+#   ("search", job_id, position, time_limit)
+#   ("quit",)
+# Messages from the worker:
+#   ("info", job_id, summary)     after every completed iteration
+#   ("result", job_id, move, summary)
+# summary is a dict with depth, score, nodes, nps and pv (a string).
+#
+# With threads > 1 the worker runs a ParallelSearchEngine, which starts
+# threads - 1 helper processes of its own. Given a tablebase directory, the
+# worker's engines probe the endgame tables in it.
+
+import multiprocessing
+import queue
+import weakref
+
+from chess_rules import format_move
+from parallel_search import ParallelSearchEngine
+from search import SearchEngine
+from tablebase import Tablebases
+
+
+def summarize(result):
+    return {
+        "depth": result.depth,
+        "score": result.score,
+        "nodes": result.nodes,
+        "nps": result.nps,
+        "pv": " ".join(format_move(move) for move in result.pv),
+    }
+
+
+def _latest_request(requests, message):
+    # Skip searches that were superseded while this one waited in the queue
+    while True:
+        try:
+            newer = requests.get_nowait()
+        except queue.Empty:
+            return message
+        if newer[0] == "quit":
+            return newer
+        message = newer
+
+
+def _worker_main(requests, responses, stop_event, tt_size_mb, threads, tablebase_dir):
+    if threads > 1:
+        engine = ParallelSearchEngine(threads, tt_size_mb=tt_size_mb, stop_event=stop_event,
+                                      tablebase_dir=tablebase_dir)
+    else:
+        engine = SearchEngine(tt_size_mb=tt_size_mb, stop_event=stop_event,
+                              tablebases=Tablebases(tablebase_dir) if tablebase_dir else None)
+
+    while True:
+        message = _latest_request(requests, requests.get())
+        if message[0] == "quit":
+            if threads > 1:
+                engine.shutdown()
+            break
+
+        _, job_id, position, time_limit = message
+        stop_event.clear()
+        engine.on_iteration = lambda result: responses.put(("info", job_id, summarize(result)))
+        result = engine.search(position, time_limit=time_limit)
+        responses.put(("result", job_id, result.best_move, summarize(result)))
+
+
+def _stop_worker(requests, stop_event, process):
+    stop_event.set()
+    requests.put(("quit",))
+    process.join(timeout=2)
+    if process.is_alive():
+        process.terminate()
+
+
+class SearchWorker:
+    def __init__(self, tt_size_mb=16, threads=1, tablebase_dir=None):
+        # "spawn" gives the worker a clean interpreter instead of a fork of
+        # a process that has Tk initialised
+        context = multiprocessing.get_context("spawn")
+        self.requests = context.Queue()
+        self.responses = context.Queue()
+        self.stop_event = context.Event()
+        self.job_id = 0
+        # A daemon process may not start processes of its own, so a parallel
+        # worker is stopped by the finalizer below instead
+        self.process = context.Process(
+            target=_worker_main,
+            args=(self.requests, self.responses, self.stop_event, tt_size_mb, threads,
+                  tablebase_dir),
+            daemon=threads == 1,
+        )
+        self.process.start()
+        self.finalizer = weakref.finalize(self, _stop_worker, self.requests, self.stop_event,
+                                          self.process)
+
+    def start_search(self, position, time_limit):
+        # Returns the job id that replies for this search will carry
+        self.job_id += 1
+        self.requests.put(("search", self.job_id, position.copy(), time_limit))
+        return self.job_id
+
+    def cancel(self):
+        # Abort the current search; replies to it will be ignored
+        self.job_id += 1
+        self.stop_event.set()
+
+    def poll(self):
+        # Replies for the current job that have arrived so far, without blocking
+        messages = []
+        while True:
+            try:
+                message = self.responses.get_nowait()
+            except queue.Empty:
+                return messages
+            if message[1] == self.job_id:
+                messages.append(message)
+
+    def shutdown(self):
+        self.finalizer()
@@ -0,0 +1,208 @@
+# Run the search over a suite of EPD positions and report how it did.
+#
+# For every position the engine searches to a fixed depth (or for a fixed
+# time or node count). The runner records how long each depth took to
+# complete, the nodes/sec, and whether the chosen move agrees with the
+# position's "bm" (best move) or avoids its "am" (avoid move) operation.
+# The summary is the number to compare between versions: total time to
+# depth and nps catch performance regressions, agreement catches strength
+# regressions.
+#
+# --stats searches with InstrumentedSearchEngine (see instrumentation.py)
+# and adds its statistics to every result, with totals in the summary.
+# --profile runs the suite under cProfile, prints the functions that took
+# the most time and saves the profile for pstats, snakeviz and the like.
+# Sampling profilers need nothing from the runner, e.g.
+# `py-spy record -o profile.svg -- python epd_runner.py positions/bench.epd`.
+#
+# Usage:
+#   python epd_runner.py positions/bench.epd --depth 4
+#   python epd_runner.py suite.epd --time 2 --json results.json
+#   python epd_runner.py positions/bench.epd --depth 4 --stats
+#   python epd_runner.py positions/bench.epd --depth 4 --profile bench.prof
+
+import argparse
+import cProfile
+import json
+import pstats
+import sys
+import time
+
+from chess_rules import format_move
+from fen import parse_epd, parse_san, to_fen
+from instrumentation import TIMED_METHODS, InstrumentedSearchEngine
+from parallel_search import ParallelSearchEngine
+from search import SearchEngine
+
+PROFILE_LINES = 25
+
+
+def load_suite(path):
+    entries = []
+    with open(path, encoding="utf-8") as handle:
+        for line_number, line in enumerate(handle, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            position, operations = parse_epd(line)
+            entries.append((line_number, position, operations))
+    return entries
+
+
+def run_position(engine, position, operations, depth, time_limit, node_limit):
+    depth_times = {}
+
+    def record_iteration(result):
+        depth_times[result.depth] = result.elapsed
+
+    engine.on_iteration = record_iteration
+    fen = to_fen(position)
+    start = time.perf_counter()
+    result = engine.search(position, max_depth=depth, time_limit=time_limit, node_limit=node_limit)
+    elapsed = time.perf_counter() - start
+
+    # Best-move agreement: bm lists good moves, am lists moves to avoid
+    agreement = None
+    if "bm" in operations:
+        expected = {parse_san(position, move) for move in operations["bm"]}
+        agreement = result.best_move in expected
+    elif "am" in operations:
+        avoided = {parse_san(position, move) for move in operations["am"]}
+        agreement = result.best_move not in avoided
+
+    return {
+        "id": operations.get("id", [""])[0],
+        "fen": fen,
+        "best_move": format_move(result.best_move) if result.best_move else None,
+        "score": result.score,
+        "depth": result.depth,
+        "nodes": result.nodes,
+        "time": round(elapsed, 4),
+        "nps": int(result.nodes / elapsed) if elapsed else 0,
+        "depth_times": {str(d): round(t, 4) for d, t in sorted(depth_times.items())},
+        "agreement": agreement,
+        "stats": getattr(engine, "stats", None),
+    }
+
+
+def summarize_stats(results):
+    # Totals of the instrumented searches' statistics
+    stats = [r["stats"] for r in results if r["stats"]]
+    if not stats:
+        return None
+    probes = sum(s["tt_probes"] for s in stats)
+    factors = [s["branching_factor"] for s in stats if s["branching_factor"]]
+    time_split = {group: round(sum(s["time_split"][group] for s in stats), 3)
+                  for group in (*TIMED_METHODS, "other")}
+    return {
+        "qnodes": sum(s["qnodes"] for s in stats),
+        "tt_probes": probes,
+        "tt_hit_rate": round(sum(s["tt_hits"] for s in stats) / probes, 4) if probes else 0.0,
+        "cutoffs": sum(s["cutoffs"] for s in stats),
+        "branching_factor": round(sum(factors) / len(factors), 2) if factors else None,
+        "time_split": time_split,
+    }
+
+
+def summarize(results, depth):
+    total_nodes = sum(r["nodes"] for r in results)
+    total_time = sum(r["time"] for r in results)
+    scored = [r for r in results if r["agreement"] is not None]
+    reached = [r["depth_times"][str(depth)] for r in results
+               if depth and str(depth) in r["depth_times"]]
+    return {
+        "positions": len(results),
+        "total_nodes": total_nodes,
+        "total_time": round(total_time, 3),
+        "nps": int(total_nodes / total_time) if total_time else 0,
+        "time_to_depth": round(sum(reached), 3) if reached else None,
+        "reached_depth": len(reached),
+        "agreement": sum(1 for r in scored if r["agreement"]),
+        "scored": len(scored),
+        "stats": summarize_stats(results),
+    }
+
+
+def run_suite(entries, args):
+    engine_class = InstrumentedSearchEngine if args.stats else SearchEngine
+    if args.threads > 1:
+        # Helper processes are costly to start, so one engine is reused with
+        # its table cleared between positions
+        engine = ParallelSearchEngine(args.threads, tt_size_mb=args.hash)
+    results = []
+    for line_number, position, operations in entries:
+        # An empty table per position keeps results independent of order
+        if args.threads > 1:
+            engine.tt.clear()
+        else:
+            engine = engine_class(tt_size_mb=args.hash)
+        result = run_position(engine, position, operations, args.depth, args.time, args.nodes)
+        result["line"] = line_number
+        results.append(result)
+        if not args.quiet:
+            mark = {True: "ok", False: "MISS", None: "-"}[result["agreement"]]
+            print(f"{line_number:>4} {result['id'][:20]:<20} {result['best_move'] or '----':<6} "
+                  f"depth {result['depth']:>2} {result['nodes']:>9} nodes "
+                  f"{result['time']:>7.2f}s {result['nps']:>7} nps  {mark}")
+
+    if args.threads > 1:
+        engine.shutdown()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the engine over an EPD test suite")
+    parser.add_argument("suite", help="EPD file, one position per line")
+    parser.add_argument("--depth", type=int, default=None, help="search depth per position")
+    parser.add_argument("--time", type=float, default=None, help="seconds per position")
+    parser.add_argument("--nodes", type=int, default=None, help="node budget per position")
+    parser.add_argument("--hash", type=int, default=16, help="transposition table size in MB")
+    parser.add_argument("--threads", type=int, default=1, help="search processes (Lazy SMP)")
+    parser.add_argument("--json", default=None, help="write per-position results to this file")
+    parser.add_argument("--quiet", action="store_true", help="only print the summary")
+    parser.add_argument("--stats", action="store_true",
+                        help="collect search statistics (slower; single process only)")
+    parser.add_argument("--profile", nargs="?", const="epd_runner.prof", default=None,
+                        metavar="FILE", help="run under cProfile and save the profile to FILE")
+    args = parser.parse_args(argv)
+
+    if args.depth is None and args.time is None and args.nodes is None:
+        args.depth = 4
+    if args.stats and args.threads > 1:
+        parser.error("--stats needs --threads 1")
+
+    entries = load_suite(args.suite)
+    if args.profile:
+        profiler = cProfile.Profile()
+        results = profiler.runcall(run_suite, entries, args)
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats("tottime").print_stats(PROFILE_LINES)
+        print(f"Profile saved to {args.profile}")
+    else:
+        results = run_suite(entries, args)
+
+    summary = summarize(results, args.depth)
+    print(f"Positions: {summary['positions']}  nodes: {summary['total_nodes']}  "
+          f"time: {summary['total_time']}s  nps: {summary['nps']}")
+    if summary["time_to_depth"] is not None:
+        print(f"Time to depth {args.depth}: {summary['time_to_depth']}s "
+              f"({summary['reached_depth']} positions)")
+    if summary["scored"]:
+        print(f"Best-move agreement: {summary['agreement']}/{summary['scored']}")
+    stats = summary["stats"]
+    if stats is not None:
+        timed = sum(stats["time_split"].values()) or 1
+        print(f"TT hit rate: {stats['tt_hit_rate']:.1%}  cutoffs: {stats['cutoffs']}  "
+              f"qnodes: {stats['qnodes']}  branching factor: {stats['branching_factor']}")
+        print("Time split: " + "  ".join(f"{group} {seconds / timed:.0%}"
+                                         for group, seconds in stats["time_split"].items()))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump({"summary": summary, "results": results}, handle, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
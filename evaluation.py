@@ -0,0 +1,155 @@
+# Static evaluation for Modified Chess: material plus piece-square tables.
+#
+# ChessPosition keeps the evaluation up to date incrementally: every
+# (piece, square) pair has a precomputed value in centipawns from White's
+# point of view, so a move only adds and subtracts a few table entries
+# instead of rescanning the board.
+#
+# The hand-set weights below are replaced by tuned ones (see
+# texel_tuner.py) when a parameter file is found at startup: the file
+# named by the MODIFIED_CHESS_EVAL environment variable (an error if it
+# is missing), or else eval_params.json next to this module.
+
+import json
+import os
+
+from board_layout import PIECE_CODES, SQUARES
+
+# Piece values for AI evaluation (modified to reflect bishop's enhanced role)
+PIECE_VALUES = {
+    "P": 1, "N": 3, "B": 9, "R": 5, "Q": 9, "K": 100,
+    "p": -1, "n": -3, "b": -9, "r": -5, "q": -9, "k": -100
+}
+
+CENTIPAWNS = 100
+
+# Piece-square bonuses in centipawns, written from White's side of the
+# board: row 0 is the 8th rank, row 7 White's back rank. Black uses the
+# same tables mirrored top to bottom.
+PIECE_SQUARE_TABLES = {
+    'P': [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [50, 50, 50, 50, 50, 50, 50, 50],
+        [10, 10, 20, 30, 30, 20, 10, 10],
+        [5, 5, 10, 25, 25, 10, 5, 5],
+        [0, 0, 0, 20, 20, 0, 0, 0],
+        [5, -5, -10, 0, 0, -10, -5, 5],
+        [5, 10, 10, -20, -20, 10, 10, 5],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+    ],
+    'N': [
+        [-50, -40, -30, -30, -30, -30, -40, -50],
+        [-40, -20, 0, 0, 0, 0, -20, -40],
+        [-30, 0, 10, 15, 15, 10, 0, -30],
+        [-30, 5, 15, 20, 20, 15, 5, -30],
+        [-30, 0, 15, 20, 20, 15, 0, -30],
+        [-30, 5, 10, 15, 15, 10, 5, -30],
+        [-40, -20, 0, 5, 5, 0, -20, -40],
+        [-50, -40, -30, -30, -30, -30, -40, -50],
+    ],
+    # The modified bishop is a second queen: it wants open, central squares
+    # and the 7th rank like a queen, but gets a stronger nudge off the back
+    # rank since there are two of them blocking the rooks.
+    'B': [
+        [-20, -10, -10, -5, -5, -10, -10, -20],
+        [0, 10, 10, 10, 10, 10, 10, 0],
+        [-10, 5, 10, 10, 10, 10, 5, -10],
+        [-5, 0, 10, 15, 15, 10, 0, -5],
+        [-5, 0, 10, 15, 15, 10, 0, -5],
+        [-10, 5, 10, 10, 10, 10, 5, -10],
+        [-10, 5, 0, 0, 0, 0, 5, -10],
+        [-25, -15, -15, -10, -10, -15, -15, -25],
+    ],
+    'R': [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [5, 10, 10, 10, 10, 10, 10, 5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [0, 0, 0, 5, 5, 0, 0, 0],
+    ],
+    'Q': [
+        [-20, -10, -10, -5, -5, -10, -10, -20],
+        [-10, 0, 0, 0, 0, 0, 0, -10],
+        [-10, 0, 5, 5, 5, 5, 0, -10],
+        [-5, 0, 5, 5, 5, 5, 0, -5],
+        [0, 0, 5, 5, 5, 5, 0, -5],
+        [-10, 5, 5, 5, 5, 5, 0, -10],
+        [-10, 0, 5, 0, 0, 0, 0, -10],
+        [-20, -10, -10, -5, -5, -10, -10, -20],
+    ],
+    'K': [
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-20, -30, -30, -40, -40, -30, -30, -20],
+        [-10, -20, -20, -20, -20, -20, -20, -10],
+        [20, 20, 0, 0, 0, 0, 20, 20],
+        [20, 30, 10, 0, 0, 10, 30, 20],
+    ],
+}
+
+
+PARAMS_ENV = "MODIFIED_CHESS_EVAL"
+DEFAULT_PARAMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_params.json")
+
+
+def load_params(path):
+    # (piece_values, tables) from a parameter file written by texel_tuner.py:
+    # White's piece values in pawns (two decimals) and 8x8 tables as above
+    with open(path, encoding="utf-8") as handle:
+        params = json.load(handle)
+    values = dict(PIECE_VALUES)
+    for letter, value in params["piece_values"].items():
+        values[letter.upper()] = value
+        values[letter.lower()] = -value
+    tables = dict(PIECE_SQUARE_TABLES)
+    for letter, table in params["piece_square_tables"].items():
+        if len(table) != 8 or any(len(row) != 8 for row in table):
+            raise ValueError(f"{path}: the {letter} table is not 8x8")
+        tables[letter.upper()] = [[int(value) for value in row] for row in table]
+    return values, tables
+
+
+if os.environ.get(PARAMS_ENV):
+    # A file asked for by name must be there; playing on the hand-set
+    # weights instead would go unnoticed
+    if not os.path.exists(os.environ[PARAMS_ENV]):
+        raise FileNotFoundError(f"{PARAMS_ENV} names a missing file: {os.environ[PARAMS_ENV]}")
+    PIECE_VALUES, PIECE_SQUARE_TABLES = load_params(os.environ[PARAMS_ENV])
+elif os.path.exists(DEFAULT_PARAMS_PATH):
+    PIECE_VALUES, PIECE_SQUARE_TABLES = load_params(DEFAULT_PARAMS_PATH)
+
+
+def build_square_values(piece_values, tables):
+    # SQUARE_VALUES[piece_code][square]: material plus positional bonus in
+    # centipawns, positive for White and negative for Black, indexed by
+    # 0x88 square
+    square_values = [[0] * 128 for _ in range(16)]
+    for piece, table in tables.items():
+        white = square_values[PIECE_CODES[piece]]
+        black = square_values[PIECE_CODES[piece.lower()]]
+        for sq in SQUARES:
+            row, col = sq >> 4, sq & 7
+            # Tuned values have fractions of a pawn; scores stay integers
+            material = round(piece_values[piece] * CENTIPAWNS)
+            white[sq] = material + table[row][col]
+            black[sq] = -(material + table[7 - row][col])
+    return square_values
+
+
+SQUARE_VALUES = build_square_values(PIECE_VALUES, PIECE_SQUARE_TABLES)
+
+
+def evaluate_board(squares):
+    # Full evaluation of a 0x88 board from scratch, in centipawns from
+    # White's point of view
+    score = 0
+    for sq in SQUARES:
+        piece = squares[sq]
+        if piece:
+            score += SQUARE_VALUES[piece][sq]
+    return score
@@ -0,0 +1,123 @@
+# Static exchange evaluation (SEE) for Modified Chess.
+#
+# static_exchange(position, move) estimates the material outcome, in
+# centipawns for the side making the capture, of the whole sequence of
+# captures on the target square when both sides always recapture with
+# their least valuable piece and may stop whenever continuing would lose.
+#
+# Attackers are collected per ray, nearest first, so pieces lined up
+# behind each other (x-rays) join the exchange once the piece in front has
+# captured. Because the modified bishop moves like a queen, a bishop
+# x-rays through rooks, queens and other bishops on files and ranks as
+# well as on diagonals.
+#
+# En passant counts as a pawn capture, and a promotion adds the promoted
+# piece's gain over the pawn and puts that piece on the square.
+
+from board_layout import (BISHOP, BISHOP_STEPS, BLACK, KING, KNIGHT, KNIGHT_STEPS, OFF_BOARD,
+                          PAWN, PIECE_CODES, QUEEN, ROOK, ROOK_STEPS, TYPE_MASK)
+from evaluation import CENTIPAWNS, PIECE_VALUES
+
+# Exchange values in centipawns, indexed by piece code
+EXCHANGE_VALUES = [0] * 16
+for _letter, _value in PIECE_VALUES.items():
+    EXCHANGE_VALUES[PIECE_CODES[_letter]] = round(abs(_value) * CENTIPAWNS)
+
+ORTHOGONAL_ATTACKERS = frozenset((BISHOP, ROOK, QUEEN))
+DIAGONAL_ATTACKERS = frozenset((BISHOP, QUEEN))
+
+
+def _attacker_chains(squares, sq):
+    # Lists of pieces (both colours) able to capture on sq, one list per
+    # ray ordered nearest first, plus one single-entry list per knight.
+    # Entries are (piece, square).
+    chains = []
+
+    for steps, sliders in ((ROOK_STEPS, ORTHOGONAL_ATTACKERS),
+                           (BISHOP_STEPS, DIAGONAL_ATTACKERS)):
+        for step in steps:
+            chain = []
+            to = sq + step
+            distance = 1
+            while not to & OFF_BOARD:
+                piece = squares[to]
+                if piece:
+                    piece_type = piece & TYPE_MASK
+                    if piece_type in sliders:
+                        chain.append((piece, to))
+                    elif distance == 1 and piece_type == KING:
+                        chain.append((piece, to))
+                    elif (distance == 1 and piece_type == PAWN and step in BISHOP_STEPS
+                          and (step > 0) == (piece & BLACK == 0)):
+                        # Pawns only capture diagonally forwards: a white
+                        # pawn sits below the square, a black one above
+                        chain.append((piece, to))
+                    else:
+                        break  # Anything else blocks the ray for good
+                to += step
+                distance += 1
+            if chain:
+                chains.append(chain)
+
+    for step in KNIGHT_STEPS:
+        to = sq + step
+        if not to & OFF_BOARD:
+            piece = squares[to]
+            if piece & TYPE_MASK == KNIGHT:
+                chains.append([(piece, to)])
+
+    return chains
+
+
+def static_exchange(position, move):
+    from_square = move & 0x7F
+    to_square = move >> 7 & 0x7F
+    squares = position.squares
+    mover = squares[from_square]
+    captured = squares[to_square]
+    if not captured and mover & TYPE_MASK == PAWN and to_square == position.ep_square:
+        captured = mover ^ BLACK
+
+    chains = _attacker_chains(squares, to_square)
+
+    # The moving piece makes the first capture: take it out of its chain so
+    # whatever stood behind it can join in
+    for chain in chains:
+        if chain[0][1] == from_square:
+            chain.pop(0)
+            break
+
+    gains = [EXCHANGE_VALUES[captured]]
+    on_square = EXCHANGE_VALUES[mover]
+    promotion = move >> 14
+    if promotion:
+        gains[0] += EXCHANGE_VALUES[promotion] - EXCHANGE_VALUES[PAWN]
+        on_square = EXCHANGE_VALUES[promotion]
+    black_to_capture = not mover & BLACK
+
+    while True:
+        # Least valuable attacker of the side to recapture at a chain head
+        best_chain = None
+        best_value = None
+        for chain in chains:
+            if chain and (chain[0][0] & BLACK != 0) == black_to_capture:
+                value = EXCHANGE_VALUES[chain[0][0]]
+                if best_value is None or value < best_value:
+                    best_value = value
+                    best_chain = chain
+        if best_chain is None:
+            break
+
+        gains.append(on_square - gains[-1])
+        if max(-gains[-2], gains[-1]) < 0:
+            break  # Neither side can come out ahead by continuing
+
+        on_square = best_value
+        best_chain.pop(0)
+        black_to_capture = not black_to_capture
+
+    # Either side may stand pat instead of recapturing
+    while len(gains) > 1:
+        last = gains.pop()
+        gains[-1] = -max(-gains[-1], last)
+    return gains[0]
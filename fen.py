@@ -0,0 +1,271 @@
+# FEN and EPD support for ChessPosition.
+#
+# FEN describes a position as piece placement, side to move, castling
+# rights, en passant square and move counters. EPD uses the first four
+# FEN fields followed by operations such as "bm Bxf7+; id \"test 1\";".
+
+from board_layout import (BLACK_KINGSIDE, BLACK_QUEENSIDE, KING, PIECE_CODES, PIECE_LETTERS,
+                          TYPE_MASK, WHITE_KINGSIDE, WHITE_QUEENSIDE, move_to_coords)
+from chess_rules import BOARD_SIZE, ChessPosition, format_move, get_algebraic_notation, parse_move
+
+INITIAL_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+CASTLING_LETTERS = (("K", WHITE_KINGSIDE), ("Q", WHITE_QUEENSIDE),
+                    ("k", BLACK_KINGSIDE), ("q", BLACK_QUEENSIDE))
+
+
+def _parse_placement(placement):
+    ranks = placement.split("/")
+    if len(ranks) != BOARD_SIZE:
+        raise ValueError(f"FEN placement needs 8 ranks: {placement!r}")
+
+    board = []
+    for rank in ranks:
+        row = []
+        for char in rank:
+            if char.isdigit():
+                row.extend([''] * int(char))
+            elif char in PIECE_CODES:
+                row.append(char)
+            else:
+                raise ValueError(f"Unknown piece {char!r} in FEN placement")
+        if len(row) != BOARD_SIZE:
+            raise ValueError(f"FEN rank {rank!r} does not have 8 squares")
+        board.append(row)
+    return board
+
+
+def _parse_side(side):
+    if side not in ("w", "b"):
+        raise ValueError(f"FEN side to move must be 'w' or 'b', not {side!r}")
+    return "white" if side == "w" else "black"
+
+
+def _parse_castling(text):
+    if text == "-":
+        return 0
+    castling = 0
+    for letter, right in CASTLING_LETTERS:
+        if letter in text:
+            castling |= right
+    if any(char not in "KQkq" for char in text):
+        raise ValueError(f"Unknown castling rights {text!r}")
+    return castling
+
+
+def _parse_square(text):
+    # A square such as "e3", or None for "-"
+    if text == "-":
+        return None
+    if len(text) != 2 or text[0] not in "abcdefgh" or text[1] not in "12345678":
+        raise ValueError(f"Not a square: {text!r}")
+    return (8 - int(text[1])) * 16 + ord(text[0]) - 97
+
+
+def _parse_ep_square(text, board, side):
+    # An en passant square lies behind an enemy pawn that just made a
+    # double step: on rank 6 with White to move, on rank 3 with Black
+    square = _parse_square(text)
+    if square is None:
+        return None
+    rank = "6" if side == "white" else "3"
+    if text[1] != rank:
+        raise ValueError(f"En passant square must be on rank {rank} with {side} to move: "
+                         f"{text!r}")
+    row, col = square >> 4, square & 7
+    pawn_row = row + 1 if side == "white" else row - 1
+    if board[row][col] or board[pawn_row][col] != ("p" if side == "white" else "P"):
+        raise ValueError(f"No pawn has just passed over the en passant square {text!r}")
+    return square
+
+
+def parse_fen(fen):
+    # Only placement and side to move are required; missing fields mean no
+    # castling, no en passant and a new move count
+    fields = fen.split()
+    if len(fields) < 2:
+        raise ValueError(f"FEN needs at least placement and side to move: {fen!r}")
+    board = _parse_placement(fields[0])
+    side = _parse_side(fields[1])
+    castling = _parse_castling(fields[2]) if len(fields) > 2 else 0
+    ep_square = _parse_ep_square(fields[3], board, side) if len(fields) > 3 else None
+    halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+    fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+    return ChessPosition(board, side, castling, ep_square, halfmove_clock, fullmove_number)
+
+
+def placement_to_fen(board):
+    ranks = []
+    for row in board:
+        rank = ""
+        empty = 0
+        for piece in row:
+            if piece:
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece
+            else:
+                empty += 1
+        if empty:
+            rank += str(empty)
+        ranks.append(rank)
+    return "/".join(ranks)
+
+
+def _rule_fields(position):
+    # Side to move, castling rights and en passant square
+    side = "w" if position.current_player == "white" else "b"
+    castling = "".join(letter for letter, right in CASTLING_LETTERS if position.castling & right)
+    ep_square = position.ep_square
+    en_passant = "-" if ep_square is None else f"{chr(97 + (ep_square & 7))}{8 - (ep_square >> 4)}"
+    return f"{side} {castling or '-'} {en_passant}"
+
+
+def to_fen(position):
+    return (f"{placement_to_fen(position.board)} {_rule_fields(position)} "
+            f"{position.halfmove_clock} {position.fullmove_number}")
+
+
+def parse_san(position, text):
+    # Match a move written in algebraic notation (e.g. "Bxf7+", "exd5",
+    # "Nbd2", "O-O", "e8=Q") or coordinate notation ("e2e4", "e7e8q")
+    # against the legal moves
+    text = text.strip().rstrip("+#!?")
+    if not text:
+        raise ValueError("Empty move")
+    if text.replace("0", "O") in ("O-O", "O-O-O"):
+        step = 2 if text.replace("0", "O") == "O-O" else -2
+        squares = position.squares
+        for candidate in position.legal_moves():
+            from_square = candidate & 0x7F
+            if (squares[from_square] & TYPE_MASK == KING
+                    and (candidate >> 7 & 0x7F) - from_square == step):
+                return candidate
+        raise ValueError(f"Illegal move {text!r}")
+
+    move = None
+    if text[:1] in "abcdefgh":  # "B4c3" is SAN, not the coordinate move b4c3
+        try:
+            move = parse_move(text)
+        except ValueError:
+            pass
+    if move is not None:
+        if position.is_legal_move(move):
+            return move
+        raise ValueError(f"Illegal move {text!r}")
+
+    piece_type = text[0] if text[0] in "NBRQK" else "P"
+    promotion = 0
+    if piece_type == "P" and text[-1].upper() in "NBRQ":
+        promotion = PIECE_CODES[text[-1].upper()]
+        text = text[:-1].rstrip("=")
+    destination = text[-2:]
+    disambiguation = text[1:-2] if piece_type != "P" else text[:-2]
+    disambiguation = disambiguation.replace("x", "")
+
+    matches = []
+    squares = position.squares
+    for candidate in position.legal_moves():
+        if PIECE_LETTERS[squares[candidate & 0x7F]].upper() != piece_type:
+            continue
+        if format_move(candidate)[2:4] != destination or candidate >> 14 != promotion:
+            continue
+        origin = format_move(candidate)[:2]
+        if all(char in origin for char in disambiguation):
+            matches.append(candidate)
+
+    if len(matches) != 1:
+        raise ValueError(f"{'Ambiguous' if matches else 'Illegal'} move {text!r}")
+    return matches[0]
+
+
+def move_to_san(position, move):
+    # Algebraic notation as in the move history, plus the origin file (or
+    # rank) when another piece of the same kind could reach the same square
+    from_row, from_col, to_row, to_col = move_to_coords(move)
+    squares = position.squares
+    piece = squares[move & 0x7F]
+    san = get_algebraic_notation(PIECE_LETTERS[piece], from_row, from_col, to_row, to_col,
+                                 squares[move >> 7 & 0x7F], PIECE_LETTERS[move >> 14])
+    if PIECE_LETTERS[piece].upper() in "PK":
+        return san
+
+    rivals = [move_to_coords(other) for other in position.legal_moves()
+              if other != move and other >> 7 & 0x7F == move >> 7 & 0x7F
+              and squares[other & 0x7F] == piece]
+    if not rivals:
+        return san
+    origin = format_move(move)[:2]
+    if all(other[1] != from_col for other in rivals):
+        qualifier = origin[0]
+    elif all(other[0] != from_row for other in rivals):
+        qualifier = origin[1]
+    else:
+        qualifier = origin
+    return san[0] + qualifier + san[1:]
+
+
+def parse_epd(line):
+    # Returns (position, operations) where operations maps each opcode to
+    # its list of operands, e.g. {"bm": ["Bxf7+"], "id": ["test 1"]}
+    fields = line.strip().split(None, 4)
+    if len(fields) < 4:
+        raise ValueError(f"EPD needs placement, side, castling and en passant: {line!r}")
+    board = _parse_placement(fields[0])
+    side = _parse_side(fields[1])
+    position = ChessPosition(board, side, _parse_castling(fields[2]),
+                             _parse_ep_square(fields[3], board, side))
+
+    operations = {}
+    rest = fields[4] if len(fields) > 4 else ""
+    for operation in _split_operations(rest):
+        parts = _split_operands(operation)
+        if parts:
+            operations[parts[0]] = parts[1:]
+    return position, operations
+
+
+def _split_operations(text):
+    # Operations end with ';' (which may not appear inside quotes)
+    operations = []
+    current = ""
+    quoted = False
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        if char == ";" and not quoted:
+            if current.strip():
+                operations.append(current.strip())
+            current = ""
+        else:
+            current += char
+    if current.strip():
+        operations.append(current.strip())
+    return operations
+
+
+def _split_operands(operation):
+    parts = []
+    current = ""
+    quoted = False
+    for char in operation:
+        if char == '"':
+            quoted = not quoted
+        elif char.isspace() and not quoted:
+            if current:
+                parts.append(current)
+            current = ""
+        else:
+            current += char
+    if current:
+        parts.append(current)
+    return parts
+
+
+def to_epd(position, operations=None):
+    epd = f"{placement_to_fen(position.board)} {_rule_fields(position)}"
+    for opcode, operands in (operations or {}).items():
+        formatted = " ".join(f'"{operand}"' if " " in operand else operand for operand in operands)
+        epd += f" {opcode} {formatted};"
+    return epd
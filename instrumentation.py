@@ -0,0 +1,146 @@
+# Opt-in search instrumentation.
+#
+# InstrumentedSearchEngine is a drop-in SearchEngine that, after every
+# search, leaves a dict of statistics in engine.stats:
+#   depth, nodes, qnodes, time, nps
+#   tt_probes, tt_hits, tt_hit_rate, tt_stores   (this search only)
+#   cutoffs, first_move_cutoff_rate              (beta cutoffs in negamax)
+#   branching_factor   effective branching factor: the geometric mean of
+#                      the growth in nodes from one iteration to the next
+#   iterations         nodes and time of each completed iteration
+#   time_split, calls  seconds spent in, and calls made to, each group of
+#                      ChessPosition methods (see TIMED_METHODS); "other"
+#                      is the rest of the search: move ordering, SEE,
+#                      transposition table and the search itself
+# The statistics are plain numbers, ready for json.dumps.
+#
+# The plain SearchEngine and ChessPosition count and time nothing, so
+# leaving instrumentation off costs nothing. For the length of a search,
+# the instrumented engine switches the root position's class to
+# InstrumentedPosition, a ChessPosition whose methods time themselves,
+# and switches it back afterwards. Timing every call slows the search
+# down, so use nodes and time shares from here, and plain nps from an
+# ordinary run or the profiler (epd_runner.py --profile).
+#
+# The evaluation is kept up to date inside make_move/unmake_move, so its
+# cost is part of "make_unmake".
+#
+# Only one instrumented search should run at a time in a process.
+
+import math
+import time
+
+from chess_rules import ChessPosition
+from search import SearchEngine
+
+TIMED_METHODS = {
+    "movegen": ("legal_moves", "get_all_legal_moves", "get_legal_captures", "get_legal_quiets"),
+    "legality": ("get_check_constraints", "is_legal_move", "is_in_check"),
+    "make_unmake": ("make_move", "unmake_move"),
+    "draws": ("is_repetition", "is_fifty_move_draw"),
+}
+
+
+class MethodTimings:
+    def __init__(self):
+        self.time = dict.fromkeys(TIMED_METHODS, 0.0)
+        self.calls = dict.fromkeys(TIMED_METHODS, 0)
+        # Set while a timed method runs, so the methods it calls in turn are
+        # not counted a second time
+        self.busy = False
+
+
+def _timed(group, method):
+    def timed_method(self, *args):
+        timings = InstrumentedPosition.timings
+        if timings.busy:
+            return method(self, *args)
+        timings.busy = True
+        start = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            timings.time[group] += time.perf_counter() - start
+            timings.calls[group] += 1
+            timings.busy = False
+
+    timed_method.__name__ = method.__name__
+    return timed_method
+
+
+class InstrumentedPosition(ChessPosition):
+    # Same layout as ChessPosition, so a position's class can be switched
+    __slots__ = ()
+
+    # MethodTimings of the search in progress
+    timings = MethodTimings()
+
+
+for _group, _names in TIMED_METHODS.items():
+    for _name in _names:
+        setattr(InstrumentedPosition, _name, _timed(_group, getattr(ChessPosition, _name)))
+
+
+def branching_factor(iterations):
+    # Geometric mean of the per-iteration node growth, or None with fewer
+    # than two iterations
+    if len(iterations) < 2 or not iterations[0]["nodes"]:
+        return None
+    growth = iterations[-1]["nodes"] / iterations[0]["nodes"]
+    return round(math.pow(growth, 1 / (len(iterations) - 1)), 2)
+
+
+class InstrumentedSearchEngine(SearchEngine):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = None
+
+    def search(self, position, *args, **kwargs):
+        tt = self.tt
+        tt_before = (tt.probes, tt.hits, tt.stores)
+        timings = InstrumentedPosition.timings = MethodTimings()
+
+        # Iterations report cumulative nodes; keep each one's share
+        iterations = []
+        callback = self.on_iteration
+
+        def record_iteration(result):
+            done = sum(iteration["nodes"] for iteration in iterations)
+            iterations.append({"depth": result.depth, "nodes": result.nodes - done,
+                               "time": round(result.elapsed, 4)})
+            if callback:
+                callback(result)
+
+        self.on_iteration = record_iteration
+        position_class = position.__class__
+        position.__class__ = InstrumentedPosition
+        try:
+            result = super().search(position, *args, **kwargs)
+        finally:
+            position.__class__ = position_class
+            self.on_iteration = callback
+
+        elapsed = time.perf_counter() - self.start_time
+        probes, hits, stores = (tt.probes - tt_before[0], tt.hits - tt_before[1],
+                                tt.stores - tt_before[2])
+        timed = sum(timings.time.values())
+        self.stats = {
+            "depth": result.depth,
+            "nodes": self.nodes,
+            "qnodes": self.qnodes,
+            "time": round(elapsed, 4),
+            "nps": int(self.nodes / elapsed) if elapsed > 0 else 0,
+            "tt_probes": probes,
+            "tt_hits": hits,
+            "tt_hit_rate": round(hits / probes, 4) if probes else 0.0,
+            "tt_stores": stores,
+            "cutoffs": self.cutoffs,
+            "first_move_cutoff_rate": round(self.first_move_cutoff_rate, 4),
+            "branching_factor": branching_factor(iterations),
+            "iterations": iterations,
+            "time_split": dict({group: round(seconds, 4)
+                                for group, seconds in timings.time.items()},
+                               other=round(max(0.0, elapsed - timed), 4)),
+            "calls": dict(timings.calls),
+        }
+        return result
@@ -0,0 +1,176 @@
+# Load generator for server.py.
+#
+# Plays many games against a running server at once, spread over a few
+# connections that each carry several games' requests in flight. On its
+# turn a game plays a random legal move (tracked in a local ChessPosition),
+# then asks the engine for a reply with "go". Refused searches ("busy") are
+# retried after a short pause and counted. At the end it prints moves/sec,
+# the client-side p50/p99 move latency and the server's own figures.
+#
+# Usage:
+#   python server.py --port 8765 &
+#   python load_generator.py --port 8765 --games 1000 --concurrency 200 --time 0.05
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+
+from chess_rules import ChessPosition, format_move, parse_move
+from server import DEFAULT_PORT, format_stats, percentile
+
+BUSY_PAUSE = 0.05
+
+
+class Connection:
+    # One socket with any number of requests outstanding, matched to their
+    # replies by id
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count(1)
+        self.pending = {}
+        self.listener = asyncio.create_task(self.listen())
+
+    @classmethod
+    async def open(cls, host, port, unix):
+        if unix:
+            reader, writer = await asyncio.open_unix_connection(unix)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def listen(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                reply = json.loads(line)
+                future = self.pending.pop(reply.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(reply)
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("server closed the connection"))
+
+    async def request(self, op, **fields):
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        fields.update(op=op, id=request_id)
+        self.writer.write(json.dumps(fields).encode() + b"\n")
+        await self.writer.drain()
+        return await future
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.listener.cancel()
+
+
+class Totals:
+    def __init__(self):
+        self.games = 0
+        self.moves = 0
+        self.busy = 0
+        self.errors = 0
+        self.latencies = []
+        self.results = {}
+
+
+async def play_game(connection, rng, args, totals):
+    reply = await connection.request("new")
+    if not reply["ok"]:
+        totals.errors += 1
+        return
+    game = reply["game"]
+    position = ChessPosition()
+    result = reply["result"]
+
+    while result == "*" and len(position.undo_stack) < args.max_plies:
+        if position.current_player == "white":
+            move = rng.choice(position.get_all_legal_moves())
+            reply = await connection.request("move", game=game, move=format_move(move))
+        else:
+            start = time.perf_counter()
+            reply = await connection.request("go", game=game, time=args.time)
+            if not reply["ok"] and reply["error"] == "busy":
+                totals.busy += 1
+                await asyncio.sleep(BUSY_PAUSE)
+                continue
+            if reply["ok"]:
+                totals.latencies.append(time.perf_counter() - start)
+                totals.moves += 1
+                move = parse_move(reply["move"])
+        if not reply["ok"]:
+            totals.errors += 1
+            break
+        result = reply["result"]
+        position.make_move(move)
+
+    totals.results[result] = totals.results.get(result, 0) + 1
+    totals.games += 1
+    await connection.request("close", game=game)
+
+
+async def run(args):
+    connections = [await Connection.open(args.host, args.port, args.unix)
+                   for _ in range(args.connections)]
+    rng = random.Random(args.seed)
+    totals = Totals()
+    remaining = iter(range(args.games))
+
+    async def player(index):
+        # Each player plays games back to back until none are left
+        connection = connections[index % len(connections)]
+        for _ in remaining:
+            await play_game(connection, random.Random(rng.getrandbits(32)), args, totals)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(player(index) for index in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    stats = (await connections[0].request("stats"))["stats"]
+    for connection in connections:
+        await connection.close()
+    return totals, elapsed, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark server.py with many simultaneous games")
+    parser.add_argument("--host", default="127.0.0.1", help="server address")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="server TCP port")
+    parser.add_argument("--unix", help="connect to this Unix socket path instead of TCP")
+    parser.add_argument("--games", type=int, default=200, help="games to play in total")
+    parser.add_argument("--concurrency", type=int, default=50, help="games in progress at once")
+    parser.add_argument("--connections", type=int, default=4, help="sockets to spread them over")
+    parser.add_argument("--time", type=float, default=0.05, help="engine time per move")
+    parser.add_argument("--max-plies", type=int, default=40,
+                        help="stop each game after this many half-moves")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the random moves")
+    args = parser.parse_args(argv)
+
+    totals, elapsed, stats = asyncio.run(run(args))
+    latencies = sorted(totals.latencies)
+
+    def ms(value):
+        return "n/a" if value is None else f"{value * 1000:.1f} ms"
+
+    print(f"{totals.games} games, {totals.moves} engine moves in {elapsed:.1f}s "
+          f"({totals.moves / elapsed:.1f} moves/s)")
+    print(f"move latency: p50 {ms(percentile(latencies, 0.50))}  "
+          f"p99 {ms(percentile(latencies, 0.99))}  "
+          f"max {ms(latencies[-1] if latencies else None)}")
+    print(f"busy retries {totals.busy}  errors {totals.errors}  results "
+          + " ".join(f"{result} {count}" for result, count in sorted(totals.results.items())))
+    print(f"server: {format_stats(stats)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# Move ordering for the alpha-beta search.
+#
+# Moves are produced lazily in stages so that a cutoff early in the list
+# saves the cost of generating the rest:
+#   1. the transposition table's best move
+#   2. captures and promotions, most valuable victim (or promotion piece)
+#      first, least valuable attacker next, except those the static
+#      exchange evaluator expects to lose
+#   3. the two killer moves remembered for this ply
+#   4. the remaining quiet moves, by history score
+#   5. the losing captures held back from stage 2
+# Quiet moves are only generated if nothing before them caused a cutoff.
+
+from board_layout import PIECE_CODES
+from evaluation import PIECE_VALUES
+from exchange import static_exchange
+
+MAX_PLY = 128
+
+# Absolute piece values used for MVV-LVA, indexed by piece code (the
+# modified bishop is worth 9)
+CAPTURE_VALUES = [0] * 16
+for _letter, _value in PIECE_VALUES.items():
+    CAPTURE_VALUES[PIECE_CODES[_letter]] = abs(_value)
+
+# History scores are halved between searches so old statistics fade out
+HISTORY_DECAY = 2
+
+
+class MoveOrderer:
+    def __init__(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = {}
+
+    def new_search(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = {move: score // HISTORY_DECAY
+                        for move, score in self.history.items() if score >= HISTORY_DECAY}
+
+    def mvv_lva(self, squares, move):
+        # En passant finds no victim on its target square and sorts last
+        return ((CAPTURE_VALUES[squares[move >> 7 & 0x7F]] + CAPTURE_VALUES[move >> 14]) * 1000
+                - CAPTURE_VALUES[squares[move & 0x7F]])
+
+    def order_captures(self, squares, captures):
+        captures.sort(key=lambda move: self.mvv_lva(squares, move), reverse=True)
+        return captures
+
+    def order_root(self, position, moves):
+        # Root moves are generated in full once: captures and promotions
+        # first, then quiets
+        squares = position.squares
+        captures = [move for move in moves if squares[move >> 7 & 0x7F] or move >> 14]
+        quiets = [move for move in moves if not squares[move >> 7 & 0x7F] and not move >> 14]
+        self.order_captures(squares, captures)
+        history = self.history
+        quiets.sort(key=lambda move: history.get(move, 0), reverse=True)
+        return captures + quiets
+
+    def pick_moves(self, position, side, ply, tt_move=None):
+        # Yield legal moves best-first. The caller makes and unmakes each
+        # move before asking for the next one.
+        squares = position.squares
+        constraints = position.get_check_constraints(side)
+
+        if tt_move is not None and position.is_legal_move(tt_move):
+            yield tt_move
+        else:
+            tt_move = None
+
+        captures = self.order_captures(squares, position.get_legal_captures(side, constraints))
+        losing_captures = []
+        for move in captures:
+            if move == tt_move:
+                continue
+            # Only a capture by a more valuable piece can lose material
+            if (CAPTURE_VALUES[squares[move & 0x7F]] > CAPTURE_VALUES[squares[move >> 7 & 0x7F]]
+                    and static_exchange(position, move) < 0):
+                losing_captures.append(move)
+                continue
+            yield move
+
+        killers = self.killers[ply]
+        for killer in killers:
+            if (killer is not None and killer != tt_move and not squares[killer >> 7 & 0x7F]
+                    and position.is_legal_move(killer)):
+                yield killer
+
+        quiets = position.get_legal_quiets(side, constraints)
+        history = self.history
+        quiets.sort(key=lambda move: history.get(move, 0), reverse=True)
+        for move in quiets:
+            if move != tt_move and move != killers[0] and move != killers[1]:
+                yield move
+
+        for move in losing_captures:
+            yield move
+
+    def record_cutoff(self, move, ply, depth):
+        # A quiet move refuted the opponent's play: remember it as a killer
+        # at this ply and credit it in the history table
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[move] = self.history.get(move, 0) + depth * depth
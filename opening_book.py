@@ -0,0 +1,231 @@
+# Opening book for Modified Chess.
+#
+# A book is a binary file of fixed-size entries sorted by Zobrist hash, so
+# the moves for a position are found by binary search. The file is read
+# through mmap: opening a book costs nothing up front, and only the pages
+# a lookup touches are read from disk.
+#
+# File layout (little-endian):
+#   header  8-byte magic, 8-byte entry count
+#   entry   8-byte position hash, 4-byte move, 2-byte weight, 2 bytes unused
+# Entries for the same hash are adjacent, heaviest move first.
+#
+# Books are built from games of the modified variant: the JSONL output of
+# selfplay.py, or text files with one game per line as a move list such as
+# "1. e4 Nc6 2. d4 d5 1-0" (algebraic or coordinate notation). A move's
+# weight counts 2 for every game its side won, 1 for a draw or unknown
+# result and 0 for a loss.
+#
+# Usage:
+#   python opening_book.py build book.bin --selfplay games.jsonl --plies 16
+#   python opening_book.py build book.bin --games lines.txt --min-weight 2
+#   python opening_book.py probe book.bin --moves "e2e4 b8c6"
+
+import argparse
+import json
+import mmap
+import random
+import struct
+import sys
+
+from board_layout import WHITE
+from chess_rules import ChessPosition, format_move, parse_move
+from fen import parse_fen, parse_san
+
+BOOK_MAGIC = b"MCBOOK02"
+HEADER = struct.Struct("<8sQ")
+ENTRY = struct.Struct("<QIHH")
+KEY = struct.Struct("<Q")
+
+DEFAULT_BOOK_PLIES = 16
+MAX_WEIGHT = 0xFFFF
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.entry_count = HEADER.unpack_from(self.data, 0)
+        if magic != BOOK_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+        if HEADER.size + self.entry_count * ENTRY.size > len(self.data):
+            self.close()
+            raise ValueError(f"{path} is truncated")
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.entry_count
+
+    def _key_at(self, index):
+        return KEY.unpack_from(self.data, HEADER.size + index * ENTRY.size)[0]
+
+    def probe(self, key):
+        # [(move, weight), ...] stored for a position hash, heaviest first
+        low, high = 0, self.entry_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        moves = []
+        index = low
+        while index < self.entry_count:
+            entry_key, move, weight, _ = ENTRY.unpack_from(self.data,
+                                                           HEADER.size + index * ENTRY.size)
+            if entry_key != key:
+                break
+            moves.append((move, weight))
+            index += 1
+        return moves
+
+    def choose(self, position, rng=random):
+        # A book move for the position, picked at random in proportion to
+        # its weight, or None when the position is not in the book. Moves
+        # are checked for legality in case of a hash collision.
+        moves = [(move, weight) for move, weight in self.probe(position.hash)
+                 if weight and position.is_legal_move(move)]
+        if not moves:
+            return None
+        pick = rng.randrange(sum(weight for _, weight in moves))
+        for move, weight in moves:
+            if pick < weight:
+                return move
+            pick -= weight
+
+
+def result_weight(result, side):
+    # Book weight a game's result gives to a move by side
+    if result == "1/2-1/2" or result not in ("1-0", "0-1"):
+        return 1
+    return 2 if (result == "1-0") == (side == WHITE) else 0
+
+
+def read_selfplay(path):
+    # (moves, result) for every game in a selfplay.py JSONL file
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                record = json.loads(line)
+                yield [parse_move(text) for text in record["moves"].split()], record["result"]
+
+
+def read_move_lists(path):
+    # (moves, result) for every line of a move-list file. Move numbers are
+    # skipped and a final result token is optional; a line stops at the
+    # first move that cannot be read.
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line or line.startswith(("#", "[")):
+                continue
+            position = ChessPosition()
+            moves = []
+            result = None
+            for token in line.split():
+                if token in RESULTS:
+                    result = token
+                    break
+                token = token.split(".")[-1]  # "1.e4" and "1." both work
+                if not token:
+                    continue
+                try:
+                    move = parse_san(position, token)
+                except ValueError:
+                    break
+                position.make_move(move)
+                moves.append(move)
+            yield moves, result
+
+
+def collect_weights(games, plies=DEFAULT_BOOK_PLIES):
+    # {(hash, move): weight} over the first plies moves of every game
+    weights = {}
+    for moves, result in games:
+        position = ChessPosition()
+        for move in moves[:plies]:
+            if not position.is_legal_move(move):
+                break
+            entry = (position.hash, move)
+            weights[entry] = weights.get(entry, 0) + result_weight(result, position.side)
+            position.make_move(move)
+    return weights
+
+
+def write_book(path, weights, min_weight=1):
+    # Sort by hash, heaviest move first, and scale weights into 16 bits
+    entries = [(key, move, weight) for (key, move), weight in weights.items()
+               if weight >= min_weight]
+    entries.sort(key=lambda entry: (entry[0], -entry[2], entry[1]))
+    heaviest = max((weight for _, _, weight in entries), default=0)
+    scale = MAX_WEIGHT / heaviest if heaviest > MAX_WEIGHT else 1
+
+    with open(path, "wb") as handle:
+        handle.write(HEADER.pack(BOOK_MAGIC, len(entries)))
+        for key, move, weight in entries:
+            handle.write(ENTRY.pack(key, move, max(1, int(weight * scale)), 0))
+    return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect an opening book")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="build a book from games")
+    build.add_argument("book", help="book file to write")
+    build.add_argument("--selfplay", action="append", default=[], help="selfplay.py JSONL output")
+    build.add_argument("--games", action="append", default=[],
+                       help="file with one move list per line")
+    build.add_argument("--plies", type=int, default=DEFAULT_BOOK_PLIES,
+                       help="book depth in half-moves")
+    build.add_argument("--min-weight", type=int, default=1,
+                       help="drop moves weighing less than this")
+
+    probe = commands.add_parser("probe", help="list the book moves for a position")
+    probe.add_argument("book", help="book file to read")
+    probe.add_argument("--fen", default=None,
+                       help="position to look up (default: initial position)")
+    probe.add_argument("--moves", default="", help="moves played from that position first")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        weights = {}
+        sources = ([read_selfplay(path) for path in args.selfplay]
+                   + [read_move_lists(path) for path in args.games])
+        for games in sources:
+            for entry, weight in collect_weights(games, args.plies).items():
+                weights[entry] = weights.get(entry, 0) + weight
+        count = write_book(args.book, weights, args.min_weight)
+        print(f"Wrote {count} entries to {args.book}")
+        return 0
+
+    position = parse_fen(args.fen) if args.fen else ChessPosition()
+    for text in args.moves.split():
+        position.make_move(parse_san(position, text))
+    with OpeningBook(args.book) as book:
+        moves = book.probe(position.hash)
+        total = sum(weight for _, weight in moves) or 1
+        for move, weight in moves:
+            print(f"{format_move(move)}  weight {weight:>5}  ({100 * weight / total:.1f}%)")
+        if not moves:
+            print("Position not in book")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
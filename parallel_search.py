@@ -0,0 +1,182 @@
+# Parallel search over several processes (Lazy SMP).
+#
+# Threads would take turns holding the GIL, so every extra searcher runs
+# in a process of its own. All processes search the same position with an
+# ordinary SearchEngine; the only state they share is the transposition
+# table, kept in shared memory and read and written without locks (see
+# transposition.py). Whatever one process learns about a position is found
+# in the table by the others, so together they reach a given depth sooner
+# than a single search would.
+#
+# The main search runs in the calling process and alone decides the move,
+# the iterations reported and when to stop. Helpers search until it is
+# done; every second helper starts one ply deeper than the main search so
+# the processes spread over different iterations.
+#
+# Run `python parallel_search.py` to measure time to depth and speedup for
+# 1, 2, 4, ... processes over the positions of positions/bench.epd.
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+from search import DEFAULT_TT_SIZE_MB, MAX_PLY, SearchEngine
+from tablebase import Tablebases
+from transposition import TranspositionTable, shared_table_buffer
+
+
+def _helper_main(index, requests, responses, stop_event, buffer, tt_size_mb, tablebase_dir):
+    engine = SearchEngine(stop_event=stop_event, tt=TranspositionTable(tt_size_mb, buffer),
+                          tablebases=Tablebases(tablebase_dir) if tablebase_dir else None)
+
+    while True:
+        message = requests.get()
+        if message[0] == "quit":
+            break
+
+        _, job_id, position, age = message
+        # Agree with the main search on the table's age; search() moves it
+        # on by one
+        engine.tt.age = (age - 1) & 0xFF
+        engine.search(position, max_depth=MAX_PLY, start_depth=1 + index % 2)
+        responses.put(("done", job_id, engine.nodes))
+
+
+class ParallelSearchEngine:
+    def __init__(self, threads=None, max_depth=MAX_PLY, time_limit=None, node_limit=None,
+                 on_iteration=None, tt_size_mb=DEFAULT_TT_SIZE_MB, stop_event=None,
+                 tablebase_dir=None):
+        # threads is the total number of searching processes, the calling
+        # one included (default: one per CPU). The other arguments are as
+        # for SearchEngine; node_limit counts the main search's nodes only.
+        # Every process opens the tablebases in tablebase_dir, if given.
+        self.threads = max(1, threads or os.cpu_count() or 1)
+        context = multiprocessing.get_context("spawn")
+        buffer = shared_table_buffer(tt_size_mb, context)
+        self.engine = SearchEngine(max_depth, time_limit, node_limit, on_iteration,
+                                   stop_event=stop_event, tt=TranspositionTable(tt_size_mb, buffer),
+                                   tablebases=Tablebases(tablebase_dir) if tablebase_dir else None)
+        self.helper_stop = context.Event()
+        self.responses = context.Queue()
+        self.job_id = 0
+        self.helpers = []
+        for index in range(1, self.threads):
+            requests = context.Queue()
+            process = context.Process(
+                target=_helper_main,
+                args=(index, requests, self.responses, self.helper_stop, buffer, tt_size_mb,
+                      tablebase_dir),
+                daemon=True,
+            )
+            process.start()
+            self.helpers.append((process, requests))
+
+    @property
+    def tt(self):
+        return self.engine.tt
+
+    @property
+    def on_iteration(self):
+        return self.engine.on_iteration
+
+    @on_iteration.setter
+    def on_iteration(self, callback):
+        self.engine.on_iteration = callback
+
+    def search(self, position, max_depth=None, time_limit=None, node_limit=None):
+        self.job_id += 1
+        start = time.perf_counter()
+        age = (self.engine.tt.age + 1) & 0xFF
+        for _, requests in self.helpers:
+            requests.put(("search", self.job_id, position.copy(), age))
+
+        try:
+            result = self.engine.search(position, max_depth, time_limit, node_limit)
+        finally:
+            # The helpers only stop when told to, and the next search must
+            # not start while one of them is still writing to the table
+            self.helper_stop.set()
+            helper_nodes = self.wait_for_helpers()
+            self.helper_stop.clear()
+
+        # Nodes and time cover all processes, so nps is for the whole search
+        result.nodes += helper_nodes
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def wait_for_helpers(self):
+        # Total nodes searched by the helpers for the current job
+        nodes = 0
+        pending = len(self.helpers)
+        while pending:
+            _, job_id, helper_nodes = self.responses.get()
+            if job_id == self.job_id:
+                nodes += helper_nodes
+                pending -= 1
+        return nodes
+
+    def stop(self):
+        self.engine.stop()
+
+    def shutdown(self):
+        self.helper_stop.set()
+        for _, requests in self.helpers:
+            requests.put(("quit",))
+        for process, _ in self.helpers:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self.helpers = []
+
+
+def benchmark(positions, thread_counts, depth, tt_size_mb):
+    # Time for each thread count to search every position to depth, with
+    # a cleared table per position so earlier positions do not help later ones
+    rows = []
+    for threads in thread_counts:
+        engine = ParallelSearchEngine(threads, tt_size_mb=tt_size_mb)
+        nodes = 0
+        start = time.perf_counter()
+        for position in positions:
+            engine.tt.clear()
+            nodes += engine.search(position.copy(), max_depth=depth).nodes
+        elapsed = time.perf_counter() - start
+        engine.shutdown()
+        rows.append((threads, elapsed, nodes))
+    return rows
+
+
+def main(argv=None):
+    from epd_runner import load_suite
+
+    parser = argparse.ArgumentParser(description="Measure Lazy SMP speedup over a set of positions")
+    parser.add_argument("suite", nargs="?", default=os.path.join("positions", "bench.epd"))
+    parser.add_argument("--depth", type=int, default=4, help="search depth per position")
+    parser.add_argument("--threads", type=int, nargs="+", default=None,
+                        help="thread counts to compare (default: 1, 2, 4, ... up to the CPU count)")
+    parser.add_argument("--positions", type=int, default=10, help="number of positions to search")
+    parser.add_argument("--hash", type=int, default=DEFAULT_TT_SIZE_MB, help="table size in MB")
+    args = parser.parse_args(argv)
+
+    thread_counts = args.threads
+    if not thread_counts:
+        cpus = os.cpu_count() or 1
+        thread_counts = [1 << i for i in range(cpus.bit_length()) if 1 << i <= cpus]
+        if thread_counts[-1] != cpus:
+            thread_counts.append(cpus)
+
+    positions = [position for _, position, _ in load_suite(args.suite)[:args.positions]]
+    print(f"{len(positions)} positions, depth {args.depth}, {os.cpu_count()} CPUs")
+    print(f"{'threads':>7} {'time':>9} {'speedup':>8} {'nodes':>10} {'nps':>8}")
+    baseline = None
+    for threads, elapsed, nodes in benchmark(positions, thread_counts, args.depth, args.hash):
+        baseline = baseline or elapsed
+        print(f"{threads:>7} {elapsed:>8.2f}s {baseline / elapsed:>7.2f}x {nodes:>10} "
+              f"{int(nodes / elapsed):>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
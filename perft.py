@@ -0,0 +1,145 @@
+# Perft: count the leaf nodes of the legal move tree to a fixed depth.
+#
+# Perft numbers pin down the move generator exactly, so this is both the
+# correctness gate for any change to the rules code and a throughput
+# benchmark (nodes per second) to track over time. The counts below are
+# for this project's ruleset, where the bishop moves like a queen.
+#
+# Usage:
+#   python perft.py 4                      perft 4 from the initial position
+#   python perft.py 3 --moves e2e4 e7e5    perft 3 after the given moves
+#   python perft.py 3 --fen "<fen>"        perft 3 from a FEN position
+#   python perft.py 3 --divide             per-root-move counts
+#   python perft.py --check                verify every count in PERFT_EXPECTED
+#                                          and PERFT_FEN_EXPECTED
+
+import argparse
+import sys
+import time
+
+from chess_rules import ChessPosition, format_move, parse_move
+from fen import parse_fen
+
+# Expected leaf counts keyed by the moves played from the initial position,
+# counted with the full rules (castling, en passant, promotion). Depth 4
+# after e2e4 e7e5 includes two en passant captures, d4c3 after d2d4 e5d4
+# c2c4 and f4g3 after f2f4 e5f4 g2g4; --divide lists them.
+PERFT_EXPECTED = {
+    "": {1: 20, 2: 400, 3: 9102, 4: 206290},
+    "e2e4 e7e5": {1: 29, 2: 835, 3: 26281, 4: 812834},
+    "d2d4 d7d5 c1f4 b8c6": {1: 38, 2: 1071, 3: 40261},
+    "e2e4 d7d5 f1b5": {1: 5, 2: 208, 3: 5130},
+    "e2e4 d7d5 e4d5 d8d5 b1c3 d5a5 d2d4 c7c6": {1: 34, 2: 1371, 3: 50559},
+}
+
+# Positions that exercise castling, en passant and promotion, keyed by FEN.
+# Without bishops on the board the variant plays like standard chess, so
+# the first two are the published counts; the others guard against
+# regressions.
+PERFT_FEN_EXPECTED = {
+    "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1": {1: 26, 2: 568, 3: 13744},
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1": {1: 14, 2: 191, 3: 2812, 4: 43238},
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1": {1: 52, 2: 2516},
+    "n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1": {1: 24, 2: 494, 3: 9612},
+}
+
+
+def perft(position, depth):
+    if depth == 0:
+        return 1
+    moves = position.get_all_legal_moves()
+    if depth == 1:
+        return len(moves)  # Bulk counting: leaves need not be played
+
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+
+def divide(position, depth):
+    # Leaf counts below each root move, for narrowing down a mismatch
+    counts = {}
+    for move in position.get_all_legal_moves():
+        position.make_move(move)
+        counts[format_move(move)] = perft(position, depth - 1)
+        position.unmake_move()
+    return counts
+
+
+def position_after(moves, fen=None):
+    position = parse_fen(fen) if fen else ChessPosition()
+    for text in moves:
+        move = parse_move(text)
+        if not position.is_legal_move(move):
+            raise ValueError(f"Illegal move in sequence: {text}")
+        position.make_move(move)
+    return position
+
+
+def timed_perft(position, depth):
+    start = time.perf_counter()
+    nodes = perft(position, depth)
+    elapsed = time.perf_counter() - start
+    return nodes, elapsed
+
+
+def run_checks(max_depth=None):
+    failures = 0
+    total_nodes = 0
+    total_time = 0.0
+    cases = [(moves or "initial position", moves.split(), None, counts)
+             for moves, counts in PERFT_EXPECTED.items()]
+    cases += [(fen.split()[0], [], fen, counts) for fen, counts in PERFT_FEN_EXPECTED.items()]
+    for label, moves, fen, counts in cases:
+        for depth, expected in sorted(counts.items()):
+            if max_depth is not None and depth > max_depth:
+                continue
+            nodes, elapsed = timed_perft(position_after(moves, fen), depth)
+            total_nodes += nodes
+            total_time += elapsed
+            status = "ok" if nodes == expected else f"FAIL (expected {expected})"
+            if nodes != expected:
+                failures += 1
+            print(f"{label:<24} depth {depth}: {nodes:>10} {status}")
+    nps = int(total_nodes / total_time) if total_time else 0
+    print(f"{total_nodes} nodes in {total_time:.2f}s ({nps} nodes/s)")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft for Modified Chess")
+    parser.add_argument("depth", type=int, nargs="?", default=3)
+    parser.add_argument("--fen", default=None, help="start from this position")
+    parser.add_argument("--moves", nargs="*", default=[],
+                        help="coordinate moves (e.g. e2e4) played from the start position")
+    parser.add_argument("--divide", action="store_true", help="print counts per root move")
+    parser.add_argument("--check", action="store_true",
+                        help="verify the expected counts table instead")
+    parser.add_argument("--max-depth", type=int, default=None,
+                        help="with --check, skip entries deeper than this")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        return 1 if run_checks(args.max_depth) else 0
+
+    position = position_after(args.moves, args.fen)
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(position, args.depth)
+        for move, count in sorted(counts.items()):
+            print(f"{move}: {count}")
+        nodes = sum(counts.values())
+        print(f"Moves: {len(counts)}")
+    else:
+        nodes = perft(position, args.depth)
+    elapsed = time.perf_counter() - start
+    nps = int(nodes / elapsed) if elapsed else 0
+    print(f"Depth {args.depth}: {nodes} nodes in {elapsed:.2f}s ({nps} nodes/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,372 @@
+# Alpha-beta search engine for the AI player.
+#
+# Negamax with alpha-beta pruning inside an iterative deepening loop. Each
+# iteration searches one ply deeper than the last until the depth, time or
+# node budget runs out; the result of the deepest completed iteration is
+# returned. Leaves are resolved by a quiescence search over captures so
+# the evaluation is only trusted in quiet positions. Scores are in
+# centipawns from the side to move's point of view, taken from the
+# position's incrementally updated evaluation.
+#
+# With endgame tablebases (see tablebase.py), positions they cover are
+# looked up instead of searched: at the root the move comes straight from
+# the distance-to-mate table, inside the tree the win/draw/loss table ends
+# the branch.
+#
+# Positions drawn by repetition or the fifty-move rule score 0 inside the
+# tree, so the search neither walks into a repetition it could avoid nor
+# spends nodes going round in cycles.
+
+import threading
+import time
+
+from board_layout import PAWN, QUEEN, TYPE_MASK, WHITE
+from chess_rules import format_move
+from exchange import EXCHANGE_VALUES, static_exchange
+from move_ordering import MoveOrderer
+from tablebase import DRAW, LOSS_BASE, WIN, dtm_plies
+from transposition import EXACT, LOWER, UPPER, TranspositionTable, score_from_tt, score_to_tt
+
+MATE_SCORE = 100000
+INFINITY = 1000000
+MAX_PLY = 128
+# Scores beyond this are mates, stored in the transposition table relative to the node
+MATE_BOUND = MATE_SCORE - MAX_PLY
+# Tablebase wins whose distance to mate is not known (from the WDL table)
+TB_WIN = MATE_BOUND - MAX_PLY
+
+DEFAULT_TT_SIZE_MB = 16
+
+# Quiescence search skips captures that cannot lift the score back to
+# alpha even with this much positional compensation
+DELTA_MARGIN = 200
+
+# How often (in nodes) the time budget is checked
+CHECK_INTERVAL = 1024
+
+
+def tablebase_score(value):
+    # Score of a tablebase DTM byte: a known mate distance, like a mate found by search
+    if not value:
+        return 0
+    if value < LOSS_BASE:
+        return MATE_SCORE - dtm_plies(value)
+    return -MATE_SCORE + dtm_plies(value)
+
+
+class SearchTimeout(Exception):
+    # Raised inside the search when the time or node budget runs out
+    pass
+
+
+class SearchResult:
+    def __init__(self, best_move, score, depth, pv, nodes, elapsed, hashfull=0,
+                 first_move_cutoff_rate=0.0):
+        self.best_move = best_move
+        self.score = score
+        self.depth = depth
+        self.pv = pv
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.hashfull = hashfull
+        # Share of beta cutoffs caused by the first move searched; close to
+        # 1.0 means move ordering is nearly perfect
+        self.first_move_cutoff_rate = first_move_cutoff_rate
+
+    @property
+    def nps(self):
+        return int(self.nodes / self.elapsed) if self.elapsed > 0 else 0
+
+    def info_string(self):
+        pv = " ".join(format_move(move) for move in self.pv)
+        return (f"depth {self.depth} score {self.score} nodes {self.nodes} "
+                f"nps {self.nps} hashfull {self.hashfull} time {int(self.elapsed * 1000)} "
+                f"fmc {self.first_move_cutoff_rate:.2f} pv {pv}")
+
+    def __repr__(self):
+        return f"SearchResult({self.info_string()})"
+
+
+class SearchEngine:
+    def __init__(self, max_depth=MAX_PLY, time_limit=None, node_limit=None, on_iteration=None,
+                 tt_size_mb=DEFAULT_TT_SIZE_MB, stop_event=None, tt=None, tablebases=None):
+        # time_limit is in seconds. on_iteration, if given, is called with a
+        # SearchResult after every completed iteration. The transposition
+        # table is kept between searches.
+        #
+        # Setting stop_event (a threading or multiprocessing Event) aborts
+        # the search in progress, even during its first iteration. Whoever
+        # owns the event clears it before starting the next search.
+        #
+        # tt replaces the engine's own transposition table, e.g. with one in
+        # memory shared by the processes of a parallel search.
+        #
+        # tablebases is a tablebase.Tablebases to probe, if any.
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.on_iteration = on_iteration
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.tt = tt if tt is not None else TranspositionTable(tt_size_mb)
+        self.tablebases = tablebases if tablebases is not None and tablebases.max_pieces else None
+        self.orderer = MoveOrderer()
+        self.nodes = 0
+        self.qnodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        # History length at the root: repeating a position from inside the
+        # tree counts as a draw already
+        self.search_start = 0
+
+    def search(self, position, max_depth=None, time_limit=None, node_limit=None, start_depth=1):
+        # start_depth lets helpers of a parallel search begin deeper than the
+        # main search, so the processes are not all on the same iteration
+        max_depth = max_depth or self.max_depth
+        time_limit = time_limit if time_limit is not None else self.time_limit
+        node_limit = node_limit if node_limit is not None else self.node_limit
+
+        self.nodes = 0
+        self.qnodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.start_time = time.perf_counter()
+        self.deadline = self.start_time + time_limit if time_limit else None
+        self.node_limit_active = node_limit
+        self.can_stop = False
+        self.pv_table = [[None] * MAX_PLY for _ in range(MAX_PLY)]
+        self.pv_length = [0] * MAX_PLY
+        self.tt.new_search()
+        self.orderer.new_search()
+
+        root_moves = list(position.legal_moves())
+        if not root_moves:
+            return SearchResult(None, 0, 0, [], 0, 0.0)
+        root_moves = self.orderer.order_root(position, root_moves)
+
+        if self.tablebases is not None:
+            probe = self.tablebases.best_move(position)
+            if probe is not None:
+                move, value = probe
+                result = SearchResult(move, tablebase_score(value), 1, [move], 1,
+                                      time.perf_counter() - self.start_time)
+                if self.on_iteration:
+                    self.on_iteration(result)
+                return result
+
+        root_depth = len(position.undo_stack)
+        self.search_start = len(position.history)
+        result = None
+        for depth in range(start_depth, max(start_depth, min(max_depth, MAX_PLY - 1)) + 1):
+            try:
+                score = self.search_root(position, root_moves, depth)
+            except SearchTimeout:
+                # Unwind whatever the interrupted iteration left on the board
+                while len(position.undo_stack) > root_depth:
+                    position.unmake_move()
+                break
+
+            pv = self.pv_table[0][:self.pv_length[0]]
+            result = SearchResult(pv[0], score, depth, pv, self.nodes,
+                                  time.perf_counter() - self.start_time, self.tt.hashfull(),
+                                  self.first_move_cutoff_rate)
+            if self.on_iteration:
+                self.on_iteration(result)
+
+            # The first iteration always completes so there is a move to play
+            self.can_stop = True
+
+            # Search the best move first next time
+            root_moves.remove(pv[0])
+            root_moves.insert(0, pv[0])
+
+            if abs(score) >= MATE_BOUND:
+                break  # Forced mate found, deeper search cannot improve it
+
+        if result is None:
+            # Stopped before the first iteration finished
+            result = SearchResult(None, 0, 0, [], self.nodes, time.perf_counter() - self.start_time)
+        return result
+
+    def stop(self):
+        self.stop_event.set()
+
+    @property
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def check_limits(self):
+        if self.stop_event.is_set():
+            raise SearchTimeout()
+        if not self.can_stop:
+            return
+        if self.node_limit_active and self.nodes >= self.node_limit_active:
+            raise SearchTimeout()
+        if self.deadline and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+
+    def search_root(self, position, moves, depth):
+        alpha, beta = -INFINITY, INFINITY
+        self.nodes += 1
+        self.pv_length[0] = 0
+
+        for move in moves:
+            position.make_move(move)
+            score = -self.negamax(position, depth - 1, -beta, -alpha, 1)
+            position.unmake_move()
+
+            if score > alpha:
+                alpha = score
+                self.update_pv(0, move)
+
+        self.tt.store(position.hash, depth, EXACT, score_to_tt(alpha, 0, MATE_BOUND),
+                      self.pv_table[0][0])
+        return alpha
+
+    def negamax(self, position, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0:
+            self.check_limits()
+        self.pv_length[ply] = ply
+
+        if self.tablebases is not None:
+            wdl = self.tablebases.probe_wdl(position)
+            if wdl is not None:
+                if wdl == DRAW:
+                    return 0
+                return TB_WIN - ply if wdl == WIN else -TB_WIN + ply
+
+        # A repetition needs at least four half-moves since the last capture
+        # or pawn move, which rules most nodes out without looking further
+        if position.halfmove_clock >= 4 and (position.is_repetition(self.search_start)
+                                             or position.is_fifty_move_draw()):
+            return 0
+
+        side = position.side
+        if depth <= 0 or ply >= MAX_PLY - 1:
+            return self.quiescence(position, alpha, beta, ply)
+
+        # A stored result from an equal or deeper search may settle this node
+        key = position.hash
+        tt_move = None
+        entry = self.tt.probe(key)
+        if entry:
+            entry_depth, bound, entry_score, tt_move = entry
+            if entry_depth >= depth:
+                entry_score = score_from_tt(entry_score, ply, MATE_BOUND)
+                if (bound == EXACT or (bound == LOWER and entry_score >= beta)
+                        or (bound == UPPER and entry_score <= alpha)):
+                    return entry_score
+
+        best_score = -INFINITY
+        best_move = None
+        moves_searched = 0
+        for move in self.orderer.pick_moves(position, side, ply, tt_move):
+            captured = position.make_move(move)
+            score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            moves_searched += 1
+
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    best_move = move
+                    self.update_pv(ply, move)
+                    if alpha >= beta:
+                        self.cutoffs += 1
+                        if moves_searched == 1:
+                            self.first_move_cutoffs += 1
+                        if not captured and not move >> 14:
+                            self.orderer.record_cutoff(move, ply, depth)
+                        break
+
+        if not moves_searched:
+            if position.is_in_check(side):
+                return -MATE_SCORE + ply  # Checkmated: prefer the slowest loss
+            return 0  # Stalemate
+
+        if best_score >= beta:
+            bound = LOWER
+        elif best_move is None:
+            bound = UPPER  # Nothing beat alpha: only an upper bound is known
+        else:
+            bound = EXACT
+        self.tt.store(key, depth, bound, score_to_tt(best_score, ply, MATE_BOUND), best_move)
+        return best_score
+
+    def quiescence(self, position, alpha, beta, ply):
+        # Only captures are searched, so the evaluation is read in a quiet
+        # position instead of in the middle of an exchange
+        self.qnodes += 1
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0:
+            self.check_limits()
+        self.pv_length[ply] = ply
+
+        side = position.side
+        stand_pat = position.evaluation if side == WHITE else -position.evaluation
+        if ply >= MAX_PLY - 1:
+            return stand_pat
+
+        if position.is_in_check(side):
+            # No standing pat in check: every evasion has to be looked at
+            moves = self.orderer.order_root(position, position.get_all_legal_moves(side))
+            if not moves:
+                return -MATE_SCORE + ply
+            best_score = -INFINITY
+        else:
+            # Standing pat: the side to move can usually decline to capture
+            if stand_pat >= beta:
+                return stand_pat
+            if stand_pat > alpha:
+                alpha = stand_pat
+            best_score = stand_pat
+
+            squares = position.squares
+            moves = []
+            for move in self.orderer.order_captures(squares, position.get_legal_captures(side)):
+                to_square = move >> 7 & 0x7F
+                victim = EXCHANGE_VALUES[squares[to_square]]
+                # En passant takes a pawn that is not on the target square
+                if (not victim and to_square == position.ep_square
+                        and squares[move & 0x7F] & TYPE_MASK == PAWN):
+                    victim = EXCHANGE_VALUES[PAWN]
+                promotion = move >> 14
+                if promotion:
+                    # Underpromotions are left to the full-width search
+                    if promotion != QUEEN:
+                        continue
+                    victim += EXCHANGE_VALUES[QUEEN] - EXCHANGE_VALUES[PAWN]
+                # Delta pruning: even winning the piece outright is not enough
+                if stand_pat + victim + DELTA_MARGIN <= alpha:
+                    continue
+                # Captures that lose material in the exchange are skipped
+                if (EXCHANGE_VALUES[squares[move & 0x7F]] > victim
+                        and static_exchange(position, move) < 0):
+                    continue
+                moves.append(move)
+
+        for move in moves:
+            position.make_move(move)
+            score = -self.quiescence(position, -beta, -alpha, ply + 1)
+            position.unmake_move()
+
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    self.update_pv(ply, move)
+                    if alpha >= beta:
+                        break
+
+        return best_score
+
+    def update_pv(self, ply, move):
+        # Triangular PV table: this ply's line is the move plus the child's line
+        row = self.pv_table[ply]
+        child = self.pv_table[ply + 1]
+        row[ply] = move
+        child_length = self.pv_length[ply + 1]
+        for i in range(ply + 1, child_length):
+            row[i] = child[i]
+        self.pv_length[ply] = max(child_length, ply + 1)
@@ -0,0 +1,216 @@
+# Headless self-play between two engine configurations.
+#
+# Games are played in parallel on a pool of worker processes, without the
+# Tk window. Each opening is played twice with colours swapped so neither
+# configuration gains from a lucky opening. A game ends on checkmate or
+# stalemate, on threefold repetition or the fifty-move rule (drawn), or at
+# the move limit (drawn). Every finished game is appended to a JSONL file
+# as it comes in; the summary gives the Elo difference of A over B with a
+# 95% error margin, and the throughput in games/hour.
+#
+# Usage:
+#   python selfplay.py --games 200 --a depth=3 --b depth=2
+#   python selfplay.py --games 100 --a time=0.2 --b time=0.1 --workers 4 --out games.jsonl
+#
+# A configuration is a comma-separated list of depth=, time=, nodes= and
+# hash= settings for SearchEngine.
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from chess_rules import ChessPosition, format_move
+from search import MAX_PLY, SearchEngine
+
+CONFIG_KEYS = {"depth": int, "time": float, "nodes": int, "hash": int}
+
+DEFAULT_OPENING_PLIES = 4
+DEFAULT_MAX_PLIES = 200
+
+
+def parse_config(text):
+    config = {}
+    for item in filter(None, text.split(",")):
+        key, _, value = item.partition("=")
+        if key not in CONFIG_KEYS:
+            raise ValueError(f"Unknown engine setting {key!r} "
+                             f"(expected one of {', '.join(CONFIG_KEYS)})")
+        config[key] = CONFIG_KEYS[key](value)
+    if not any(key in config for key in ("depth", "time", "nodes")):
+        raise ValueError(f"Engine configuration {text!r} needs a depth, time or nodes limit")
+    return config
+
+
+def make_engine(config):
+    return SearchEngine(max_depth=config.get("depth", MAX_PLY), time_limit=config.get("time"),
+                        node_limit=config.get("nodes"), tt_size_mb=config.get("hash", 16))
+
+
+def random_opening(rng, plies):
+    # A few random legal moves from the start position. Openings that end
+    # the game early are thrown away.
+    while True:
+        position = ChessPosition()
+        moves = []
+        for _ in range(plies):
+            legal = position.get_all_legal_moves()
+            if not legal:
+                break
+            move = rng.choice(legal)
+            position.make_move(move)
+            moves.append(move)
+        if len(moves) == plies and position.has_legal_move(position.side):
+            return moves
+
+
+def play_game(opening, white_config, black_config, max_plies):
+    # Returns (result, reason, moves) with result "1-0", "0-1" or "1/2-1/2"
+    engines = {"white": make_engine(white_config), "black": make_engine(black_config)}
+    position = ChessPosition()
+    moves = []
+
+    for move in opening:
+        position.make_move(move)
+        moves.append(move)
+
+    while True:
+        player = position.current_player
+        if position.is_checkmate(position.side):
+            return ("0-1" if player == "white" else "1-0"), "checkmate", moves
+        if position.is_stalemate(position.side):
+            return "1/2-1/2", "stalemate", moves
+        if position.is_repetition():
+            return "1/2-1/2", "repetition", moves
+        if position.is_fifty_move_draw():
+            return "1/2-1/2", "fifty moves", moves
+        if len(moves) >= max_plies:
+            return "1/2-1/2", "move limit", moves
+
+        move = engines[player].search(position).best_move
+        position.make_move(move)
+        moves.append(move)
+
+
+def run_game(game, opening, a_plays_white, config_a, config_b, max_plies):
+    start = time.perf_counter()
+    white_config, black_config = (config_a, config_b) if a_plays_white else (config_b, config_a)
+    result, reason, moves = play_game(opening, white_config, black_config, max_plies)
+
+    score = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}[result]
+    return {
+        "game": game,
+        "white": "A" if a_plays_white else "B",
+        "black": "B" if a_plays_white else "A",
+        "opening": " ".join(format_move(move) for move in opening),
+        "result": result,
+        "reason": reason,
+        "score_a": score if a_plays_white else 1.0 - score,
+        "plies": len(moves),
+        "moves": " ".join(format_move(move) for move in moves),
+        "time": round(time.perf_counter() - start, 3),
+    }
+
+
+def elo_difference(scores):
+    # Elo of A over B and the 95% margin, from A's per-game scores. None
+    # where the score is 0% or 100% and the logistic model has no answer.
+    games = len(scores)
+    if not games:
+        return None, None
+    mean = sum(scores) / games
+    deviation = math.sqrt(sum((s - mean) ** 2 for s in scores) / games)
+    margin = 1.96 * deviation / math.sqrt(games)
+
+    def to_elo(p):
+        if p <= 0.0 or p >= 1.0:
+            return None
+        return -400 * math.log10(1 / p - 1)
+
+    elo = to_elo(mean)
+    low, high = to_elo(mean - margin), to_elo(mean + margin)
+    if elo is None or low is None or high is None:
+        return elo, None
+    return elo, (high - low) / 2
+
+
+def summarize(records, elapsed):
+    scores = [record["score_a"] for record in records]
+    elo, margin = elo_difference(scores)
+    return {
+        "games": len(records),
+        "wins_a": sum(1 for s in scores if s == 1.0),
+        "losses_a": sum(1 for s in scores if s == 0.0),
+        "draws": sum(1 for s in scores if s == 0.5),
+        "score_a": round(sum(scores) / len(scores), 4) if scores else None,
+        "elo": round(elo, 1) if elo is not None else None,
+        "elo_margin": round(margin, 1) if margin is not None else None,
+        "elapsed": round(elapsed, 1),
+        "games_per_hour": round(len(records) * 3600 / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play engine configurations against each other")
+    parser.add_argument("--games", type=int, default=100,
+                        help="number of games (rounded up to even)")
+    parser.add_argument("--a", default="depth=3", help="configuration A, e.g. depth=3,hash=16")
+    parser.add_argument("--b", default="depth=2", help="configuration B")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("--opening-plies", type=int, default=DEFAULT_OPENING_PLIES,
+                        help="random moves played before the engines take over")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES,
+                        help="adjudicate a draw after this many half-moves")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the opening moves")
+    parser.add_argument("--out", default="selfplay.jsonl",
+                        help="JSONL file the games are appended to")
+    args = parser.parse_args(argv)
+
+    config_a = parse_config(args.a)
+    config_b = parse_config(args.b)
+    rng = random.Random(args.seed)
+    pairs = (args.games + 1) // 2
+    workers = args.workers or os.cpu_count() or 1
+
+    print(f"A: {args.a}  B: {args.b}  games: {pairs * 2}  workers: {workers}")
+    records = []
+    start = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = []
+        for _ in range(pairs):
+            opening = random_opening(rng, args.opening_plies)
+            for a_plays_white in (True, False):
+                futures.append(pool.submit(run_game, len(futures) + 1, opening, a_plays_white,
+                                           config_a, config_b, args.max_plies))
+
+        with open(args.out, "a", encoding="utf-8") as out:
+            for future in as_completed(futures):
+                record = future.result()
+                records.append(record)
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                summary = summarize(records, time.perf_counter() - start)
+                print(f"game {record['game']:>4} {record['white']}-{record['black']} "
+                      f"{record['result']:<7} {record['reason']:<10} {record['plies']:>3} plies  "
+                      f"+{summary['wins_a']} ={summary['draws']} -{summary['losses_a']}")
+
+    summary = summarize(records, time.perf_counter() - start)
+    elo = "n/a" if summary["elo"] is None else f"{summary['elo']:+.1f}"
+    margin = "" if summary["elo_margin"] is None else f" +/- {summary['elo_margin']:.1f}"
+    print(f"Score of A vs B: +{summary['wins_a']} ={summary['draws']} -{summary['losses_a']} "
+          f"({summary['score_a']:.3f})")
+    print(f"Elo difference: {elo}{margin}")
+    print(f"{summary['games']} games in {summary['elapsed']}s "
+          f"({summary['games_per_hour']} games/hour)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
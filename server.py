@@ -0,0 +1,507 @@
+# Game server: many independent games in one process.
+#
+# An asyncio server that speaks JSON lines over TCP or a Unix socket.
+# Every game is a session holding a ChessPosition and its move list, so
+# thousands of games cost little more than their positions; nothing here
+# touches Tk or ModifiedChessGame. Engine searches run on a bounded pool of
+# worker processes, each keeping one SearchEngine (and its transposition
+# table) alive between requests.
+#
+# Each request is one JSON object per line; each reply is one line too.
+# Requests may carry an "id", which is copied into the reply, and a client
+# may send several requests without waiting (replies can then come back
+# out of order). Requests for the same game are handled one at a time.
+#   {"op": "new", "fen": ...}                    start a game ("fen" optional)
+#   {"op": "move", "game": 1, "move": "e4"}      play a move (SAN or e2e4)
+#   {"op": "go", "game": 1, "time": 0.2}         let the engine move; "time"
+#                                                is the budget in seconds,
+#                                                "nodes" and "depth" optional
+#   {"op": "state", "game": 1}
+#   {"op": "close", "game": 1}
+#   {"op": "stats"}                              load and move-latency figures
+# Replies have "ok": true and the game's state (fen, side, plies, result,
+# reason), or "ok": false and an "error". A game ends with result "1-0",
+# "0-1" or "1/2-1/2"; "*" means it is still going.
+#
+# Backpressure: at most one search per worker runs at a time and at most
+# --max-queue more wait for a worker; a "go" beyond that is refused at once
+# with the error "busy" so the client can back off. A connection has at most
+# MAX_PIPELINED requests in progress, after which the server stops reading
+# from it. A search that overruns its budget by more than SEARCH_GRACE
+# seconds is reported as "timeout" and the game is left as it was.
+#
+# Games belong to the connection that created them and are closed when it
+# disconnects.
+#
+# Usage:
+#   python server.py --port 8765 --workers 4
+#   python server.py --unix /tmp/chess.sock --time 0.1 --max-time 2
+# and load_generator.py to benchmark it.
+
+import argparse
+import asyncio
+import collections
+import json
+import math
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from board_layout import BLACK, KING, PAWN, TYPE_MASK
+from chess_rules import ChessPosition, format_move
+from engine_worker import summarize
+from fen import move_to_san, parse_fen, parse_san, to_fen
+from opening_book import OpeningBook
+from search import DEFAULT_TT_SIZE_MB, SearchEngine
+from tablebase import Tablebases
+
+DEFAULT_PORT = 8765
+DEFAULT_TIME = 0.1
+DEFAULT_MAX_TIME = 5.0
+DEFAULT_MAX_QUEUE = 256
+DEFAULT_MAX_GAMES = 10000
+MAX_PIPELINED = 64
+SEARCH_GRACE = 2.0
+LATENCY_WINDOW = 10000
+
+
+# Worker processes: one engine each, built by the pool's initializer
+_engine = None
+
+
+def _init_worker(tt_size_mb, tablebase_dir):
+    # Ctrl-C is for the server, which shuts the pool down in turn
+    global _engine
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _engine = SearchEngine(tt_size_mb=tt_size_mb,
+                           tablebases=Tablebases(tablebase_dir) if tablebase_dir else None)
+
+
+def _search(position, time_limit, node_limit, max_depth):
+    result = _engine.search(position, max_depth=max_depth, time_limit=time_limit,
+                            node_limit=node_limit)
+    return result.best_move, summarize(result)
+
+
+def _ping():
+    return os.getpid()
+
+
+class RequestError(Exception):
+    pass
+
+
+def game_status(position):
+    # (result, reason) for a finished game, ("*", None) while it goes on
+    if position.is_checkmate(position.side):
+        return ("0-1" if position.current_player == "white" else "1-0"), "checkmate"
+    if position.is_stalemate(position.side):
+        return "1/2-1/2", "stalemate"
+    if position.is_repetition():
+        return "1/2-1/2", "repetition"
+    if position.is_fifty_move_draw():
+        return "1/2-1/2", "fifty moves"
+    return "*", None
+
+
+def position_problem(position):
+    # Why a position cannot be played from, or None if it can
+    squares = position.squares
+    pieces = position.piece_squares
+    if any(sum(1 for sq in own if squares[sq] & TYPE_MASK == KING) != 1 for own in pieces):
+        return "each side needs exactly one king"
+    if any(len(own) > 16 for own in pieces):
+        return "too many pieces"
+    if any(squares[sq] & TYPE_MASK == PAWN and sq >> 4 in (0, 7) for own in pieces for sq in own):
+        return "pawn on the first or last rank"
+    if position.is_in_check(position.side ^ BLACK):
+        return "the side not to move is in check"
+    return None
+
+
+def percentile(ordered, fraction):
+    # Nearest-rank percentile of an already sorted list
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class LatencyStats:
+    # Move latencies in seconds over the last LATENCY_WINDOW moves
+    def __init__(self, window=LATENCY_WINDOW):
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        ordered = sorted(self.samples)
+
+        def ms(value):
+            return None if value is None else round(value * 1000, 1)
+
+        return {
+            "count": self.count,
+            "p50_ms": ms(percentile(ordered, 0.50)),
+            "p99_ms": ms(percentile(ordered, 0.99)),
+            "max_ms": ms(ordered[-1] if ordered else None),
+        }
+
+
+class GameSession:
+    def __init__(self, game_id, position):
+        self.id = game_id
+        self.position = position
+        self.moves = []
+        self.lock = asyncio.Lock()
+
+    def play(self, move):
+        # The move is made on a copy, so a move that fails halfway leaves
+        # the game as it was
+        position = self.position.copy()
+        position.make_move(move)
+        self.position = position
+        self.moves.append(move)
+
+    def state(self):
+        position = self.position
+        result, reason = game_status(position)
+        return {
+            "game": self.id,
+            "fen": to_fen(position),
+            "side": position.current_player,
+            "plies": len(self.moves),
+            "result": result,
+            "reason": reason,
+        }
+
+
+class GameServer:
+    def __init__(self, workers=None, tt_size_mb=DEFAULT_TT_SIZE_MB, default_time=DEFAULT_TIME,
+                 max_time=DEFAULT_MAX_TIME, max_queue=DEFAULT_MAX_QUEUE,
+                 max_games=DEFAULT_MAX_GAMES, book_path=None, tablebase_dir=None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.default_time = default_time
+        self.max_time = max_time
+        self.max_queue = max_queue
+        self.max_games = max_games
+        self.book = OpeningBook(book_path) if book_path else None
+        self.rng = random.Random()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                        mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_worker,
+                                        initargs=(tt_size_mb, tablebase_dir))
+
+        self.games = {}
+        self.next_game_id = 1
+        self.games_started = 0
+        self.slots = None
+        self.queued = 0
+        self.running = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.requests = 0
+        self.latency = LatencyStats()
+        self.start_time = time.perf_counter()
+        self.handlers = {
+            "new": self.op_new,
+            "move": self.op_move,
+            "go": self.op_go,
+            "state": self.op_state,
+            "close": self.op_close,
+            "stats": self.op_stats,
+        }
+
+    async def start(self):
+        # Spawn the workers now so the first games do not wait for them
+        self.slots = asyncio.Semaphore(self.workers)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, _ping)
+                               for _ in range(self.workers)))
+        self.start_time = time.perf_counter()
+
+    def shutdown(self):
+        # Searches still running end within their time budget
+        self.pool.shutdown(cancel_futures=True)
+        if self.book is not None:
+            self.book.close()
+
+    # Connections
+
+    async def handle_connection(self, reader, writer):
+        in_progress = asyncio.Semaphore(MAX_PIPELINED)
+        write_lock = asyncio.Lock()
+        owned = set()
+        tasks = set()
+
+        def finished(task):
+            tasks.discard(task)
+            in_progress.release()
+
+        try:
+            while True:
+                await in_progress.acquire()
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break  # Line over the stream limit, or the client went away
+                if not line:
+                    break
+                if not line.strip():
+                    in_progress.release()
+                    continue
+                task = asyncio.create_task(self.respond(line, writer, write_lock, owned))
+                tasks.add(task)
+                task.add_done_callback(finished)
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            for game_id in owned:
+                self.games.pop(game_id, None)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def respond(self, line, writer, write_lock, owned):
+        self.requests += 1
+        request = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise RequestError("request must be a JSON object")
+            handler = self.handlers.get(request.get("op"))
+            if handler is None:
+                raise RequestError(f"unknown op {request.get('op')!r}")
+            reply = {"ok": True}
+            reply.update(await handler(request, owned))
+        except (RequestError, TypeError, ValueError) as error:
+            reply = {"ok": False, "error": str(error)}
+        except Exception as error:
+            # Every request gets a reply, or the client waits for it forever
+            reply = {"ok": False, "error": f"internal error: {type(error).__name__}: {error}"}
+        if isinstance(request, dict) and "id" in request:
+            reply["id"] = request["id"]
+
+        async with write_lock:
+            try:
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+    def session(self, request, owned):
+        game_id = request.get("game")
+        if game_id not in owned or game_id not in self.games:
+            raise RequestError(f"no game {game_id!r}")
+        return self.games[game_id]
+
+    # Requests
+
+    async def op_new(self, request, owned):
+        if len(self.games) >= self.max_games:
+            raise RequestError("too many games")
+        fen = request.get("fen")
+        if fen is not None and not isinstance(fen, str):
+            raise RequestError("fen must be a string")
+        position = parse_fen(fen) if fen else ChessPosition()
+        problem = position_problem(position)
+        if problem:
+            raise RequestError(f"bad position: {problem}")
+        game = GameSession(self.next_game_id, position)
+        self.next_game_id += 1
+        self.games_started += 1
+        self.games[game.id] = game
+        owned.add(game.id)
+        return game.state()
+
+    async def op_move(self, request, owned):
+        game = self.session(request, owned)
+        async with game.lock:
+            position = game.position
+            if game_status(position)[0] != "*":
+                raise RequestError("game over")
+            text = request.get("move")
+            if not isinstance(text, str) or not text.strip():
+                raise RequestError("move needs a move, e.g. \"e4\" or \"e2e4\"")
+            move = parse_san(position, text)
+            san = move_to_san(position, move)
+            game.play(move)
+            reply = {"move": format_move(move), "san": san}
+            reply.update(game.state())
+            return reply
+
+    async def op_go(self, request, owned):
+        start = time.perf_counter()
+        game = self.session(request, owned)
+        budget = min(float(request.get("time", self.default_time)), self.max_time)
+        if not budget > 0:
+            raise RequestError("time must be positive")
+        node_limit = int(request["nodes"]) if request.get("nodes") else None
+        max_depth = int(request["depth"]) if request.get("depth") else None
+
+        async with game.lock:
+            position = game.position
+            if game_status(position)[0] != "*":
+                raise RequestError("game over")
+
+            move = self.book.choose(position, self.rng) if self.book is not None else None
+            if move is not None:
+                info = {"book": True}
+            else:
+                move, info = await self.search(position.copy(), budget, node_limit, max_depth)
+                if move is None:
+                    raise RequestError("search returned no move")
+
+            san = move_to_san(position, move)
+            game.play(move)
+            latency = time.perf_counter() - start
+            self.latency.add(latency)
+            reply = {"move": format_move(move), "san": san, "latency_ms": round(latency * 1000, 1)}
+            reply.update(info)
+            reply.update(game.state())
+            return reply
+
+    async def search(self, position, budget, node_limit, max_depth):
+        # Wait for a free worker, or refuse when too many searches already do
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise RequestError("busy")
+        self.queued += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.queued -= 1
+
+        # The worker stays taken until the search really ends, even if it
+        # is given up on below
+        self.running += 1
+
+        def release(_):
+            self.running -= 1
+            self.slots.release()
+
+        future = asyncio.get_running_loop().run_in_executor(
+            self.pool, _search, position, budget, node_limit, max_depth)
+        future.add_done_callback(release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), budget + SEARCH_GRACE)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise RequestError("timeout")
+
+    async def op_state(self, request, owned):
+        game = self.session(request, owned)
+        reply = game.state()
+        reply["moves"] = " ".join(format_move(move) for move in game.moves)
+        return reply
+
+    async def op_close(self, request, owned):
+        game = self.session(request, owned)
+        owned.discard(game.id)
+        del self.games[game.id]
+        return {"game": game.id, "closed": True}
+
+    async def op_stats(self, request, owned):
+        return {"stats": self.stats()}
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.start_time
+        latency = self.latency.summary()
+        return {
+            "games": len(self.games),
+            "games_started": self.games_started,
+            "requests": self.requests,
+            "workers": self.workers,
+            "searching": self.running,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "moves_per_sec": round(latency["count"] / elapsed, 1) if elapsed else 0.0,
+            "latency": latency,
+            "uptime": round(elapsed, 1),
+        }
+
+
+def format_stats(stats):
+    latency = stats["latency"]
+    return (f"games {stats['games']} ({stats['games_started']} started)  "
+            f"moves {latency['count']} ({stats['moves_per_sec']}/s)  "
+            f"p50 {latency['p50_ms']} ms  p99 {latency['p99_ms']} ms  "
+            f"searching {stats['searching']}  queued {stats['queued']}  "
+            f"busy {stats['rejected']}  timeouts {stats['timeouts']}")
+
+
+async def report(server, interval):
+    while True:
+        await asyncio.sleep(interval)
+        print(format_stats(server.stats()), flush=True)
+
+
+async def serve(args):
+    server = GameServer(args.workers, args.hash, args.time, args.max_time, args.max_queue,
+                        args.max_games, args.book, args.tablebases)
+    reporter = None
+    try:
+        await server.start()
+        if args.unix:
+            if os.path.exists(args.unix):
+                os.unlink(args.unix)
+            listener = await asyncio.start_unix_server(server.handle_connection, path=args.unix)
+            where = args.unix
+        else:
+            listener = await asyncio.start_server(server.handle_connection, args.host, args.port)
+            where = f"{args.host}:{args.port}"
+        print(f"Serving on {where} with {server.workers} workers", flush=True)
+        if args.report:
+            reporter = asyncio.create_task(report(server, args.report))
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+        print(format_stats(server.stats()), flush=True)
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
+        server.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve many Modified Chess games over JSON lines")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port")
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="search processes (default: CPU count)")
+    parser.add_argument("--hash", type=int, default=DEFAULT_TT_SIZE_MB,
+                        help="transposition table size per worker in MB")
+    parser.add_argument("--time", type=float, default=DEFAULT_TIME,
+                        help="search time per move when a request gives none")
+    parser.add_argument("--max-time", type=float, default=DEFAULT_MAX_TIME,
+                        help="upper bound on any request's search time")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE,
+                        help="searches allowed to wait for a worker before refusing more")
+    parser.add_argument("--max-games", type=int, default=DEFAULT_MAX_GAMES,
+                        help="open games allowed at once")
+    parser.add_argument("--book", help="opening book to play from before searching")
+    parser.add_argument("--tablebases", help="directory of endgame tablebases to probe")
+    parser.add_argument("--report", type=float, default=0,
+                        help="print load and latency figures every this many seconds")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,750 @@
+# Endgame tablebases for Modified Chess.
+#
+# Published tablebases are of no use here: the 'B' moves like a queen, so
+# KBK is really KQK and every table with a bishop in it is different. This
+# module builds its own by retrograde analysis for the endgames of up to
+# four pieces, moving the pieces with ChessPosition's own move generator
+# so the tables follow exactly the rules the engine plays by. Pawns may
+# belong to one side only (KPvK, KQvKP, KPPvK, ...): with pawns on both
+# sides en passant would matter, and the tables do not model it.
+#
+# A table covers one material balance, named like "KQvKR" (the stronger
+# side first; a position with the material the other way round is looked
+# up with the colours swapped and the board turned upside down). Positions
+# are indexed by the squares of the white king, the black king and then
+# the other pieces. Pawnless positions look the same under the board's 8
+# reflections and rotations, so the white king is always moved into the
+# a8-d8-d5 triangle first, and only 10 * 64^(pieces - 1) positions per
+# side to move are stored. Pawns only allow the left-right reflection, so
+# tables with pawns keep the white king on files a-d: 32 * 64^(pieces - 1)
+# positions.
+#
+# Captures and promotions both change the material. Their results come
+# from the smaller tables, or for a promotion the tables with the new
+# piece, which are generated first.
+#
+# Every table is written as two files in the tablebases directory:
+#   NAME.dtm  one byte per position: 0 draw, 1-127 win in that many moves,
+#             128 + n loss in n moves (128 = checkmated), 255 impossible
+#   NAME.wdl  two bits per position: 0 draw, 1 win, 2 loss
+# each starting with an 8-byte magic, white to move before black to move.
+# Both are read through mmap. The search probes the small WDL file at
+# every node with four pieces or fewer, and the DTM file at the root to
+# play the fastest win (or slowest loss).
+#
+# Usage:
+#   python tablebase.py generate KQvK KBvKR KPvK
+#   python tablebase.py generate --pieces 4      (every table, ~60 files; slow)
+#   python tablebase.py probe --fen "8/8/8/4k3/8/8/8/KB6 w - - 0 1"
+
+import argparse
+import mmap
+import os
+import sys
+import time
+
+from board_layout import (BISHOP, BLACK, EMPTY, KING, KNIGHT, OFF_BOARD, PAWN, PIECE_CODES,
+                          PIECE_LETTERS, PROMOTION_PIECES, QUEEN, QUEEN_STEPS, ROOK, SQUARE_INDEX,
+                          SQUARES, TYPE_MASK, WHITE)
+from chess_rules import ChessPosition, format_move
+
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+
+DTM_MAGIC = b"MCTBDTM1"
+WDL_MAGIC = b"MCTBWDL1"
+MAX_PIECES = 4
+
+# WDL values, from the side to move's point of view
+DRAW, WIN, LOSS = 0, 1, 2
+
+# DTM bytes (see above)
+LOSS_BASE = 128
+INVALID = 255
+NO_CAPTURE = 255
+
+# Non-king pieces in table names, strongest first (the bishop moves like
+# a queen)
+TABLE_PIECES = (QUEEN, BISHOP, ROOK, KNIGHT, PAWN)
+PIECE_RANK = {KING: 0, QUEEN: 1, BISHOP: 2, ROOK: 3, KNIGHT: 4, PAWN: 5}
+
+
+def _transformed(t, index):
+    # Square index (0-63) under reflection/rotation t: transpose, then flip
+    row, col = index >> 3, index & 7
+    if t & 4:
+        row, col = col, row
+    if t & 2:
+        row = 7 - row
+    if t & 1:
+        col = 7 - col
+    return row * 8 + col
+
+
+TRANSFORMS = [[_transformed(t, index) for index in range(64)] for t in range(8)]
+
+# The a8-d8-d5 triangle the white king is moved into
+TRIANGLE = [index for index in range(64) if index >> 3 <= 3 and index >> 3 <= (index & 7) <= 3]
+TRIANGLE_INDEX = {index: n for n, index in enumerate(TRIANGLE)}
+
+# Transforms taking a white king square into the triangle: one, or two for
+# squares on a long diagonal
+KING_TRANSFORMS = [[TRANSFORMS[t] for t in range(8) if TRANSFORMS[t][index] in TRIANGLE_INDEX]
+                   for index in range(64)]
+
+# With pawns: files a-d for the white king, and the left-right reflection
+# that takes it there
+HALF = [index for index in range(64) if index & 7 <= 3]
+HALF_INDEX = {index: n for n, index in enumerate(HALF)}
+PAWN_KING_TRANSFORMS = [[TRANSFORMS[0 if index & 7 <= 3 else 1]] for index in range(64)]
+
+
+def _reach_tables():
+    # Squares each piece code attacks from each square of an empty board,
+    # taken from ChessPosition's move generator (pawns capture diagonally
+    # forward), and the squares that have to be empty between a square and
+    # every square along a line from it
+    board = ChessPosition.__new__(ChessPosition)
+    board._set_up(bytearray(128), WHITE)
+    reach = {}
+    for piece in (KING, QUEEN, BISHOP, ROOK, KNIGHT):
+        reach[piece] = reach[piece | BLACK] = [frozenset()] * 128
+        for sq in SQUARES:
+            board.squares[sq] = piece
+            reach[piece][sq] = frozenset(board.get_pseudo_legal_moves(sq))
+            board.squares[sq] = EMPTY
+    for side in (WHITE, BLACK):
+        forward = -16 if side == WHITE else 16
+        reach[PAWN | side] = [frozenset(to for to in (sq + forward - 1, sq + forward + 1)
+                                        if not to & OFF_BOARD) for sq in range(128)]
+
+    between = [{} for _ in range(128)]
+    for sq in SQUARES:
+        for step in QUEEN_STEPS:
+            path = []
+            to = sq + step
+            while not to & OFF_BOARD:
+                between[sq][to] = tuple(path)
+                path.append(to)
+                to += step
+    return reach, between
+
+
+REACH, BETWEEN = _reach_tables()
+
+
+def win_byte(plies):
+    return (plies + 1) // 2
+
+
+def loss_byte(plies):
+    return LOSS_BASE + plies // 2
+
+
+def dtm_plies(value):
+    # Half-moves to mate of a win or loss DTM byte
+    return 2 * value - 1 if value < LOSS_BASE else 2 * (value - LOSS_BASE)
+
+
+def from_child(value):
+    # DTM byte of a position, given the byte of the position a move leads to
+    if value == INVALID or not value:
+        return value
+    if value < LOSS_BASE:
+        return LOSS_BASE + value  # The opponent wins in n moves: lost in n
+    return value - LOSS_BASE + 1  # The opponent is lost in n: win in n + 1
+
+
+def dtm_rank(value):
+    # Sort key for DTM bytes from the side to move's view: the fastest win
+    # is best, then draws, then the slowest loss
+    if not value:
+        return (1, 0)
+    if value < LOSS_BASE:
+        return (2, -value)
+    return (0, value)
+
+
+def material_name(white_types, black_types):
+    return ("K" + "".join(PIECE_LETTERS[t] for t in white_types)
+            + "vK" + "".join(PIECE_LETTERS[t] for t in black_types))
+
+
+def _strength(types):
+    # More pieces first, then stronger ones; types are strongest first
+    return len(types), [-PIECE_RANK[t] for t in types]
+
+
+def canonical(codes, indices, side):
+    # Table name, slot-ordered square indices (0-63) and side to move of a
+    # position given as parallel lists of piece codes and squares. The side
+    # with more (or stronger) pieces becomes White, and the board is turned
+    # upside down with it so that pawns keep their direction.
+    white = sorted((code for code in codes if not code & BLACK and code != KING),
+                   key=PIECE_RANK.get)
+    black = sorted((code & TYPE_MASK for code in codes if code & BLACK and code != KING | BLACK),
+                   key=PIECE_RANK.get)
+    if _strength(black) > _strength(white):
+        codes = [code ^ BLACK for code in codes]
+        indices = [index ^ 56 for index in indices]
+        side ^= BLACK
+        white, black = black, white
+
+    # Slots: white king, black king, white pieces, black pieces; strongest first
+    slots = sorted(zip(codes, indices), key=lambda item: (
+        item[0] & TYPE_MASK != KING, item[0] & BLACK, PIECE_RANK[item[0] & TYPE_MASK]))
+    return material_name(white, black), [index for _, index in slots], side
+
+
+class Material:
+    # Layout of one table: the pieces in slot order and the position index
+    def __init__(self, name):
+        white, _, black = name.partition("v")
+        if not white.startswith("K") or not black.startswith("K") or len(name) - 1 > MAX_PIECES:
+            raise ValueError(f"Not a table name: {name!r}")
+        try:
+            white_types = [PIECE_CODES[letter] for letter in white[1:]]
+            black_types = [PIECE_CODES[letter] for letter in black[1:]]
+        except KeyError:
+            raise ValueError(f"Not a table name: {name!r}") from None
+        if any(t not in TABLE_PIECES for t in white_types + black_types):
+            raise ValueError(f"Not a table name: {name!r}")
+        if PAWN in white_types and PAWN in black_types:
+            raise ValueError(f"Tables with pawns on both sides need en passant: {name!r}")
+
+        self.white_types = sorted(white_types, key=PIECE_RANK.get)
+        self.black_types = sorted(black_types, key=PIECE_RANK.get)
+        self.name = material_name(self.white_types, self.black_types)
+        if self.name != name or canonical(*self.example())[0] != name:
+            raise ValueError(f"Table {name!r} is stored as {canonical(*self.example())[0]!r}")
+
+        self.codes = ([KING, KING | BLACK] + self.white_types
+                      + [t | BLACK for t in self.black_types])
+        self.count = len(self.codes)
+        self.pawn_slots = [slot for slot, code in enumerate(self.codes)
+                           if code & TYPE_MASK == PAWN]
+        if self.pawn_slots:
+            self.king_squares, self.king_index = HALF, HALF_INDEX
+            self.king_transforms = PAWN_KING_TRANSFORMS
+        else:
+            self.king_squares, self.king_index = TRIANGLE, TRIANGLE_INDEX
+            self.king_transforms = KING_TRANSFORMS
+        self.size = len(self.king_squares) * 64 ** (self.count - 1)
+        # Slot ranges holding identical pieces, whose squares are kept sorted
+        self.groups = []
+        start = 2
+        while start < self.count:
+            end = start + 1
+            while end < self.count and self.codes[end] == self.codes[start]:
+                end += 1
+            if end - start > 1:
+                self.groups.append((start, end))
+            start = end
+
+    def example(self):
+        codes = [KING, KING | BLACK] + self.white_types + [t | BLACK for t in self.black_types]
+        return codes, list(range(len(codes))), WHITE
+
+    def subtables(self):
+        # Names of the tables a capture, a promotion or a capture that
+        # promotes leads to (a bare "KvK" is a draw)
+        outcomes = []
+        for slot in range(2, self.count):
+            outcomes.append(self.codes[:slot] + self.codes[slot + 1:])
+        for pawn in self.pawn_slots:
+            side = self.codes[pawn] & BLACK
+            for piece in PROMOTION_PIECES:
+                codes = list(self.codes)
+                codes[pawn] = piece | side
+                outcomes.append(codes)
+                outcomes.extend(codes[:slot] + codes[slot + 1:] for slot in range(2, self.count)
+                                if codes[slot] & BLACK != side)
+        names = set()
+        for codes in outcomes:
+            if len(codes) > 2:
+                names.add(canonical(codes, list(range(len(codes))), WHITE)[0])
+        return sorted(names, key=len)
+
+    def index(self, indices):
+        # Position index of slot-ordered squares; the smallest over the
+        # transforms that put the white king in the triangle, so that equal
+        # positions always share one index
+        best = None
+        for transform in self.king_transforms[indices[0]]:
+            mapped = [transform[index] for index in indices]
+            for start, end in self.groups:
+                mapped[start:end] = sorted(mapped[start:end])
+            number = self.king_index[mapped[0]]
+            for index in mapped[1:]:
+                number = number * 64 + index
+            if best is None or number < best:
+                best = number
+        return best
+
+    def squares(self, number):
+        # Inverse of index: slot-ordered squares (0-63)
+        indices = []
+        for _ in range(self.count - 1):
+            indices.append(number & 63)
+            number >>= 6
+        indices.append(self.king_squares[number])
+        indices.reverse()
+        return indices
+
+
+class Tablebases:
+    # Read access to the tables in a directory. Tables are opened (mapped)
+    # the first time a position needs them.
+    def __init__(self, directory=TABLEBASE_DIR):
+        self.directory = directory
+        self.tables = {}
+        self.scan()
+
+    def scan(self):
+        # Pick up tables written since the directory was last looked at
+        self.available = set()
+        if os.path.isdir(self.directory):
+            for filename in os.listdir(self.directory):
+                name, extension = os.path.splitext(filename)
+                if (extension == ".wdl"
+                        and os.path.exists(os.path.join(self.directory, name + ".dtm"))):
+                    self.available.add(name)
+        self.max_pieces = max((len(name) - 1 for name in self.available), default=0)
+
+    def close(self):
+        for _, files in self.tables.values():
+            for handle, data in files:
+                data.close()
+                handle.close()
+        self.tables = {}
+
+    def _table(self, name):
+        table = self.tables.get(name)
+        if table is None and name in self.available:
+            files = []
+            for extension, magic in ((".wdl", WDL_MAGIC), (".dtm", DTM_MAGIC)):
+                handle = open(os.path.join(self.directory, name + extension), "rb")
+                data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+                if data[:len(magic)] != magic:
+                    raise ValueError(f"{handle.name} is not a tablebase file")
+                files.append((handle, data))
+            table = self.tables[name] = (Material(name), files)
+        return table
+
+    def _locate(self, codes, indices, side):
+        # (table files, entry number) of a position, or None without a table
+        name, indices, side = canonical(codes, indices, side)
+        table = self._table(name)
+        if table is None:
+            return None
+        material, files = table
+        return files, (side >> 3) * material.size + material.index(indices)
+
+    def probe_pieces(self, codes, indices, side):
+        # DTM byte of a position given as piece codes and squares
+        # (0-63); None if there is no table for it
+        if len(codes) == 2:
+            return 0  # Bare kings
+        location = self._locate(codes, indices, side)
+        if location is None:
+            return None
+        files, entry = location
+        return files[1][1][len(DTM_MAGIC) + entry]
+
+    def _pieces(self, position):
+        # The tables know nothing of castling or en passant, so positions
+        # that still allow either are searched instead
+        if (len(position.piece_squares[0]) + len(position.piece_squares[1]) > self.max_pieces
+                or position.castling or position.ep_square is not None):
+            return None
+        squares = position.squares
+        codes = []
+        indices = []
+        for sq in position.piece_squares[0] | position.piece_squares[1]:
+            codes.append(squares[sq])
+            indices.append(SQUARE_INDEX[sq])
+        return codes, indices, position.side
+
+    def probe_wdl(self, position):
+        # WIN, DRAW or LOSS for the side to move, or None
+        pieces = self._pieces(position)
+        if pieces is None:
+            return None
+        if len(pieces[0]) == 2:
+            return DRAW
+        location = self._locate(*pieces)
+        if location is None:
+            return None
+        files, entry = location
+        return files[0][1][len(WDL_MAGIC) + (entry >> 2)] >> (entry & 3) * 2 & 3
+
+    def probe_dtm(self, position):
+        pieces = self._pieces(position)
+        return None if pieces is None else self.probe_pieces(*pieces)
+
+    def best_move(self, position):
+        # (move, DTM byte of the position) for the move that wins fastest or
+        # loses slowest, or None if the position is not in the tables
+        if self.probe_dtm(position) is None:
+            return None
+        best = None
+        for move in position.legal_moves():
+            position.make_move(move)
+            value = self.probe_dtm(position)
+            position.unmake_move()
+            if value is None:
+                return None
+            value = from_child(value)
+            if best is None or dtm_rank(value) > dtm_rank(best[1]):
+                best = (move, value)
+        return best
+
+
+class Generator:
+    # Retrograde analysis of one table. Positions are solved in order of
+    # distance to mate: checkmates first, then each position one move away
+    # from a loss is a win, and a position whose every move leads to a win
+    # for the opponent is a loss. Captures and promotions leave the table;
+    # their results come from other tables, which must exist already.
+    def __init__(self, material, tablebases):
+        self.material = material
+        self.tablebases = tablebases
+        self.board = ChessPosition.__new__(ChessPosition)
+        self.board._set_up(bytearray(128), WHITE)
+        size = material.size
+        self.values = [bytearray(size), bytearray(size)]
+        # Best result (DTM byte) a capture or promotion gives the side to move
+        self.captures = [bytearray([NO_CAPTURE]) * size, bytearray([NO_CAPTURE]) * size]
+
+    def place(self, indices):
+        squares = self.board.squares
+        placed = [SQUARES[index] for index in indices]
+        for code, sq in zip(self.material.codes, placed):
+            squares[sq] = code
+        return placed
+
+    def clear(self, placed):
+        squares = self.board.squares
+        for sq in placed:
+            squares[sq] = EMPTY
+
+    def attacked(self, target, placed, by_side, captured=None):
+        # Whether a piece of by_side (other than the one on captured) attacks
+        # target. With at most three attackers, testing each of them is much
+        # quicker than ChessPosition.is_square_attacked's scan of every ray.
+        squares = self.board.squares
+        for code, sq in zip(self.material.codes, placed):
+            if (code & BLACK == by_side and sq != captured
+                    and target in REACH[code][sq]
+                    and not any(squares[step] for step in BETWEEN[sq].get(target, ()))):
+                return True
+        return False
+
+    def legal_moves(self, placed, side):
+        # (slot, destination, captured slot or None, promotion piece or 0)
+        # of every legal move
+        board = self.board
+        squares = board.squares
+        codes = self.material.codes
+        king = placed[side >> 3]
+        moves = []
+        for slot, sq in enumerate(placed):
+            code = codes[slot]
+            if code & BLACK != side:
+                continue
+            for to in board.get_pseudo_legal_moves(sq):
+                victim = squares[to]
+                squares[to] = code
+                squares[sq] = EMPTY
+                target = to if slot == side >> 3 else king
+                legal = not self.attacked(target, placed, side ^ BLACK, to)
+                squares[sq] = code
+                squares[to] = victim
+                if not legal:
+                    continue
+                captured = placed.index(to) if victim else None
+                if code & TYPE_MASK == PAWN and to >> 4 in (0, 7):
+                    moves.extend((slot, to, captured, piece) for piece in PROMOTION_PIECES)
+                else:
+                    moves.append((slot, to, captured, 0))
+        return moves
+
+    def moved(self, indices, slot, to):
+        indices = list(indices)
+        indices[slot] = SQUARE_INDEX[to]
+        return indices
+
+    def initialize(self):
+        # Marks impossible positions and checkmates, and records what the
+        # captures of every position lead to. Returns the checkmates and the
+        # results that captures settle, by distance in plies.
+        material = self.material
+        codes = material.codes
+        frontier = []
+        scheduled = {}
+        for number in range(material.size):
+            indices = material.squares(number)
+            if (len(set(indices)) < material.count or material.index(indices) != number
+                    or any(indices[slot] >> 3 in (0, 7) for slot in material.pawn_slots)):
+                self.values[0][number] = self.values[1][number] = INVALID
+                continue
+
+            placed = self.place(indices)
+            for side in (WHITE, BLACK):
+                values = self.values[side >> 3]
+                if self.attacked(placed[(side >> 3) ^ 1], placed, side):
+                    values[number] = INVALID  # The side not to move is in check
+                    continue
+
+                moves = self.legal_moves(placed, side)
+                best = NO_CAPTURE
+                conversions = 0
+                for slot, to, captured, promotion in moves:
+                    if captured is None and not promotion:
+                        continue
+                    conversions += 1
+                    child = self.moved(indices, slot, to)
+                    child_codes = list(codes)
+                    if promotion:
+                        child_codes[slot] = promotion | side
+                    if captured is not None:
+                        del child[captured]
+                        del child_codes[captured]
+                    value = from_child(self.tablebases.probe_pieces(child_codes, child,
+                                                                    side ^ BLACK))
+                    if best == NO_CAPTURE or dtm_rank(value) > dtm_rank(best):
+                        best = value
+                self.captures[side >> 3][number] = best
+
+                entry = (side >> 3) * material.size + number
+                if not moves:
+                    if self.attacked(placed[side >> 3], placed, side ^ BLACK):
+                        values[number] = LOSS_BASE  # Checkmated
+                        frontier.append(entry)
+                    # Otherwise stalemate, which stays a draw
+                elif best != NO_CAPTURE and best and (best < LOSS_BASE
+                                                      or len(moves) == conversions):
+                    # A winning capture or promotion, or only those and all
+                    # of them lose
+                    scheduled.setdefault(dtm_plies(best), []).append(entry)
+            self.clear(placed)
+        return frontier, scheduled
+
+    def pawn_origins(self, sq, side):
+        # Squares a pawn of side on sq can have come from without capturing:
+        # one step back, or two back to its starting row
+        squares = self.board.squares
+        back = 16 if side == WHITE else -16
+        origin = sq + back
+        if squares[origin] or origin >> 4 == (7 if side == WHITE else 0):
+            return []
+        if sq >> 4 == (4 if side == WHITE else 3) and not squares[origin + back]:
+            return [origin, origin + back]
+        return [origin]
+
+    def predecessors(self, side, number):
+        # Position numbers, with the other side to move, from which the side
+        # that just moved reached this position without a capture or
+        # promotion
+        material = self.material
+        board = self.board
+        squares = board.squares
+        codes = material.codes
+        mover = side ^ BLACK
+        indices = material.squares(number)
+        placed = self.place(indices)
+        king = placed[side >> 3]
+        numbers = []
+        for slot, sq in enumerate(placed):
+            code = codes[slot]
+            if code & BLACK != mover:
+                continue
+            if code & TYPE_MASK == PAWN:
+                origins = self.pawn_origins(sq, mover)
+            else:
+                # Pieces move the same way in both directions
+                origins = board.get_pseudo_legal_moves(sq)
+            for origin in origins:
+                if squares[origin]:
+                    continue
+                squares[origin] = code
+                squares[sq] = EMPTY
+                placed[slot] = origin
+                if not self.attacked(king, placed, mover):
+                    numbers.append(material.index(self.moved(indices, slot, origin)))
+                placed[slot] = sq
+                squares[sq] = code
+                squares[origin] = EMPTY
+        self.clear(placed)
+        return numbers
+
+    def loss_plies(self, side, number):
+        # Plies to mate if every move from the position leads to a win for
+        # the opponent that is already known, else None
+        best_capture = self.captures[side >> 3][number]
+        if best_capture != NO_CAPTURE and best_capture < LOSS_BASE:
+            return None  # A capture or promotion draws or wins
+        plies = dtm_plies(best_capture) if best_capture != NO_CAPTURE else 0
+
+        material = self.material
+        indices = material.squares(number)
+        placed = self.place(indices)
+        moves = self.legal_moves(placed, side)
+        self.clear(placed)
+        values = self.values[(side >> 3) ^ 1]
+        for slot, to, captured, promotion in moves:
+            if captured is not None or promotion:
+                continue
+            value = values[material.index(self.moved(indices, slot, to))]
+            if not value or value >= LOSS_BASE:
+                return None
+            plies = max(plies, dtm_plies(value) + 1)
+        return plies
+
+    def solve(self, log=None):
+        material = self.material
+        size = material.size
+        frontier, scheduled = self.initialize()
+        ply = 0
+        while frontier or scheduled:
+            if log:
+                log(f"  {material.name}: {len(frontier)} positions {ply} plies from mate")
+            next_frontier = []
+            for entry in frontier:
+                side, number = divmod(entry, size)
+                side <<= 3
+                lost = self.values[side >> 3][number] >= LOSS_BASE
+                values = self.values[(side >> 3) ^ 1]
+                for parent in self.predecessors(side, number):
+                    if values[parent]:
+                        continue
+                    parent_entry = ((side >> 3) ^ 1) * size + parent
+                    if lost:
+                        values[parent] = win_byte(ply + 1)
+                        next_frontier.append(parent_entry)
+                        continue
+                    plies = self.loss_plies(side ^ BLACK, parent)
+                    if plies == ply + 1:
+                        values[parent] = loss_byte(plies)
+                        next_frontier.append(parent_entry)
+                    elif plies is not None:
+                        scheduled.setdefault(plies, []).append(parent_entry)
+
+            ply += 1
+            for entry in scheduled.pop(ply, ()):
+                side, number = divmod(entry, size)
+                values = self.values[side]
+                if not values[number]:
+                    values[number] = win_byte(ply) if ply & 1 else loss_byte(ply)
+                    next_frontier.append(entry)
+            frontier = next_frontier
+            if ply > 2 * (LOSS_BASE - 2):
+                raise ValueError(f"{material.name} has mates too long for the DTM format")
+
+    def write(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        values = self.values[0] + self.values[1]
+        # 0 (draw) and 255 (impossible) read as draws; wins 1, losses 2
+        wdl_codes = values.translate(bytes(
+            DRAW if value in (0, INVALID) else WIN if value < LOSS_BASE else LOSS
+            for value in range(256)))
+        wdl_codes += bytes(-len(wdl_codes) % 4)
+        packed = bytes(a | b << 2 | c << 4 | d << 6 for a, b, c, d in zip(
+            wdl_codes[0::4], wdl_codes[1::4], wdl_codes[2::4], wdl_codes[3::4]))
+
+        base = os.path.join(directory, self.material.name)
+        # The WDL file goes last: a table counts as present once it exists
+        with open(base + ".dtm", "wb") as handle:
+            handle.write(DTM_MAGIC)
+            handle.write(values)
+        with open(base + ".wdl", "wb") as handle:
+            handle.write(WDL_MAGIC)
+            handle.write(packed)
+
+
+def generate(name, directory=TABLEBASE_DIR, tablebases=None, log=print):
+    # Writes the table and any smaller table it depends on that is missing
+    material = Material(name)
+    tablebases = tablebases or Tablebases(directory)
+    for subtable in material.subtables():
+        if subtable not in tablebases.available:
+            generate(subtable, directory, tablebases, log)
+
+    start = time.perf_counter()
+    if log:
+        log(f"Generating {name} ({2 * material.size} positions)")
+    generator = Generator(material, tablebases)
+    generator.solve(log)
+    generator.write(directory)
+    tablebases.scan()
+    if log:
+        values = generator.values[0] + generator.values[1]
+        wins = sum(1 for value in values if 0 < value < LOSS_BASE)
+        losses = sum(1 for value in values if LOSS_BASE <= value < INVALID)
+        longest = max((value for value in values if 0 < value < LOSS_BASE), default=0)
+        log(f"{name}: {wins} wins, {losses} losses, longest mate {longest} moves, "
+            f"{time.perf_counter() - start:.1f}s")
+
+
+def table_names(pieces):
+    # Every table of up to the given number of pieces, smallest first
+    names = []
+    for types in TABLE_PIECES:
+        names.append(material_name([types], []))
+    if pieces >= 4:
+        for i, first in enumerate(TABLE_PIECES):
+            for second in TABLE_PIECES[i:]:
+                names.append(material_name([first, second], []))
+                if first != PAWN or second != PAWN:
+                    names.append(material_name([first], [second]))
+    return names
+
+
+def main(argv=None):
+    from fen import parse_fen
+
+    parser = argparse.ArgumentParser(description="Generate or probe endgame tablebases")
+    parser.add_argument("--dir", default=TABLEBASE_DIR, help="tablebase directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser("generate", help="generate tables")
+    generate_parser.add_argument("names", nargs="*", help="tables such as KQvK or KBvKR")
+    generate_parser.add_argument("--pieces", type=int, choices=(3, 4), default=None,
+                                 help="generate every table with up to this many pieces")
+
+    probe_parser = commands.add_parser("probe", help="look up a position")
+    probe_parser.add_argument("--fen", required=True)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        names = args.names + (table_names(args.pieces) if args.pieces else [])
+        if not names:
+            parser.error("name the tables to generate or give --pieces")
+        tablebases = Tablebases(args.dir)
+        for name in names:
+            if name not in tablebases.available:
+                generate(name, args.dir, tablebases)
+        return 0
+
+    tablebases = Tablebases(args.dir)
+    position = parse_fen(args.fen)
+    best = tablebases.best_move(position)
+    if best is None:
+        value = tablebases.probe_dtm(position)
+        if value is None:
+            print("Position not in the tablebases")
+        else:
+            print("No legal moves")
+        return 0
+    move, value = best
+    if not value:
+        print(f"Draw  ({format_move(move)})")
+    elif value < LOSS_BASE:
+        print(f"Win in {value}  best move {format_move(move)}")
+    else:
+        print(f"Loss in {value - LOSS_BASE}  best move {format_move(move)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
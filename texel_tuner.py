@@ -0,0 +1,337 @@
+# Texel-style tuning of the evaluation weights from game results.
+#
+# Tuning runs in two steps. Both stream their input, so the data may be
+# larger than memory.
+#
+# extract  replays games (selfplay.py JSONL or move-list files, read as for
+#          opening_book.py) and appends their quiet positions to a data
+#          file of fixed-size records: the 64 piece codes of batch_eval.py
+#          and the game's result (0 Black won, 1 draw, 2 White won). A
+#          position is quiet when the side to move is not in check and has
+#          neither a promotion nor a capture that wins material by static
+#          exchange; in any other position the static evaluation is about
+#          to change. The first --skip-plies half-moves of a game and games
+#          without a result are left out.
+#
+# tune     fits the material values and piece-square tables to the
+#          results. A position's evaluation e (centipawns, White's view)
+#          predicts White's score as 1 / (1 + 10 ** (-K * e / 400)), and
+#          the tuner minimises the mean squared error of that prediction.
+#          K is fitted first, on a sample scored with the current weights.
+#          The weights are then trained with Adam on minibatches read
+#          through a memory map, in a new random order every epoch. A
+#          minibatch's evaluations and gradient are computed for all of
+#          its positions at once with NumPy.
+#
+# tune writes a parameter file, which evaluation.py loads at startup when
+# it is named eval_params.json and sits next to it, or is named by the
+# MODIFIED_CHESS_EVAL environment variable. Tuning starts from the weights
+# in use, so a run can continue from an earlier one. The king's material
+# value cancels out (each side always has one) and is left as it is.
+#
+# Adding a constant to every square of a piece-square table changes the
+# evaluation just as adding it to the piece's value does, so the split
+# between the two is not set by the data. The tuner fixes it by keeping
+# every table at zero mean over the squares its piece can stand on: a
+# tuned piece value is the piece's worth on an average square.
+#
+# Usage:
+#   python texel_tuner.py extract positions.bin --selfplay selfplay.jsonl
+#   python texel_tuner.py tune positions.bin --epochs 20 --out eval_params.json
+
+import argparse
+import json
+import math
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError("texel_tuner.py needs NumPy: pip install numpy") from error
+
+from batch_eval import evaluate_batch
+from board_layout import PIECE_CODES
+from chess_rules import ChessPosition
+from evaluation import CENTIPAWNS, PIECE_SQUARE_TABLES, PIECE_VALUES
+from exchange import static_exchange
+from opening_book import read_move_lists, read_selfplay
+
+RECORD = np.dtype([("board", np.int8, 64), ("result", np.uint8)])
+RESULT_CODES = {"0-1": 0, "1/2-1/2": 1, "1-0": 2}
+
+TUNED_LETTERS = "PNBRQK"
+WHITE_CODES = np.array([PIECE_CODES[letter] for letter in TUNED_LETTERS])
+BLACK_CODES = np.array([PIECE_CODES[letter.lower()] for letter in TUNED_LETTERS])
+# Square index seen from the other side of the board (a8 <-> a1)
+MIRROR = np.array([(7 - index // 8) * 8 + index % 8 for index in range(64)])
+# Squares each piece can stand on; pawns never reach the first or last rank
+OCCUPIABLE = np.ones((len(TUNED_LETTERS), 64), dtype=bool)
+OCCUPIABLE[TUNED_LETTERS.index("P"), :8] = OCCUPIABLE[TUNED_LETTERS.index("P"), 56:] = False
+
+DEFAULT_SKIP_PLIES = 8
+DEFAULT_EPOCHS = 10
+DEFAULT_BATCH = 16384
+DEFAULT_LEARNING_RATE = 1.0
+K_SAMPLE = 200000
+LN10 = math.log(10)
+
+# Adam's decay rates
+BETA1, BETA2, EPSILON = 0.9, 0.999, 1e-8
+
+
+# Extraction
+
+def is_quiet(position):
+    side = position.side
+    if position.is_in_check(side):
+        return False
+    for move in position.get_legal_captures(side):
+        if move >> 14 or static_exchange(position, move) > 0:
+            return False
+    return True
+
+
+def extract_positions(games, handle, skip_plies=DEFAULT_SKIP_PLIES):
+    # Append the quiet positions of (moves, result) games to an open data
+    # file; returns the number of games used and positions written
+    game_count = position_count = 0
+    for moves, result in games:
+        if result not in RESULT_CODES:
+            continue
+        game_count += 1
+        tail = bytes((RESULT_CODES[result],))
+        position = ChessPosition()
+        for ply, move in enumerate(moves):
+            if not position.is_legal_move(move):
+                break
+            position.make_move(move)
+            if ply + 1 >= skip_plies and is_quiet(position):
+                squares = position.squares
+                handle.write(b"".join(squares[row * 16:row * 16 + 8] for row in range(8)) + tail)
+                position_count += 1
+    return game_count, position_count
+
+
+def open_data(path):
+    # The records of a data file, memory-mapped rather than read in
+    return np.memmap(path, dtype=RECORD, mode="r")
+
+
+# Weights
+
+def current_weights():
+    # (values, tables): material (6,) and piece-square tables (6, 64) in
+    # centipawns, as evaluation.py has them now
+    values = np.array([PIECE_VALUES[letter] * CENTIPAWNS for letter in TUNED_LETTERS],
+                      dtype=np.float64)
+    tables = np.array([[value for row in PIECE_SQUARE_TABLES[letter] for value in row]
+                       for letter in TUNED_LETTERS], dtype=np.float64)
+    return values, tables
+
+
+def center_tables(values, tables):
+    # Move the mean of each table into the piece's value, in place; the
+    # evaluation of every position stays the same. The king's table mean
+    # cancels out between the two kings and is dropped.
+    for index, letter in enumerate(TUNED_LETTERS):
+        squares = OCCUPIABLE[index]
+        mean = tables[index, squares].mean()
+        tables[index, squares] -= mean
+        if letter != "K":
+            values[index] += mean
+
+
+def build_table(values, tables):
+    # (16, 64) table for evaluate_batch, laid out like evaluation.py's
+    # SQUARE_VALUES: Black's pieces use the mirrored tables, negated
+    table = np.zeros((16, 64), dtype=np.float64)
+    table[WHITE_CODES] = values[:, None] + tables
+    table[BLACK_CODES] = -(values[:, None] + tables[:, MIRROR])
+    return table
+
+
+def table_gradient(encoded, weights):
+    # Sum of weights[row] over the rows with each (piece code, square), as a
+    # (16, 64) array: the gradient of sum(weights * evaluate_batch(encoded))
+    # with respect to the table
+    by_square = np.ascontiguousarray(encoded.T).astype(np.intp)
+    gradient = np.empty((64, 16), dtype=np.float64)
+    for column in range(64):
+        gradient[column] = np.bincount(by_square[column], weights=weights, minlength=16)
+    return gradient.T
+
+
+# Loss
+
+def predict(evaluations, k):
+    exponent = np.clip(-k * LN10 / 400 * evaluations, -50, 50)
+    return 1 / (1 + np.exp(exponent))
+
+
+def mean_loss(data, table, k, batch_size=DEFAULT_BATCH):
+    total = 0.0
+    for start in range(0, len(data), batch_size):
+        chunk = np.asarray(data[start:start + batch_size])
+        error = predict(evaluate_batch(chunk["board"], table), k) - chunk["result"] / 2
+        total += float(np.dot(error, error))
+    return total / len(data) if len(data) else 0.0
+
+
+def fit_k(data, table, rng, sample_size=K_SAMPLE):
+    # The K that best fits a sample of the data with the given weights, by
+    # golden-section search (the loss has a single minimum in K)
+    count = min(sample_size, len(data))
+    sample = np.asarray(data[np.sort(rng.choice(len(data), count, replace=False))])
+    evaluations = evaluate_batch(sample["board"], table)
+    results = sample["result"] / 2
+
+    def loss(k):
+        error = predict(evaluations, k) - results
+        return float(np.dot(error, error)) / count
+
+    low, high = 0.01, 5.0
+    ratio = (math.sqrt(5) - 1) / 2
+    for _ in range(60):
+        left = high - ratio * (high - low)
+        right = low + ratio * (high - low)
+        if loss(left) < loss(right):
+            high = right
+        else:
+            low = left
+    return (low + high) / 2
+
+
+# Training
+
+def train(data, values, tables, k, rng, epochs=DEFAULT_EPOCHS, batch_size=DEFAULT_BATCH,
+          learning_rate=DEFAULT_LEARNING_RATE, report=None):
+    # Adam over minibatches of consecutive records; values and tables are
+    # updated in place and the tables kept at zero mean. report(epoch,
+    # loss) is called after every epoch with the mean loss seen during it.
+    center_tables(values, tables)
+    params = np.concatenate([values, tables.ravel()])
+    moment = np.zeros_like(params)
+    second_moment = np.zeros_like(params)
+    starts = np.arange(0, len(data), batch_size)
+    slope = k * LN10 / 400
+    step = 0
+
+    for epoch in range(1, epochs + 1):
+        total = 0.0
+        for start in rng.permutation(starts):
+            chunk = np.asarray(data[start:start + batch_size])
+            encoded = chunk["board"]
+            prediction = predict(evaluate_batch(encoded, build_table(values, tables)), k)
+            error = prediction - chunk["result"] / 2
+            total += float(np.dot(error, error))
+
+            # d(mean squared error) / d(evaluation) for every position
+            weights = 2 * error * prediction * (1 - prediction) * slope / len(chunk)
+            table = table_gradient(encoded, weights)
+            gradient = np.concatenate([
+                table[WHITE_CODES].sum(axis=1) - table[BLACK_CODES].sum(axis=1),
+                (table[WHITE_CODES] - table[BLACK_CODES][:, MIRROR]).ravel(),
+            ])
+
+            step += 1
+            moment = BETA1 * moment + (1 - BETA1) * gradient
+            second_moment = BETA2 * second_moment + (1 - BETA2) * gradient * gradient
+            corrected = moment / (1 - BETA1 ** step)
+            corrected_second = second_moment / (1 - BETA2 ** step)
+            params -= learning_rate * corrected / (np.sqrt(corrected_second) + EPSILON)
+            values[:] = params[:len(values)]
+            values[TUNED_LETTERS.index("K")] = PIECE_VALUES["K"] * CENTIPAWNS
+            tables[:] = params[len(values):].reshape(tables.shape)
+            center_tables(values, tables)
+            params[:len(values)] = values
+            params[len(values):] = tables.ravel()
+
+        if report:
+            report(epoch, total / len(data))
+
+
+def rounded_weights(values, tables):
+    # Weights as they will be stored: values to a hundredth of a pawn, table
+    # entries to whole centipawns
+    return np.round(values), np.round(tables)
+
+
+def write_params(path, values, tables, k, loss, positions):
+    params = {
+        "piece_values": {letter: round(value / CENTIPAWNS, 2)
+                         for letter, value in zip(TUNED_LETTERS, values.tolist())},
+        "piece_square_tables": {letter: table.reshape(8, 8).astype(int).tolist()
+                                for letter, table in zip(TUNED_LETTERS, tables)},
+        "k": round(k, 4),
+        "loss": round(loss, 6),
+        "positions": positions,
+    }
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(params, handle)
+        handle.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune the evaluation weights on game results")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract = commands.add_parser("extract", help="write quiet positions from games to a data file")
+    extract.add_argument("data", help="data file to append to")
+    extract.add_argument("--selfplay", action="append", default=[], help="selfplay.py JSONL output")
+    extract.add_argument("--games", action="append", default=[],
+                         help="file with one move list per line")
+    extract.add_argument("--skip-plies", type=int, default=DEFAULT_SKIP_PLIES,
+                         help="leave out this many half-moves at the start of each game")
+
+    tune = commands.add_parser("tune", help="fit the weights to a data file")
+    tune.add_argument("data", help="data file written by extract")
+    tune.add_argument("--out", default="eval_params.json", help="parameter file to write")
+    tune.add_argument("--epochs", type=int, default=DEFAULT_EPOCHS, help="passes over the data")
+    tune.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="positions per minibatch")
+    tune.add_argument("--lr", type=float, default=DEFAULT_LEARNING_RATE,
+                      help="learning rate in centipawns per step")
+    tune.add_argument("--k", type=float, default=None, help="use this K instead of fitting it")
+    tune.add_argument("--seed", type=int, default=1, help="seed for sampling and batch order")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "extract":
+        sources = ([read_selfplay(path) for path in args.selfplay]
+                   + [read_move_lists(path) for path in args.games])
+        games = positions = 0
+        with open(args.data, "ab") as handle:
+            for source in sources:
+                used, written = extract_positions(source, handle, args.skip_plies)
+                games += used
+                positions += written
+        print(f"Wrote {positions} quiet positions from {games} games to {args.data}")
+        return 0
+
+    data = open_data(args.data)
+    if not len(data):
+        parser.error(f"{args.data} holds no positions")
+    rng = np.random.default_rng(args.seed)
+    values, tables = current_weights()
+    k = args.k if args.k is not None else fit_k(data, build_table(values, tables), rng)
+    start = time.perf_counter()
+    print(f"{len(data)} positions  K {k:.4f}  "
+          f"loss {mean_loss(data, build_table(values, tables), k, args.batch):.6f}")
+
+    def report(epoch, loss):
+        rate = int(epoch * len(data) / (time.perf_counter() - start))
+        print(f"epoch {epoch:>3}  loss {loss:.6f}  ({rate} positions/s)")
+
+    train(data, values, tables, k, rng, args.epochs, args.batch, args.lr, report)
+    values, tables = rounded_weights(values, tables)
+    loss = mean_loss(data, build_table(values, tables), k, args.batch)
+    write_params(args.out, values, tables, k, loss, len(data))
+    print(f"final loss {loss:.6f}  "
+          + "  ".join(f"{letter} {value / CENTIPAWNS:.2f}"
+                      for letter, value in zip(TUNED_LETTERS[:-1], values.tolist())))
+    print(f"Wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
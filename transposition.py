@@ -0,0 +1,164 @@
+# Fixed-size transposition table for the search.
+#
+# The table is a flat array of unsigned 64-bit words, so its memory use is
+# set by size_mb and never grows. Entries are two words (key, data) and are
+# grouped in buckets of two:
+#   slot 0 - depth-preferred: only replaced by a search at least as deep,
+#            or by any search once the entry is from an older search
+#   slot 1 - always-replace: takes every store the first slot refuses
+#
+# The data word packs the best move, bound type, depth, search age and
+# score:
+#   bits  0-16  best move (as encoded in board_layout, 0 = none)
+#   bits 17-18  bound (EXACT, LOWER or UPPER)
+#   bits 19-26  depth
+#   bits 27-34  age of the search that stored it
+#   bits 35-63  score + SCORE_OFFSET
+#
+# The key word holds the position key XORed with the data word. A parallel
+# search shares one table between processes without locks, so a reader
+# can see the key word of one store and the data word of another; such a
+# torn entry fails the key check and reads as a miss.
+
+from array import array
+
+EXACT, LOWER, UPPER = 1, 2, 3
+
+ENTRY_WORDS = 2
+BUCKET_ENTRIES = 2
+BUCKET_BYTES = ENTRY_WORDS * BUCKET_ENTRIES * 8
+
+MOVE_MASK = (1 << 17) - 1
+SCORE_OFFSET = 1 << 28
+MASK_64 = (1 << 64) - 1
+
+
+def bucket_count(size_mb):
+    # Round the bucket count down to a power of two so indexing is a mask
+    buckets = max(1, (size_mb * 1024 * 1024) // BUCKET_BYTES)
+    return 1 << (buckets.bit_length() - 1)
+
+
+def shared_table_buffer(size_mb, context):
+    # Zeroed shared memory for a table of size_mb, to pass to worker
+    # processes of the given multiprocessing context
+    return context.RawArray("B", bucket_count(size_mb) * BUCKET_BYTES)
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=16, buffer=None):
+        # buffer, if given, is memory from shared_table_buffer() for the same
+        # size_mb; every table built on it sees the others' entries
+        buckets = bucket_count(size_mb)
+        self.bucket_count = buckets
+        self.index_mask = buckets - 1
+        self.size_mb = size_mb
+        if buffer is None:
+            self.table = array("Q", bytes(buckets * BUCKET_BYTES))
+        else:
+            self.table = memoryview(buffer).cast("B").cast("Q")
+        self.age = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def clear(self):
+        # Zeroed in place, since the memory may be shared with other processes
+        self.table[:] = array("Q", bytes(self.bucket_count * BUCKET_BYTES))
+        self.age = 0
+        self.reset_stats()
+
+    def new_search(self):
+        # Entries from earlier searches become fair game for replacement
+        self.age = (self.age + 1) & 0xFF
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def stats(self):
+        return {
+            "size_mb": self.size_mb,
+            "entries": self.bucket_count * BUCKET_ENTRIES,
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": round(self.hit_rate, 4),
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+            "hashfull": self.hashfull(),
+        }
+
+    def hashfull(self):
+        # Permille of sampled entries written during the current search
+        table = self.table
+        sample = min(500, self.bucket_count)
+        used = 0
+        for bucket in range(sample):
+            base = bucket * 4
+            for slot in (base + 1, base + 3):
+                if table[slot] and (table[slot] >> 27) & 0xFF == self.age:
+                    used += 1
+        return used * 1000 // (sample * BUCKET_ENTRIES)
+
+    def probe(self, key):
+        # Returns (depth, bound, score, move) or None
+        self.probes += 1
+        table = self.table
+        base = (key & self.index_mask) * 4
+        data = table[base + 1]
+        if table[base] ^ data != key:
+            data = table[base + 3]
+            if table[base + 2] ^ data != key:
+                return None
+        self.hits += 1
+        return ((data >> 19) & 0xFF, (data >> 17) & 3,
+                (data >> 35) - SCORE_OFFSET, (data & MOVE_MASK) or None)
+
+    def store(self, key, depth, bound, score, move):
+        table = self.table
+        base = (key & self.index_mask) * 4
+        age = self.age
+
+        # Keep the old best move if this search did not produce one
+        if move is None:
+            move = 0
+            for slot in (base, base + 2):
+                if table[slot] ^ table[slot + 1] == key:
+                    move = table[slot + 1] & MOVE_MASK
+
+        data = (move | (bound << 17) | (max(0, min(depth, 0xFF)) << 19)
+                | (age << 27) | ((score + SCORE_OFFSET) << 35))
+        self.stores += 1
+
+        old_data = table[base + 1]
+        if (not old_data or table[base] ^ old_data == key or (old_data >> 27) & 0xFF != age
+                or depth >= (old_data >> 19) & 0xFF):
+            slot = base
+        else:
+            slot = base + 2
+
+        if table[slot + 1] and table[slot] ^ table[slot + 1] != key:
+            self.overwrites += 1
+        table[slot] = (key ^ data) & MASK_64
+        table[slot + 1] = data
+
+
+def score_to_tt(score, ply, mate_bound):
+    # Mate scores are stored relative to the node, not the root
+    if score >= mate_bound:
+        return score + ply
+    if score <= -mate_bound:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply, mate_bound):
+    if score >= mate_bound:
+        return score - ply
+    if score <= -mate_bound:
+        return score + ply
+    return score
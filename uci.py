@@ -0,0 +1,287 @@
+# UCI front end for the AI.
+#
+# Reads UCI commands on stdin and answers on stdout, so tournament
+# managers and scripts can run the engine as a subprocess without the Tk
+# window (nothing on this path imports tkinter). The search runs in a
+# thread of its own, so "stop", "isready" and "quit" are answered while it
+# thinks.
+#
+# Supported commands: uci, isready, setoption, ucinewgame, position
+# (startpos or fen, then moves), go (depth, movetime, nodes, wtime/btime
+# with winc/binc/movestogo, infinite), stop, ponderhit and quit. After every
+# completed iteration the engine prints an info line with depth, score,
+# nodes, nps, hashfull, time and pv.
+#
+# The rules are this project's: a bishop moves like a queen. GUIs that
+# support variants see that as the only value of UCI_Variant
+# ("bishopqueen"); moves are in coordinate notation, e.g. e7e8q.
+#
+# Usage:
+#   python uci.py
+
+import sys
+import threading
+
+from chess_rules import ChessPosition, format_move, parse_move
+from fen import parse_fen
+from parallel_search import ParallelSearchEngine
+from search import DEFAULT_TT_SIZE_MB, MATE_BOUND, MATE_SCORE, MAX_PLY, SearchEngine
+from tablebase import Tablebases
+
+ENGINE_NAME = "Modified Chess AI"
+VARIANT = "bishopqueen"
+
+# Clock handling: the share of the remaining time given to one move when
+# the GUI does not say how many moves are left, and a reserve for the time
+# it takes to pass the move back
+DEFAULT_MOVES_TO_GO = 30
+MOVE_OVERHEAD = 0.05
+
+MAX_HASH_MB = 4096
+MAX_THREADS = 64
+
+
+def score_string(score):
+    # Mate scores as "mate N" in moves (negative when being mated)
+    if score >= MATE_BOUND:
+        return f"mate {(MATE_SCORE - score + 1) // 2}"
+    if score <= -MATE_BOUND:
+        return f"mate {-((MATE_SCORE + score) // 2)}"
+    return f"cp {score}"
+
+
+def info_line(result):
+    pv = " ".join(format_move(move) for move in result.pv)
+    return (f"info depth {result.depth} score {score_string(result.score)} "
+            f"nodes {result.nodes} nps {result.nps} hashfull {result.hashfull} "
+            f"time {int(result.elapsed * 1000)} pv {pv}")
+
+
+def clock_budget(player, params):
+    # Seconds to spend on a move from "go wtime ... btime ...", or None
+    remaining = params.get("wtime" if player == "white" else "btime")
+    if remaining is None:
+        return None
+    increment = params.get("winc" if player == "white" else "binc", 0)
+    moves_to_go = params.get("movestogo") or DEFAULT_MOVES_TO_GO
+    budget = remaining / moves_to_go + increment * 3 / 4
+    budget = min(budget, remaining / 2) / 1000 - MOVE_OVERHEAD
+    return max(0.01, budget)
+
+
+class UciEngine:
+    def __init__(self, output=None):
+        self.output = output or sys.stdout
+        self.output_lock = threading.Lock()
+        self.options = {"Hash": DEFAULT_TT_SIZE_MB, "Threads": 1, "TablebasePath": ""}
+        self.engine = None
+        self.stop_event = threading.Event()
+        self.search_thread = None
+        # Best move of the last completed iteration of the running search
+        self.best_so_far = None
+        self.position = ChessPosition()
+        self.commands = {
+            "uci": self.cmd_uci,
+            "isready": self.cmd_isready,
+            "setoption": self.cmd_setoption,
+            "ucinewgame": self.cmd_ucinewgame,
+            "position": self.cmd_position,
+            "go": self.cmd_go,
+            "stop": self.cmd_stop,
+            "ponderhit": lambda args: None,
+        }
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def run(self, lines):
+        for line in lines:
+            tokens = line.split()
+            if not tokens:
+                continue
+            if tokens[0] == "quit":
+                break
+            command = self.commands.get(tokens[0])
+            if command is None:
+                self.send(f"info string Unknown command: {line.strip()}")
+                continue
+            try:
+                command(tokens[1:])
+            except ValueError as error:
+                self.send(f"info string {error}")
+            except Exception as error:
+                # A GUI takes an engine that exits as a crash: report and go on
+                self.send(f"info string Error in {tokens[0]}: {type(error).__name__}: {error}")
+        self.shutdown()
+
+    def shutdown(self):
+        self.cmd_stop([])
+        if self.options["Threads"] > 1 and self.engine is not None:
+            self.engine.shutdown()
+        self.engine = None
+
+    def get_engine(self):
+        # Built on first use, and again after an option it depends on changes
+        if self.engine is None:
+            tablebase_dir = self.options["TablebasePath"] or None
+            if self.options["Threads"] > 1:
+                self.engine = ParallelSearchEngine(self.options["Threads"],
+                                                   tt_size_mb=self.options["Hash"],
+                                                   stop_event=self.stop_event,
+                                                   tablebase_dir=tablebase_dir)
+            else:
+                self.engine = SearchEngine(tt_size_mb=self.options["Hash"],
+                                           stop_event=self.stop_event,
+                                           tablebases=Tablebases(tablebase_dir)
+                                           if tablebase_dir else None)
+        return self.engine
+
+    # Commands
+
+    def cmd_uci(self, args):
+        self.send(f"id name {ENGINE_NAME}")
+        self.send("id author AI_Project contributors")
+        self.send(f"option name Hash type spin default {DEFAULT_TT_SIZE_MB} "
+                  f"min 1 max {MAX_HASH_MB}")
+        self.send(f"option name Threads type spin default 1 min 1 max {MAX_THREADS}")
+        self.send("option name TablebasePath type string default <empty>")
+        self.send(f"option name UCI_Variant type combo default {VARIANT} var {VARIANT}")
+        self.send("uciok")
+
+    def cmd_isready(self, args):
+        self.send("readyok")
+
+    def cmd_setoption(self, args):
+        # setoption name <name> [value <value>]; names and values may hold spaces
+        text = " ".join(args)
+        if not text.startswith("name "):
+            raise ValueError("setoption needs a name")
+        name, _, value = text[5:].partition(" value ")
+        name, value = name.strip(), value.strip()
+
+        if name == "UCI_Variant":
+            if value != VARIANT:
+                raise ValueError(f"Unsupported variant {value!r}, only {VARIANT} is played")
+            return
+        if name not in self.options:
+            raise ValueError(f"Unknown option {name!r}")
+        self.cmd_stop([])
+        if name == "TablebasePath":
+            value = "" if value in ("", "<empty>") else value
+        else:
+            limit = MAX_HASH_MB if name == "Hash" else MAX_THREADS
+            value = max(1, min(int(value), limit))
+        if value != self.options[name]:
+            self.shutdown()
+            self.options[name] = value
+
+    def cmd_ucinewgame(self, args):
+        self.cmd_stop([])
+        if self.engine is not None:
+            self.engine.tt.clear()
+
+    def cmd_position(self, args):
+        if "moves" in args:
+            split = args.index("moves")
+            setup, moves = args[:split], args[split + 1:]
+        else:
+            setup, moves = args, []
+        if setup[:1] == ["startpos"]:
+            position = ChessPosition()
+        elif setup[:1] == ["fen"]:
+            if len(setup) < 3:
+                raise ValueError("position fen needs at least placement and side to move")
+            position = parse_fen(" ".join(setup[1:]))
+        else:
+            raise ValueError("position needs startpos or fen")
+
+        for text in moves:
+            move = parse_move(text)
+            if not position.is_legal_move(move):
+                raise ValueError(f"Illegal move {text}")
+            position.make_move(move)
+        self.cmd_stop([])
+        self.position = position
+
+    def cmd_go(self, args):
+        params = {}
+        infinite = False
+        index = 0
+        while index < len(args):
+            key = args[index]
+            if key == "infinite":
+                infinite = True
+            elif key in ("depth", "movetime", "nodes", "wtime", "btime", "winc", "binc",
+                         "movestogo"):
+                index += 1
+                if index == len(args):
+                    raise ValueError(f"go {key} needs a value")
+                params[key] = int(args[index])
+            index += 1
+        # With no limit at all, search until told to stop
+        if not params.keys() & {"depth", "movetime", "nodes", "wtime", "btime"}:
+            infinite = True
+
+        if "movetime" in params:
+            time_limit = max(0.001, params["movetime"] / 1000 - MOVE_OVERHEAD)
+        else:
+            time_limit = clock_budget(self.position.current_player, params)
+
+        self.cmd_stop([])
+        engine = self.get_engine()
+        engine.on_iteration = self.report_iteration
+        self.best_so_far = None
+        self.stop_event.clear()
+        self.search_thread = threading.Thread(
+            target=self.search, daemon=True,
+            args=(engine, self.position.copy(), params.get("depth", MAX_PLY), time_limit,
+                  params.get("nodes"), infinite))
+        self.search_thread.start()
+
+    def report_iteration(self, result):
+        self.best_so_far = result.best_move
+        self.send(info_line(result))
+
+    def search(self, engine, position, max_depth, time_limit, node_limit, infinite):
+        # A GUI waits for "bestmove" after every "go", so it is sent even if
+        # the search fails
+        move = None
+        try:
+            result = engine.search(position, max_depth=max_depth, time_limit=time_limit,
+                                   node_limit=node_limit)
+            move = result.best_move
+            # An infinite search only reports its move once told to stop
+            if infinite:
+                self.stop_event.wait()
+        except Exception as error:
+            self.send(f"info string Search failed: {type(error).__name__}: {error}")
+        finally:
+            if move is None:
+                move = self.best_so_far
+            if move is None:
+                # Stopped before the first iteration: any legal move will do.
+                # The searched copy may be left half-changed by an error, so
+                # the moves come from the position as set up.
+                try:
+                    moves = self.position.get_all_legal_moves()
+                except Exception:
+                    moves = []
+                move = moves[0] if moves else None
+            self.send(f"bestmove {format_move(move) if move is not None else '0000'}")
+
+    def cmd_stop(self, args):
+        if self.search_thread is not None:
+            self.stop_event.set()
+            self.search_thread.join()
+            self.search_thread = None
+
+
+def main():
+    UciEngine().run(sys.stdin)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
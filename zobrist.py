@@ -0,0 +1,51 @@
+# Zobrist hashing for ChessPosition.
+#
+# Every (piece, square) pair, the side to move, each castling right and
+# each en passant file get a fixed random 64-bit key; a position's hash is
+# the XOR of the keys that apply to it. The keys come from a seeded
+# generator so hashes are stable across runs and processes, which lets
+# hashes be stored on disk or shared between workers.
+
+import random
+
+from board_layout import BLACK, PIECE_CODES, SQUARES
+
+ZOBRIST_SEED = 0x5EED_B15B0
+
+_rng = random.Random(ZOBRIST_SEED)
+
+# ZOBRIST_PIECES[piece_code][square], indexed by 0x88 square; the unused
+# half of each list stays 0
+ZOBRIST_PIECES = [[0] * 128 for _ in range(16)]
+for _letter in "PNBRQKpnbrqk":
+    for _square in SQUARES:
+        ZOBRIST_PIECES[PIECE_CODES[_letter]][_square] = _rng.getrandbits(64)
+ZOBRIST_BLACK_TO_MOVE = _rng.getrandbits(64)
+
+# ZOBRIST_CASTLING[rights] for every 4-bit set of castling rights, the XOR
+# of one key per right, so a change of rights is a single XOR
+_castling_keys = [_rng.getrandbits(64) for _ in range(4)]
+ZOBRIST_CASTLING = [0] * 16
+for _rights in range(16):
+    for _bit in range(4):
+        if _rights >> _bit & 1:
+            ZOBRIST_CASTLING[_rights] ^= _castling_keys[_bit]
+
+# ZOBRIST_EN_PASSANT[file] while an en passant capture is available
+ZOBRIST_EN_PASSANT = [_rng.getrandbits(64) for _ in range(8)]
+
+
+def compute_hash(squares, side, castling=0, ep_square=None):
+    # Full hash of a 0x88 board from scratch; positions keep theirs up to
+    # date incrementally in make_move/unmake_move.
+    key = 0
+    for sq in SQUARES:
+        piece = squares[sq]
+        if piece:
+            key ^= ZOBRIST_PIECES[piece][sq]
+    if side == BLACK:
+        key ^= ZOBRIST_BLACK_TO_MOVE
+    key ^= ZOBRIST_CASTLING[castling]
+    if ep_square is not None:
+        key ^= ZOBRIST_EN_PASSANT[ep_square & 7]
+    return key